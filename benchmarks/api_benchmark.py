@@ -0,0 +1,231 @@
+"""
+Encode/decode throughput and allocations of the DTOs of the generic API: `Parameter` of every
+`Type` (and nested arrays, hashes and structs), `Label`, `Configuration`, and full
+`message_pb2.Message` round trips including (de)serialization to bytes.
+
+Usage:
+    python benchmarks/api_benchmark.py [--min-time 0.2] [--json results.json] [--compare baseline.json]
+    python -m pytest benchmarks/test_api_benchmark.py
+
+With `--compare`, cases that got slower than the baseline by more than `--threshold` are listed
+and the exit code is 1, so two commits can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from adapter.generic.api import message_pb2  # noqa: E402
+from adapter.generic.api.configuration import Configuration, ConfigurationItem  # noqa: E402
+from adapter.generic.api.label import Label, Sort  # noqa: E402
+from adapter.generic.api.parameter import Parameter  # noqa: E402
+from adapter.generic.api.type import Type  # noqa: E402
+from adapter.generic.util.namespace_util import to_obj  # noqa: E402
+
+VALUES = {
+    Type.STRING: 'the quick brown fox',
+    Type.INTEGER: 1234,
+    Type.DECIMAL: 3.25,
+    Type.BOOLEAN: True,
+    Type.DATE: date(2024, 1, 31),
+    Type.TIME: datetime(2024, 1, 31, 12, 30, 15),
+    Type.ARRAY: [1, 2, 3, 4],
+    Type.STRUCT: to_obj({'name': 'door', 'passcode': 1234}),
+    Type.HASH: {'front': 1234, 'back': 4321},
+}
+
+NESTED = {
+    'array_of_arrays': (Type.ARRAY, [[1, 2], [3, 4], [5, 6]]),
+    'hash_of_arrays': (Type.HASH, {'odd': [1, 3, 5], 'even': [2, 4, 6]}),
+    'struct_of_structs': (Type.STRUCT, to_obj({'front': to_obj({'name': 'front', 'passcode': 1234}),
+                                               'back': to_obj({'name': 'back', 'passcode': 4321})})),
+}
+
+
+def _parameters() -> dict:
+    parameters = {tipe.name.lower(): Parameter('p', tipe, value) for tipe, value in VALUES.items()}
+    parameters.update({name: Parameter('p', tipe, value) for name, (tipe, value) in NESTED.items()})
+    return parameters
+
+
+def _label(parameters: list) -> Label:
+    # Without timestamp: `Label.encode` writes nanoseconds, while `Label.decode` reads microseconds.
+    return Label(Sort.STIMULUS, 'lock', 'door', parameters=parameters, physical_label=b'LOCK:1234', correlation_id=7)
+
+
+def _configuration() -> Configuration:
+    return Configuration([
+        ConfigurationItem('endpoint', Type.STRING, 'Base websocket URL of the SUT', 'ws://localhost:3001'),
+        ConfigurationItem('room_pool_size', Type.INTEGER, 'number of rooms', 10),
+        ConfigurationItem('response_timeout', Type.DECIMAL, 'seconds', 5.0),
+        ConfigurationItem('sync_events', Type.BOOLEAN, 'report events', False),
+    ])
+
+
+def _message_round_trip(field: str, dto, decode):
+    """ DTO -> Message bytes, and Message bytes -> DTO. """
+    def encode():
+        return message_pb2.Message(**{field: dto.encode()}).SerializeToString()
+
+    def parse(data: bytes):
+        message = message_pb2.Message()
+        message.ParseFromString(data)
+        return decode(getattr(message, field))
+    return encode, parse
+
+
+def cases() -> dict:
+    """
+    The benchmarked cases.
+
+    Returns:
+        {str: (object, callable, callable)}: Per case the DTO, a function encoding it, and a function
+            decoding the result of that back into a DTO
+    """
+    result = {}
+    for name, parameter in _parameters().items():
+        result['parameter_' + name] = (parameter, parameter.encode, Parameter.decode)
+
+    every_type = list(_parameters().values())
+    labels = {
+        'label_empty': _label([]),
+        'label_one_parameter': _label([Parameter('passcode', Type.INTEGER, 1234)]),
+        'label_every_type': _label(every_type),
+    }
+    for name, label in labels.items():
+        result[name] = (label, label.encode, Label.decode)
+    configuration = _configuration()
+    result['configuration'] = (configuration, configuration.encode, Configuration.decode)
+
+    messages = {
+        'message_label': ('label', labels['label_one_parameter'], Label.decode),
+        'message_label_every_type': ('label', labels['label_every_type'], Label.decode),
+        'message_configuration': ('configuration', configuration, Configuration.decode),
+    }
+    for name, (field, dto, decode) in messages.items():
+        result[name] = (dto, *_message_round_trip(field, dto, decode))
+    return result
+
+
+def _fields(dto):
+    """ The fields of a DTO that survive a round trip; a decoded `Label` gets a new timestamp. """
+    if isinstance(dto, Label):
+        return dto.sort, dto.name, dto.channel, dto.parameters, dto.correlation_id
+    if isinstance(dto, Configuration):
+        return dto.items
+    return dto
+
+
+def round_trips(dto, encode, decode) -> bool:
+    """ Whether decoding the encoded DTO gives the same DTO. """
+    return _fields(decode(encode())) == _fields(dto)
+
+
+def throughput(function, argument=None, min_time: float = 0.2) -> float:
+    """ Operations per second, running the function in growing batches until they take `min_time` seconds. """
+    call = (lambda: function()) if argument is None else (lambda: function(argument))
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            call()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return iterations / elapsed
+        iterations *= 2 if elapsed < min_time / 10 else max(2, int(min_time / elapsed) + 1)
+
+
+def allocations(function, argument=None) -> int:
+    """ Peak of the memory allocated during one call, traced by `tracemalloc`, in bytes. """
+    call = (lambda: function()) if argument is None else (lambda: function(argument))
+    call()  # warm up caches, so they are not counted
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before
+
+
+def benchmark_case(encode, decode, min_time: float = 0.2) -> dict:
+    encoded = encode()
+    return {
+        'encode_ops_per_second': throughput(encode, min_time=min_time),
+        'decode_ops_per_second': throughput(decode, encoded, min_time=min_time),
+        'encode_peak_bytes': allocations(encode),
+        'decode_peak_bytes': allocations(decode, encoded),
+        'encoded_bytes': len(encoded) if isinstance(encoded, bytes) else encoded.ByteSize(),
+    }
+
+
+def run(min_time: float = 0.2, names: list = None) -> dict:
+    selected = {name: case for name, case in cases().items() if not names or name in names}
+    return {
+        'python': platform.python_version(),
+        'time': time.time(),
+        'results': {name: benchmark_case(encode, decode, min_time) for name, (_, encode, decode) in selected.items()},
+    }
+
+
+def regressions(baseline: dict, current: dict, threshold: float = 0.2) -> list:
+    """
+    Cases and metrics which are more than `threshold` (a fraction) slower than the baseline.
+
+    Returns:
+        [(str, str, float, float)]: case, metric, baseline and current operations per second
+    """
+    slower = []
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        for metric in ('encode_ops_per_second', 'decode_ops_per_second'):
+            if result[metric] < old[metric] * (1 - threshold):
+                slower.append((name, metric, old[metric], result[metric]))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--min-time', type=float, default=0.2, help='Seconds per throughput measurement (default: 0.2)')
+    parser.add_argument('--case', action='append', help='Only run this case; can be repeated')
+    parser.add_argument('--json', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of a baseline run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Fraction by which a case may be slower than the baseline (default: 0.2)')
+    args = parser.parse_args()
+
+    results = run(args.min_time, args.case)
+    print('{case:<28} {encode:>12} {decode:>12} {encode_peak:>12} {decode_peak:>12} {size:>8}'.format(
+        case='case', encode='encode/s', decode='decode/s', encode_peak='enc peak B', decode_peak='dec peak B',
+        size='bytes'))
+    for name, result in results['results'].items():
+        print('{name:<28} {encode_ops_per_second:12.0f} {decode_ops_per_second:12.0f} {encode_peak_bytes:12d} '
+              '{decode_peak_bytes:12d} {encoded_bytes:8d}'.format(name=name, **result))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            slower = regressions(json.load(file), results, args.threshold)
+        for name, metric, old, new in slower:
+            print('REGRESSION {name} {metric}: {old:.0f} -> {new:.0f} ({change:+.0%})'.format(
+                name=name, metric=metric, old=old, new=new, change=new / old - 1))
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark of permessage-deflate for messages to AMP: bytes on the wire and CPU cost of
+compressing and decompressing a stimulus confirmation, an announcement and labels with large
+struct, hash and array parameters.
+
+Usage:
+    python benchmarks/compression_benchmark.py [--threshold 1024] [--repeat 200] [--json results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from types import SimpleNamespace
+
+import websocket
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from adapter.generic.api import announcement_pb2, message_pb2  # noqa: E402
+from adapter.generic.api.label import Label, Sort  # noqa: E402
+from adapter.generic.api.parameter import Parameter, Type  # noqa: E402
+from adapter.generic.compression import PerMessageDeflate  # noqa: E402
+from adapter.matrix.matrix_handler import MatrixHandler  # noqa: E402
+
+
+def confirmation() -> bytes:
+    """ A typical stimulus confirmation. """
+    label = Label(Sort.STIMULUS, 'send_message', 'matrix', parameters=[
+        Parameter('message', Type.STRING, 'Hello world'),
+        Parameter('room', Type.STRING, '!AbCdEfGhIjKlMnOp:localhost'),
+        Parameter('username', Type.STRING, 'one'),
+    ], correlation_id=42)
+    return message_pb2.Message(label=label.encode()).SerializeToString()
+
+
+def announcement() -> bytes:
+    """ The announcement of the Matrix handler. """
+    handler = MatrixHandler()
+    pb_announcement = announcement_pb2.Announcement(
+        name='Matrix@benchmark', labels=[label.encode() for label in handler.supported_labels()],
+        configuration=handler.default_configuration().encode())
+    return message_pb2.Message(announcement=pb_announcement).SerializeToString()
+
+
+def large_label(entries: int) -> bytes:
+    """ A response with a hash, an array and a struct parameter of the given number of entries. """
+    label = Label(Sort.RESPONSE, 'room_state', 'matrix', parameters=[
+        Parameter('members', Type.HASH, {'@user{n}:localhost'.format(n=n): 'join' for n in range(entries)}),
+        Parameter('event_ids', Type.ARRAY, ['$event{n}:localhost'.format(n=n) for n in range(entries)]),
+        Parameter('power_levels', Type.STRUCT,
+                  SimpleNamespace(**{'user{n}'.format(n=n): n % 100 for n in range(entries)})),
+    ])
+    return message_pb2.Message(label=label.encode()).SerializeToString()
+
+
+def measure(payload: bytes, compression: PerMessageDeflate, repeat: int) -> dict:
+    """ Bytes on the wire with and without compression, and the CPU time per message. """
+    data = compression.compress(payload)
+
+    start = time.process_time()
+    for _ in range(repeat):
+        compression.compress(payload)
+    compress_cpu = (time.process_time() - start) / repeat
+
+    start = time.process_time()
+    for _ in range(repeat):
+        compression.decompress(data)
+    decompress_cpu = (time.process_time() - start) / repeat
+
+    return {
+        'payload_bytes': len(payload),
+        'wire_bytes_plain': len(websocket.ABNF.create_frame(payload, websocket.ABNF.OPCODE_BINARY).format()),
+        'wire_bytes_deflate': len(websocket.ABNF(fin=1, rsv1=1, opcode=websocket.ABNF.OPCODE_BINARY, data=data).format()),
+        'compressed': compression.should_compress(payload),
+        'compress_us': compress_cpu * 1e6,
+        'decompress_us': decompress_cpu * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threshold', type=int, default=1024, help='Compression threshold in bytes (default: 1024)')
+    parser.add_argument('--repeat', type=int, default=200, help='Repetitions per CPU measurement (default: 200)')
+    parser.add_argument('--json', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    compression = PerMessageDeflate(args.threshold)
+    compression.enabled = True
+
+    messages = {
+        'confirmation': confirmation(),
+        'announcement': announcement(),
+        'label_100_entries': large_label(100),
+        'label_5000_entries': large_label(5000),
+    }
+    results = {name: measure(payload, compression, args.repeat) for name, payload in messages.items()}
+
+    print('threshold {threshold} bytes'.format(threshold=args.threshold))
+    for name, stats in results.items():
+        print('  {name:<20} {payload_bytes:>8} B  wire {wire_bytes_plain:>8} B -> {wire_bytes_deflate:>8} B  '
+              'compress {compress_us:9.1f} us  decompress {decompress_us:9.1f} us  {sent}'
+              .format(name=name, sent='compressed' if stats['compressed'] else 'sent plain', **stats))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+End-to-end benchmark of the whole adapter pipeline: `FakeAmp` sends stimulus frames to a
+`BrokerConnection`, which passes them through `AdapterCore` to a table-driven websocket handler
+and on to an echoing stand-in SUT; the responses travel back to `FakeAmp`. The latency is
+measured from sending the stimulus frame until the response frame arrives at `FakeAmp`.
+
+Every combination of payload size and number of stimuli in flight is run; the performance
+modes of the adapter are selected with flags.
+
+Usage:
+    python benchmarks/e2e_benchmark.py [--stimuli 2000] [--payload-sizes 16,1024,65536] [--in-flight 1,8,64]
+        [--compress-threshold BYTES] [--ping-interval SECONDS] [--json results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from fake_amp import OPCODE_TEXT, FakeAmp  # noqa: E402
+from adapter.generic.adapter_core import AdapterCore  # noqa: E402
+from adapter.generic.api import label_pb2, message_pb2  # noqa: E402
+from adapter.generic.api.label import Label, Sort  # noqa: E402
+from adapter.generic.api.parameter import Parameter  # noqa: E402
+from adapter.generic.api.type import Type  # noqa: E402
+from adapter.generic.broker_connection import BrokerConnection  # noqa: E402
+from adapter.generic.compression import PerMessageDeflate  # noqa: E402
+from adapter.generic.websocket_handler import WebSocketHandler, response, stimulus  # noqa: E402
+
+
+class EchoHandler(WebSocketHandler):
+    """ Handler of the echoing SUT: the stimulus `echo(payload)` is answered with `echoed(payload)`. """
+
+    CHANNEL = 'echo'
+    LABELS = [
+        stimulus('echo', payload=Type.STRING),
+        response('echoed', payload=Type.STRING),
+    ]
+
+
+class EchoSut(FakeAmp):
+    """ Stand-in SUT answering 'ECHO:<payload>' with 'ECHOED:<payload>' and 'RESET' with 'RESET_PERFORMED'. """
+
+    def on_data(self, payload: bytes, opcode: int, rsv1: bool):
+        if payload == b'RESET':
+            self.send(b'RESET_PERFORMED', OPCODE_TEXT)
+        elif payload.startswith(b'ECHO:'):
+            self.send(b'ECHOED:' + payload[5:], OPCODE_TEXT)
+
+
+class AmpDriver:
+    """
+    Plays AMP: configures the adapter after its announcement, and sends stimuli with at most
+    `in_flight` of them waiting for their response.
+    """
+
+    def __init__(self, amp: FakeAmp, sut_url: str):
+        self.amp = amp
+        self.sut_url = sut_url
+        self.ready = threading.Event()
+        self.sent = {}  # correlation id -> time the stimulus was sent
+        self.latencies = []
+        self.confirmations = 0
+        self._window = None
+        self._done = threading.Event()
+        self._expected = 0
+        self._thread = threading.Thread(target=self._receive, name='amp_driver', daemon=True)
+        self._thread.start()
+
+    def run(self, stimuli: list, in_flight: int) -> float:
+        """
+        Send the stimulus messages and wait for all responses.
+
+        Returns:
+            float: Seconds from the first stimulus until the last response
+        """
+        self.latencies = []
+        self.sent = {}
+        self._window = threading.Semaphore(in_flight)
+        self._expected = len(stimuli)
+        self._done.clear()
+
+        start = time.perf_counter()
+        for correlation_id, payload in stimuli:
+            self._window.acquire()
+            self.sent[correlation_id] = time.perf_counter()
+            self.amp.send(payload)
+        if not self._done.wait(60):
+            raise TimeoutError('{n} of {total} responses missing'.format(
+                n=self._expected - len(self.latencies), total=self._expected))
+        return time.perf_counter() - start
+
+    def _receive(self):
+        while True:
+            try:
+                payload, compressed = self.amp.received.get(timeout=1)
+            except queue.Empty:
+                continue
+            message = message_pb2.Message()
+            message.ParseFromString(PerMessageDeflate.decompress(payload) if compressed else payload)
+
+            if message.HasField('announcement'):
+                configuration = message.announcement.configuration
+                configuration.items[0].string = self.sut_url
+                self.amp.send(message_pb2.Message(configuration=configuration).SerializeToString())
+            elif message.HasField('ready'):
+                self.ready.set()
+            elif message.HasField('label'):
+                if message.label.type == label_pb2.Label.LabelType.STIMULUS:
+                    self.confirmations += 1
+                    continue
+                sent = self.sent.pop(message.label.correlation_id, None)
+                if sent is None:
+                    continue
+                self.latencies.append(time.perf_counter() - sent)
+                self._window.release()
+                if len(self.latencies) == self._expected:
+                    self._done.set()
+
+
+def stimulus_messages(count: int, payload_size: int, first_id: int = 1) -> list:
+    """ Serialized `echo` stimuli with a payload of the given size, and their correlation ids. """
+    payload = 'x' * payload_size
+    return [(n, message_pb2.Message(label=Label(Sort.STIMULUS, 'echo', 'echo', correlation_id=n, parameters=[
+        Parameter('payload', Type.STRING, payload)]).encode()).SerializeToString())
+        for n in range(first_id, first_id + count)]
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    ordered = sorted(samples)
+
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1e3
+    return {
+        'count': len(ordered),
+        'stimuli_per_second': len(ordered) / elapsed,
+        'p50_ms': percentile(0.5),
+        'p99_ms': percentile(0.99),
+        'p999_ms': percentile(0.999),
+        'max_ms': ordered[-1] * 1e3,
+    }
+
+
+def run_scenario(stimuli: int, payload_size: int, in_flight: int, broker_options: dict) -> dict:
+    """ Start an adapter against fresh stand-ins, warm it up, and measure `stimuli` stimuli. """
+    with FakeAmp() as amp, EchoSut() as sut:
+        if broker_options.get('compress_threshold') is not None:
+            amp.extensions = 'permessage-deflate; client_no_context_takeover; server_no_context_takeover'
+
+        handler = EchoHandler()
+        broker_connection = BrokerConnection(amp.url, 'benchmark', **broker_options)
+        adapter_core = AdapterCore('Echo@benchmark', broker_connection, handler)
+        broker_connection.register_adapter_core(adapter_core)
+        handler.register_adapter_core(adapter_core)
+        core_thread = threading.Thread(target=adapter_core.start, name='adapter_core', daemon=True)
+        core_thread.start()
+
+        try:
+            driver = AmpDriver(amp, sut.url)
+            if not driver.ready.wait(10):
+                raise TimeoutError('The adapter did not become ready')
+
+            warm_up = max(10, stimuli // 10)
+            driver.run(stimulus_messages(warm_up, payload_size), in_flight)
+            elapsed = driver.run(stimulus_messages(stimuli, payload_size, first_id=warm_up + 1), in_flight)
+            result = summarize(driver.latencies, elapsed)
+            result['adapter_metrics'] = adapter_core.metrics.snapshot()['counters']
+            return result
+        finally:
+            adapter_core.close()
+            core_thread.join(5)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stimuli', type=int, default=2000, help='Measured stimuli per scenario (default: 2000)')
+    parser.add_argument('--payload-sizes', default='16,1024,65536',
+                        help='Comma separated payload sizes in bytes (default: 16,1024,65536)')
+    parser.add_argument('--in-flight', default='1,8,64',
+                        help='Comma separated numbers of stimuli waiting for their response (default: 1,8,64)')
+    parser.add_argument('--compress-threshold', type=int, metavar='BYTES',
+                        help='Let the adapter compress messages to AMP of at least this size (default: off)')
+    parser.add_argument('--ping-interval', type=float, default=0.0,
+                        help='Seconds between heartbeat pings of the adapter (default: off)')
+    parser.add_argument('--log-level', default='WARNING', help='Log level of the adapter (default: WARNING)')
+    parser.add_argument('--json', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    broker_options = {'ping_interval': args.ping_interval, 'compress_threshold': args.compress_threshold}
+
+    results = {}
+    for payload_size in [int(size) for size in args.payload_sizes.split(',')]:
+        for in_flight in [int(n) for n in args.in_flight.split(',')]:
+            result = run_scenario(args.stimuli, payload_size, in_flight, broker_options)
+            name = 'payload_{size}_in_flight_{n}'.format(size=payload_size, n=in_flight)
+            results[name] = result
+            print('{name:<32} {stimuli_per_second:9.1f}/s  p50 {p50_ms:7.2f} ms  p99 {p99_ms:7.2f} ms  '
+                  'p999 {p999_ms:7.2f} ms  max {max_ms:7.2f} ms'.format(name=name, **result))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'options': vars(args), 'results': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
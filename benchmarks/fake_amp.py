@@ -0,0 +1,152 @@
+"""
+Minimal stand-in for the AMP broker: a single-connection websocket server built on the standard
+library, speaking just enough of RFC 6455 to drive a `BrokerConnection`.
+"""
+import base64
+import hashlib
+import queue
+import socket
+import struct
+import threading
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+class FakeAmp:
+    """
+    Websocket server accepting adapter connections. Binary messages from the adapter are put on
+    `received`; `send` sends a binary message to the connected adapter.
+
+    Attributes:
+        answer_pings (bool): Reply to pings with pongs; disable to emulate a half-open connection
+        received (queue.Queue): Binary messages received from the adapter
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, answer_pings: bool = True):
+        self.answer_pings = answer_pings
+        self.received = queue.Queue()
+        self.connections = 0
+        self.extensions = None  # Sec-WebSocket-Extensions response header, e.g. to accept permessage-deflate
+
+        self.server = socket.create_server((host, port))
+        self.connection = None
+        self._send_lock = threading.Lock()
+        self._connected = threading.Event()
+        self._thread = threading.Thread(target=self._accept, name='fake_amp', daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.getsockname()[:2]
+        return 'ws://{host}:{port}/adapters'.format(host=host, port=port)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.close()
+        if self.connection:
+            self.connection.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def wait_connected(self, timeout: float = 5.0) -> bool:
+        return self._connected.wait(timeout)
+
+    def send(self, payload: bytes, opcode: int = OPCODE_BINARY, rsv1: bool = False):
+        """ Send one unfragmented, unmasked frame to the adapter. """
+        header = bytes([0x80 | (0x40 if rsv1 else 0) | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([length])
+        elif length < 1 << 16:
+            header += bytes([126]) + struct.pack('!H', length)
+        else:
+            header += bytes([127]) + struct.pack('!Q', length)
+        with self._send_lock:
+            self.connection.sendall(header + payload)
+
+    def on_data(self, payload: bytes, opcode: int, rsv1: bool):
+        """ Called with every data message of the adapter; puts it on `received`. """
+        self.received.put((payload, rsv1))
+
+    def close_connection(self):
+        """ Drop the connection with the adapter without a closing handshake. """
+        self._connected.clear()
+        self.connection.shutdown(socket.SHUT_RDWR)
+        self.connection.close()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+            self.connection = connection
+            self.connections += 1
+            self._handshake(connection)
+            self._connected.set()
+            self._read_frames(connection)
+
+    def _handshake(self, connection):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            request += connection.recv(4096)
+
+        headers = {}
+        for line in request.decode().split('\r\n')[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()).digest())
+        response = ('HTTP/1.1 101 Switching Protocols\r\n'
+                    'Upgrade: websocket\r\n'
+                    'Connection: Upgrade\r\n'
+                    'Sec-WebSocket-Accept: {accept}\r\n').format(accept=accept.decode())
+        if self.extensions:
+            response += 'Sec-WebSocket-Extensions: {ext}\r\n'.format(ext=self.extensions)
+        connection.sendall((response + '\r\n').encode())
+
+    def _read_frames(self, connection):
+        reader = connection.makefile('rb')
+        try:
+            while True:
+                head = reader.read(2)
+                if len(head) < 2:
+                    return
+                opcode = head[0] & 0x0F
+                rsv1 = bool(head[0] & 0x40)
+                length = head[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack('!H', reader.read(2))[0]
+                elif length == 127:
+                    length = struct.unpack('!Q', reader.read(8))[0]
+                mask = reader.read(4) if head[1] & 0x80 else None
+                payload = reader.read(length)
+                if mask and payload:
+                    key = (mask * (length // 4 + 1))[:length]
+                    payload = (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(length, 'big')
+
+                if opcode == OPCODE_PING:
+                    if self.answer_pings:
+                        self.send(payload, OPCODE_PONG)
+                elif opcode == OPCODE_CLOSE:
+                    self.send(payload[:2], OPCODE_CLOSE)
+                    return
+                elif opcode in (OPCODE_BINARY, OPCODE_TEXT):
+                    self.on_data(payload, opcode, rsv1)
+        except OSError:
+            return
+        finally:
+            self._connected.clear()
@@ -0,0 +1,276 @@
+"""
+Minimal in-memory stand-in for the parts of the Synapse client and admin API used by `MatrixConnection`.
+
+Every endpoint can be given an artificial latency so benchmarks can model a real homeserver,
+where e.g. `createRoom` is much slower than sending a message.
+"""
+import copy
+import itertools
+import json
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+DEFAULT_LATENCIES = {
+    'login': 0.005,
+    'createRoom': 0.050,
+    'join': 0.005,
+    'leave': 0.005,
+    'send': 0.005,
+    'ban': 0.005,
+    'unban': 0.005,
+    'admin_rooms': 0.002,
+    'admin_state': 0.002,
+    'admin_delete': 0.010,
+    'restore': 0.100,  # restoring a database snapshot, see `FakeSynapse.restore`
+}
+
+
+class FakeSynapse:
+    """
+    Threaded HTTP server emulating a Synapse homeserver with users `admin`, `one`, `two` and `three`.
+
+    Attributes:
+        latencies (dict): Artificial latency in seconds per operation
+        requests (collections.Counter-like dict): Number of requests per operation
+        rate_limits (dict): Number of upcoming requests per operation answered with 429
+        events ({(str, str): str}): Event id per (user, transaction id) of the sent messages;
+            a retried transaction returns the event of the first attempt
+    """
+
+    def __init__(self, latencies: dict = None, host: str = '127.0.0.1', port: int = 0):
+        self.latencies = dict(DEFAULT_LATENCIES, **(latencies or {}))
+        self.requests = {}
+        self.rate_limits = {}
+        self.events = {}
+        self.rooms = {}  # room id -> {'creator': str, 'members': set, 'banned': set, 'alias': str}
+        self.aliases = set()
+        self.timeline = []  # (room id, event) in stream order; the position is the index + 1
+        self.lock = threading.Condition()
+        self._room_ids = itertools.count(1)
+        self._event_ids = itertools.count(1)
+
+        self.server = ThreadingHTTPServer((host, port), self._request_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake_synapse', daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server.server_address[:2]
+        return 'http://{host}:{port}'.format(host=host, port=port)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def snapshot(self):
+        """ Copy of the rooms and events, like a snapshot of the database. """
+        with self.lock:
+            return copy.deepcopy((self.rooms, self.aliases, self.events, self.timeline))
+
+    def restore(self, snapshot):
+        """ Replace the rooms and events by a snapshot, taking the constant 'restore' latency. """
+        time.sleep(self.latencies['restore'])
+        with self.lock:
+            self.rooms, self.aliases, self.events, self.timeline = copy.deepcopy(snapshot)
+            self.lock.notify_all()
+
+    def handle(self, method: str, path: str, user: str, body: dict):
+        """
+        Route a request to the emulated operation.
+
+        Returns:
+            (int, dict): Status code and JSON body
+        """
+        routes = [
+            ('GET', r'/_matrix/client/versions', self._versions),
+            ('POST', r'/_matrix/client/v3/login', self._login),
+            ('GET', r'/_matrix/client/v3/sync', self._sync),
+            ('POST', r'/_matrix/client/v3/createRoom', self._create_room),
+            ('POST', r'/_matrix/client/v3/join/(?P<room_id>[^/]+)', self._join),
+            ('POST', r'/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/join', self._join),
+            ('POST', r'/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/leave', self._leave),
+            ('PUT', r'/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/send/m\.room\.message/(?P<txn_id>[^/]+)', self._send),
+            ('POST', r'/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/ban', self._ban),
+            ('POST', r'/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/unban', self._unban),
+            ('GET', r'/_synapse/admin/v1/rooms', self._admin_rooms),
+            ('GET', r'/_synapse/admin/v1/rooms/(?P<room_id>[^/]+)/state', self._admin_state),
+            ('DELETE', r'/_synapse/admin/v2/rooms/(?P<room_id>[^/]+)', self._admin_delete),
+        ]
+        for route_method, pattern, operation in routes:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                name = operation.__name__.lstrip('_').replace('create_room', 'createRoom')
+                with self.lock:
+                    self.requests[name] = self.requests.get(name, 0) + 1
+                    if self.rate_limits.get(name):
+                        self.rate_limits[name] -= 1
+                        return 429, {'errcode': 'M_LIMIT_EXCEEDED', 'retry_after_ms': 10}
+                time.sleep(self.latencies.get(name, 0))
+                params = {k: unquote(v) for k, v in match.groupdict().items()}
+                with self.lock:
+                    return operation(user, body, **params)
+
+        return 404, {'errcode': 'M_UNRECOGNIZED'}
+
+    @staticmethod
+    def user_id(username: str) -> str:
+        return '@{user}:localhost'.format(user=username)
+
+    def _versions(self, _user, _body):
+        return 200, {'versions': ['v1.11']}
+
+    def _login(self, _user, body):
+        username = body['identifier']['user']
+        if username not in ('admin', 'one', 'two', 'three') or body.get('password') != username:
+            return 403, {'errcode': 'M_FORBIDDEN'}
+        return 200, {'access_token': 'token_' + username, 'user_id': self.user_id(username)}
+
+    def _event(self, room_id, sender, event_type, content, state_key=None):
+        """ Append an event to the timeline and wake up the long-polling syncs. """
+        event = {'type': event_type, 'sender': self.user_id(sender), 'content': content,
+                 'origin_server_ts': int(time.time() * 1000), 'event_id': '$event{n}'.format(n=next(self._event_ids))}
+        if state_key is not None:
+            event['state_key'] = self.user_id(state_key)
+        self.timeline.append((room_id, event))
+        self.lock.notify_all()
+        return event['event_id']
+
+    def _sync(self, user, query):
+        """ Events of the rooms the user is in, or was removed from, after the `since` position. """
+        since = int(query.get('since', 0)) if 'since' in query else len(self.timeline)
+        timeout = int(query.get('timeout', 0)) / 1000
+        self.lock.wait_for(lambda: len(self.timeline) > since, timeout)  # releases the lock while waiting
+
+        rooms = {'join': {}, 'leave': {}}
+        for room_id, event in self.timeline[since:]:
+            room = self.rooms.get(room_id)
+            if room is None:
+                continue
+            if user in room['members']:
+                section = 'join'
+            elif event.get('state_key') == self.user_id(user):
+                section = 'leave'
+            else:
+                continue
+            rooms[section].setdefault(room_id, {'timeline': {'events': []}})['timeline']['events'].append(event)
+        return 200, {'next_batch': str(len(self.timeline)), 'rooms': rooms}
+
+    def _create_room(self, user, body):
+        alias = body.get('room_alias_name')
+        if alias in self.aliases:
+            return 400, {'errcode': 'M_ROOM_IN_USE'}
+        room_id = '!room{n}:localhost'.format(n=next(self._room_ids))
+        self.aliases.add(alias)
+        self.rooms[room_id] = {'creator': user, 'members': {user}, 'banned': set(), 'alias': alias}
+        return 200, {'room_id': room_id}
+
+    def _join(self, user, _body, room_id):
+        room = self.rooms.get(room_id)
+        if room is None:
+            return 404, {'errcode': 'M_NOT_FOUND'}
+        if user in room['banned']:
+            return 403, {'errcode': 'M_FORBIDDEN'}
+        room['members'].add(user)
+        self._event(room_id, user, 'm.room.member', {'membership': 'join'}, state_key=user)
+        return 200, {'room_id': room_id}
+
+    def _leave(self, user, _body, room_id):
+        room = self.rooms.get(room_id)
+        if room is None or user not in room['members']:
+            return 403, {'errcode': 'M_FORBIDDEN'}
+        room['members'].discard(user)
+        self._event(room_id, user, 'm.room.member', {'membership': 'leave'}, state_key=user)
+        return 200, {}
+
+    def _send(self, user, body, room_id, txn_id):
+        room = self.rooms.get(room_id)
+        if room is None or user not in room['members']:
+            return 403, {'errcode': 'M_FORBIDDEN'}
+        event_id = self.events.get((user, txn_id))
+        if event_id is None:
+            event_id = self.events[(user, txn_id)] = self._event(room_id, user, 'm.room.message', body)
+        return 200, {'event_id': event_id}
+
+    def _ban(self, user, body, room_id):
+        room = self.rooms.get(room_id)
+        if room is None or room['creator'] != user:
+            return 403, {'errcode': 'M_FORBIDDEN'}
+        target = body['user_id'].split(':')[0].lstrip('@')
+        room['members'].discard(target)
+        room['banned'].add(target)
+        self._event(room_id, user, 'm.room.member', {'membership': 'ban'}, state_key=target)
+        return 200, {}
+
+    def _unban(self, user, body, room_id):
+        room = self.rooms.get(room_id)
+        if room is None or room['creator'] != user:
+            return 403, {'errcode': 'M_FORBIDDEN'}
+        target = body['user_id'].split(':')[0].lstrip('@')
+        room['banned'].discard(target)
+        self._event(room_id, user, 'm.room.member', {'membership': 'leave'}, state_key=target)
+        return 200, {}
+
+    def _admin_rooms(self, user, _body):
+        if user != 'admin':
+            return 403, {'errcode': 'M_FORBIDDEN'}
+        return 200, {'rooms': [{'room_id': room_id} for room_id in self.rooms]}
+
+    def _admin_state(self, user, _body, room_id):
+        room = self.rooms.get(room_id)
+        if user != 'admin':
+            return 403, {'errcode': 'M_FORBIDDEN'}
+        if room is None:
+            return 404, {'errcode': 'M_NOT_FOUND'}
+        memberships = dict.fromkeys(room['members'], 'join')
+        memberships.update(dict.fromkeys(room['banned'], 'ban'))
+        return 200, {'state': [{'type': 'm.room.member', 'state_key': self.user_id(member),
+                                'content': {'membership': membership}} for member, membership in memberships.items()]}
+
+    def _admin_delete(self, user, _body, room_id):
+        if user != 'admin':
+            return 403, {'errcode': 'M_FORBIDDEN'}
+        self.rooms.pop(room_id, None)
+        return 200, {'delete_id': room_id}
+
+    def _request_handler(self):
+        fake = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _dispatch(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                if self.command == 'GET':
+                    body = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+                token = (self.headers.get('Authorization') or '').removeprefix('Bearer token_')
+
+                status, payload = fake.handle(self.command, urlparse(self.path).path, token, body)
+
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+            def log_message(self, *_):
+                pass
+
+        return RequestHandler
@@ -0,0 +1,134 @@
+"""
+Import time of the adapter package, measured in fresh interpreters.
+
+Every scenario imports part of the adapter in a new Python process, `--repeat` times, both with
+the cached bytecode of the adapter (warm, the usual start) and without it (cold, the first start
+of a fresh checkout, when every adapter module is compiled from source). The slowest modules are
+taken from `python -X importtime`. Every run also checks that no adapter module is loaded twice under
+different names, e.g. as `generic.api.label_pb2` and `adapter.generic.api.label_pb2`, which
+would register its protobuf descriptors twice.
+
+Usage:
+    python benchmarks/import_benchmark.py [--repeat 10] [--scenario smartdoor] [--json results.json]
+    python -m pytest benchmarks/test_import_benchmark.py
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Scenario -> statements run in the fresh interpreter
+SCENARIOS = {
+    'plugin_adapter': 'import adapter.plugin_adapter',
+    'smartdoor': 'from adapter.plugin_adapter import registry; registry.create("smartdoor")',
+    'matrix': 'from adapter.plugin_adapter import registry; registry.create("matrix")',
+    'protocol': 'import adapter.generic.api.message_pb2',
+}
+
+# Runs the statements and reports the time they took and the modules loaded from the same file twice
+_CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+{statements}
+elapsed = time.perf_counter() - start
+files = {{}}
+for name, module in list(sys.modules.items()):
+    path = getattr(module, "__file__", None)
+    if path and name.split(".")[0] in ("adapter", "generic", "matrix", "smartdoor"):
+        files.setdefault(path, []).append(name)
+print(json.dumps({{"seconds": elapsed, "modules": len(sys.modules),
+                  "duplicates": [sorted(names) for names in files.values() if len(names) > 1]}}))
+'''
+
+
+def run_child(statements: str, src: str = SRC, cold: bool = False, importtime: bool = False) -> dict:
+    """
+    Run the statements in a fresh interpreter with only the `src` directory added to the path.
+
+    Args:
+        statements (str): Python statements importing (part of) the adapter
+        src (str): Directory containing the `adapter` package
+        cold (bool): Whether to keep the interpreter from writing bytecode, so a copy of `src`
+            without `__pycache__` directories stays uncached
+        importtime (bool): Whether to also collect the `-X importtime` report
+    Returns:
+        dict: seconds, number of modules, duplicate modules and, if requested, the importtime lines
+    """
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(src))
+    env.pop('PYTHONPYCACHEPREFIX', None)
+    if cold:
+        env['PYTHONDONTWRITEBYTECODE'] = '1'
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + \
+        ['-c', _CHILD.format(statements=statements)]
+    process = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    result = json.loads(process.stdout.splitlines()[-1])
+    if importtime:
+        result['importtime'] = [line for line in process.stderr.splitlines() if line.startswith('import time:')]
+    return result
+
+
+def slowest_modules(importtime: list, top: int = 10) -> list:
+    """ The adapter modules with the highest cumulative import time, from `-X importtime` lines. """
+    modules = []
+    for line in importtime[1:]:  # the first line is the header
+        own, cumulative, name = [part.strip() for part in line.split(':', 1)[1].split('|')]
+        if name.startswith('adapter'):
+            modules.append({'module': name, 'self_us': int(own), 'cumulative_us': int(cumulative)})
+    return sorted(modules, key=lambda module: module['cumulative_us'], reverse=True)[:top]
+
+
+def benchmark_scenario(statements: str, repeat: int = 10) -> dict:
+    def summarize(runs):
+        seconds = [run['seconds'] * 1e3 for run in runs]
+        return {'median_ms': statistics.median(seconds), 'min_ms': min(seconds), 'max_ms': max(seconds)}
+
+    run_child(statements)  # fill the bytecode cache for the warm runs
+    warm = [run_child(statements) for _ in range(repeat)]
+    profiled = run_child(statements, importtime=True)
+    with tempfile.TemporaryDirectory() as uncached:
+        shutil.copytree(os.path.join(SRC, 'adapter'), os.path.join(uncached, 'adapter'),
+                        ignore=shutil.ignore_patterns('__pycache__'))
+        cold = [run_child(statements, uncached, cold=True) for _ in range(repeat)]
+
+    return {
+        'warm': summarize(warm),
+        'cold': summarize(cold),
+        'modules': profiled['modules'],
+        'duplicates': sorted({tuple(names) for run in warm + cold for names in run['duplicates']}),
+        'slowest_modules': slowest_modules(profiled['importtime']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10, help='Interpreters started per scenario and cache state (default: 10)')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Only run this scenario; can be repeated')
+    parser.add_argument('--json', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        results[name] = result = benchmark_scenario(SCENARIOS[name], args.repeat)
+        print('{name:<16} warm {warm[median_ms]:7.1f} ms (min {warm[min_ms]:6.1f})  cold {cold[median_ms]:7.1f} ms '
+              '(min {cold[min_ms]:6.1f})  {modules} modules'.format(name=name, **result))
+        for module in result['slowest_modules'][:5]:
+            print('    {cumulative_us:>8} us  {module}'.format(**module))
+        for names in result['duplicates']:
+            print('    DUPLICATE {names}'.format(names=' = '.join(names)))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+    if any(result['duplicates'] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""
+Benchmark of `MatrixConnection` and `AsyncMatrixConnection` against the in-memory `FakeSynapse`.
+
+Usage:
+    python benchmarks/matrix_benchmark.py [--stimuli 50] [--rooms 50] [--json results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from fake_synapse import FakeSynapse  # noqa: E402
+from adapter.matrix.async_connection import AsyncMatrixConnection  # noqa: E402
+from adapter.matrix.matrix_connection import MatrixConnection  # noqa: E402
+from adapter.matrix.reset_strategy import PurgeReset, SnapshotReset  # noqa: E402
+
+
+class BenchmarkMatrixConnection(MatrixConnection):
+    """ `MatrixConnection` which does not restart a docker container on reset. """
+
+    def restart_container(self):
+        pass
+
+
+class BenchmarkAsyncMatrixConnection(AsyncMatrixConnection):
+    """ `AsyncMatrixConnection` which does not restart a docker container on reset. """
+
+    def restart_container(self):
+        pass
+
+
+class FakeSnapshotReset(SnapshotReset):
+    """ `SnapshotReset` of the `FakeSynapse` state, without stopping a docker container. """
+
+    def __init__(self, server: FakeSynapse):
+        super().__init__()
+        self.server = server
+        self.state = None
+
+    @staticmethod
+    def docker(*args):
+        pass
+
+    def capture(self, connection):
+        self.state = self.server.snapshot()
+
+    def restore(self, connection):
+        self.server.restore(self.state)
+
+
+RESET_STRATEGIES = {
+    'purge': lambda server: PurgeReset(),
+    'snapshot': FakeSnapshotReset,
+}
+
+CLIENTS = {
+    'sync': BenchmarkMatrixConnection,
+    'async': BenchmarkAsyncMatrixConnection,
+}
+
+
+def summarize(samples: list) -> dict:
+    """ Latency statistics in milliseconds. """
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1e3,
+        'p50_ms': ordered[len(ordered) // 2] * 1e3,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e3,
+        'max_ms': ordered[-1] * 1e3,
+    }
+
+
+def time_stimuli(connection: MatrixConnection, stimuli: list) -> list:
+    """ Send the (label, params) stimuli one by one and return the latency of each. """
+    samples = []
+    for label, params in stimuli:
+        start = time.perf_counter()
+        connection.send(label, params)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def benchmark_create_room(stimuli: int, room_pool_size: int, latencies: dict = None) -> dict:
+    """ Latency of CREATE_ROOM stimuli, optionally served from a room pool. """
+    with FakeSynapse(latencies) as server:
+        connection = BenchmarkMatrixConnection(server.endpoint, 'synapse', room_pool_size=room_pool_size)
+        connection.connect()
+        try:
+            samples = []
+            # Create the rooms in batches of the pool size, resetting in between like AMP does per test case.
+            # The pool fills in the background; it is waited for, as AMP takes a while before the next test case.
+            batch = room_pool_size or stimuli
+            while len(samples) < stimuli:
+                if connection.room_pool:
+                    connection.room_pool.fill()
+                count = min(batch, stimuli - len(samples))
+                samples += time_stimuli(connection, [('CREATE_ROOM', {'username': 'one'})] * count)
+                connection.reset()
+            return summarize(samples)
+        finally:
+            connection.stop()
+
+
+def benchmark_connect(client: str, repeat: int = 10) -> dict:
+    """ Latency of connecting, i.e. a reset plus logging in all users. """
+    with FakeSynapse() as server:
+        samples = []
+        for _ in range(repeat):
+            connection = CLIENTS[client](server.endpoint, 'synapse')
+            start = time.perf_counter()
+            connection.connect()
+            samples.append(time.perf_counter() - start)
+            connection.stop()
+        return summarize(samples)
+
+
+def benchmark_reset(client: str, rooms: int, repeat: int = 5) -> dict:
+    """ Latency of a reset purging the given number of rooms. """
+    with FakeSynapse() as server:
+        connection = CLIENTS[client](server.endpoint, 'synapse')
+        connection.connect()
+        try:
+            samples = []
+            for _ in range(repeat):
+                for _ in range(rooms):
+                    connection.create_room(connection.session_dict['one'])
+                start = time.perf_counter()
+                connection.reset()
+                samples.append(time.perf_counter() - start)
+            return summarize(samples)
+        finally:
+            connection.stop()
+
+
+def benchmark_reset_strategy(strategy: str, rooms: int, repeat: int = 5) -> dict:
+    """ Latency of a reset with the given strategy after a test case which created the given number of rooms. """
+    with FakeSynapse() as server:
+        connection = BenchmarkMatrixConnection(server.endpoint, 'synapse')
+        connection.reset_strategy = RESET_STRATEGIES[strategy](server)
+        connection.connect()
+        try:
+            samples = []
+            for _ in range(repeat):
+                for _ in range(rooms):
+                    connection.create_room(connection.session_dict['one'])
+                start = time.perf_counter()
+                connection.reset()
+                samples.append(time.perf_counter() - start)
+            assert not server.rooms, 'the reset left rooms behind'
+            return summarize(samples)
+        finally:
+            connection.stop()
+
+
+def benchmark_multi_user_stimuli(client: str, stimuli: int) -> dict:
+    """
+    Throughput of SEND_MESSAGE stimuli of three users in one room. The sync client sends them
+    one by one; the async client pipelines them, so the stimuli of different users overlap.
+    """
+    with FakeSynapse() as server:
+        connection = CLIENTS[client](server.endpoint, 'synapse')
+        connection.connect()
+        try:
+            _, result = connection.send('CREATE_ROOM', {'username': 'one'})
+            room_id = result['room_id']
+            for username in ('two', 'three'):
+                connection.send('JOIN_ROOM', {'username': username, 'room_id': room_id})
+
+            stimuli = [{'username': ('one', 'two', 'three')[n % 3], 'room_id': room_id, 'message': str(n)}
+                       for n in range(stimuli)]
+            start = time.perf_counter()
+            if client == 'async':
+                futures = [connection.submit('SEND_MESSAGE', params) for params in stimuli]
+                responses = [future.result() for future in futures]
+            else:
+                responses = [connection.send('SEND_MESSAGE', params) for params in stimuli]
+            elapsed = time.perf_counter() - start
+
+            return {
+                'count': len(responses),
+                'failed': sum(1 for response, _ in responses if response != 'SUCCESS'),
+                'total_ms': elapsed * 1e3,
+                'stimuli_per_second': len(responses) / elapsed,
+            }
+        finally:
+            connection.stop()
+
+
+def benchmark_rate_limited_messages(stimuli: int, rate_limited: int) -> dict:
+    """ SEND_MESSAGE stimuli of which the first `rate_limited` attempts are answered with 429. """
+    with FakeSynapse() as server:
+        connection = BenchmarkMatrixConnection(server.endpoint, 'synapse')
+        connection.connect()
+        try:
+            _, result = connection.send('CREATE_ROOM', {'username': 'one'})
+            server.rate_limits['send'] = rate_limited
+            start = time.perf_counter()
+            responses = [connection.send('SEND_MESSAGE', {'username': 'one', 'room_id': result['room_id'],
+                                                          'message': str(n)}) for n in range(stimuli)]
+            elapsed = time.perf_counter() - start
+            return {
+                'count': len(responses),
+                'failed': sum(1 for response, _ in responses if response != 'SUCCESS'),
+                'requests': server.requests['send'],
+                'messages_stored': len(set(server.events.values())),
+                'total_ms': elapsed * 1e3,
+            }
+        finally:
+            connection.stop()
+
+
+def benchmark_invalid_stimuli(room_state_cache: str, stimuli: int) -> dict:
+    """ Latency of a mix of valid stimuli and stimuli that are certain to fail, like those AMP sends. """
+    with FakeSynapse() as server:
+        connection = BenchmarkMatrixConnection(server.endpoint, 'synapse', room_state_cache=room_state_cache)
+        connection.connect()
+        try:
+            _, result = connection.send('CREATE_ROOM', {'username': 'one'})
+            room_id = result['room_id']
+            mix = [
+                ('SEND_MESSAGE', {'username': 'one', 'room_id': room_id, 'message': 'hi'}),
+                ('LEAVE_ROOM', {'username': '', 'room_id': ''}),
+                ('JOIN_ROOM', {'username': 'two', 'room_id': ''}),
+                ('SEND_MESSAGE', {'username': 'three', 'room_id': room_id, 'message': 'not a member'}),
+                ('JOIN_ROOM', {'username': 'two', 'room_id': '!unknown:localhost'}),
+            ]
+            before = sum(server.requests.values())
+            samples = time_stimuli(connection, [mix[n % len(mix)] for n in range(stimuli)])
+            return dict(summarize(samples), requests=sum(server.requests.values()) - before)
+        finally:
+            connection.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stimuli', type=int, default=50, help='Number of stimuli per scenario (default: 50)')
+    parser.add_argument('--room-pool-size', type=int, default=10, help='Room pool size (default: 10)')
+    parser.add_argument('--rooms', type=int, default=50, help='Number of rooms purged per reset (default: 50)')
+    parser.add_argument('--json', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results = {
+        'create_room': {
+            'no_pool': benchmark_create_room(args.stimuli, 0),
+            'room_pool': benchmark_create_room(args.stimuli, args.room_pool_size),
+        },
+        'connect': {client: benchmark_connect(client) for client in CLIENTS},
+        'reset': {client: benchmark_reset(client, args.rooms) for client in CLIENTS},
+        'reset_strategy': {'{strategy}_{rooms}'.format(strategy=strategy, rooms=rooms):
+                           benchmark_reset_strategy(strategy, rooms)
+                           for strategy in RESET_STRATEGIES for rooms in (args.rooms // 5, args.rooms, args.rooms * 4)},
+        'invalid_stimuli': {mode: benchmark_invalid_stimuli(mode, args.stimuli) for mode in ('off', 'on', 'strict')},
+    }
+    throughput = {client: benchmark_multi_user_stimuli(client, args.stimuli) for client in CLIENTS}
+
+    for scenario, variants in results.items():
+        print(scenario)
+        for variant, stats in variants.items():
+            print('  {variant:<12} mean {mean_ms:8.2f} ms  p50 {p50_ms:8.2f} ms  p95 {p95_ms:8.2f} ms  max {max_ms:8.2f} ms'
+                  .format(variant=variant, **stats)
+                  + ('  {requests} requests'.format(**stats) if 'requests' in stats else ''))
+    print('multi_user_stimuli')
+    for client, stats in throughput.items():
+        print('  {client:<12} {count} stimuli in {total_ms:8.2f} ms  {stimuli_per_second:8.1f}/s  failed {failed}'
+              .format(client=client, **stats))
+    results['multi_user_stimuli'] = throughput
+
+    rate_limited = benchmark_rate_limited_messages(args.stimuli, args.stimuli // 5)
+    print('rate_limited_messages')
+    print('  {count} stimuli, {requests} requests, {messages_stored} messages stored, failed {failed}'
+          .format(**rate_limited))
+    results['rate_limited_messages'] = rate_limited
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
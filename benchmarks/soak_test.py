@@ -0,0 +1,288 @@
+"""
+Soak test of `AdapterCore`: pumps a long stream of stimuli of several label types through the
+adapter core and a fake handler, with a stand-in for the broker connection, and checks that
+memory, threads and queues stay flat.
+
+While running, the memory traced by `tracemalloc`, the RSS of the process, the number of threads
+and the queue sizes of the adapter core are sampled. After a warm-up, the samples are split in
+thirds; growth is sustained when every third is higher than the one before and the last exceeds
+the first by more than the tolerance. The AMP connection is dropped and reopened every
+`--reconnect-every` stimuli, so the reconnect path is soaked as well. Before the soak, every label
+type is run on its own and its top allocation sites are reported.
+
+Usage:
+    python benchmarks/soak_test.py [--stimuli 200000] [--json results.json]
+    python -m pytest benchmarks/test_soak.py
+
+The exit code is 1 if any sampled quantity shows sustained growth.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from adapter.generic.adapter_core import AdapterCore  # noqa: E402
+from adapter.generic.api import label_pb2, message_pb2  # noqa: E402
+from adapter.generic.api.configuration import Configuration, ConfigurationItem  # noqa: E402
+from adapter.generic.api.label import Label, Sort  # noqa: E402
+from adapter.generic.api.parameter import Parameter  # noqa: E402
+from adapter.generic.api.type import Type  # noqa: E402
+from adapter.generic.handler import Handler  # noqa: E402
+
+# Label types and their parameters; the fake SUT answers every stimulus with the same parameters
+LABEL_TYPES = {
+    'ping': [],
+    'text': [Parameter('text', Type.STRING, 'x' * 256)],
+    'numbers': [Parameter('numbers', Type.ARRAY, list(range(32)))],
+    'record': [Parameter('record', Type.STRUCT, SimpleNamespace(name='door', passcode=1234, open=True))],
+}
+
+
+class SoakHandler(Handler):
+    """ Handler of a fake SUT which answers every stimulus `<type>` immediately with `<type>_done`. """
+
+    def start(self):
+        self.adapter_core.send_ready()
+
+    def reset(self):
+        self.adapter_core.send_ready()
+
+    def stop(self):
+        pass
+
+    def stimulate(self, pb_label: label_pb2.Label):
+        label = Label.decode(pb_label)
+        pb_label.timestamp = time.time_ns()
+        self.adapter_core.send_stimulus_confirmation(pb_label)
+        logging.info('      Injecting stimulus @SUT: ?{name}'.format(name=label.name))
+        self.adapter_core.send_response(Label(Sort.RESPONSE, label.name + '_done', label.channel,
+                                              parameters=label.parameters, correlation_id=label.correlation_id))
+
+    def supported_labels(self):
+        # The parameters keep their example values: `Parameter` rejects an array without a value
+        return [Label(sort, name + suffix, 'soak', parameters=parameters)
+                for name, parameters in LABEL_TYPES.items()
+                for sort, suffix in ((Sort.STIMULUS, ''), (Sort.RESPONSE, '_done'))]
+
+    def default_configuration(self) -> Configuration:
+        return Configuration([ConfigurationItem('endpoint', Type.STRING, 'Fake SUT', 'soak://')])
+
+
+class NullBroker:
+    """ Stand-in for `BrokerConnection` counting the messages the adapter core sends to AMP. """
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self._sent = threading.Condition()
+
+    def register_adapter_core(self, adapter_core):
+        self.adapter_core = adapter_core
+
+    def send(self, raw_message: bytes):
+        with self._sent:
+            self.messages += 1
+            self.bytes += len(raw_message)
+            self._sent.notify_all()
+
+    def close(self, reason='', code=-1):
+        pass
+
+    def wait_for(self, messages: int, timeout: float = 30.0):
+        with self._sent:
+            if not self._sent.wait_for(lambda: self.messages >= messages, timeout):
+                raise TimeoutError('{n} of {total} messages sent'.format(n=self.messages, total=messages))
+
+
+class LogVolume(logging.Handler):
+    """ Counts the log records and their formatted size, without writing them anywhere. """
+
+    def __init__(self):
+        super().__init__()
+        self.records = 0
+        self.bytes = 0
+
+    def emit(self, record):
+        self.records += 1
+        self.bytes += len(self.format(record))
+
+
+def rss_bytes() -> int:
+    """ Resident set size of this process, or 0 where /proc is not available. """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+class Soak:
+    """
+    Drives an adapter core like AMP does: connect, announce, configure, and then stimuli, with
+    at most `in_flight` stimuli waiting for their response.
+    """
+
+    def __init__(self, in_flight: int = 16):
+        self.in_flight = in_flight
+        self.broker = NullBroker()
+        self.handler = SoakHandler()
+        self.adapter_core = AdapterCore('Soak@test', self.broker, self.handler)
+        self.broker.register_adapter_core(self.adapter_core)
+        self.handler.register_adapter_core(self.adapter_core)
+        self.stimuli = {name: message_pb2.Message(label=Label(Sort.STIMULUS, name, 'soak', parameters=parameters)
+                                                  .encode()).SerializeToString()
+                        for name, parameters in LABEL_TYPES.items()}
+        self.configuration = message_pb2.Message(
+            configuration=self.handler.default_configuration().encode()).SerializeToString()
+
+    def connect(self):
+        """ Open the connection: announcement, configuration and ready. """
+        expected = self.broker.messages + 2
+        self.adapter_core.on_open()
+        self.adapter_core.handle_message(memoryview(self.configuration))
+        self.broker.wait_for(expected)
+
+    def reconnect(self):
+        self.adapter_core.on_close()
+        self.connect()
+
+    def pump(self, names: list, count: int):
+        """ Send `count` stimuli, cycling through the given label types. Every stimulus results in two messages. """
+        first = self.broker.messages
+        for n in range(count):
+            if n >= self.in_flight:
+                self.broker.wait_for(first + 2 * (n - self.in_flight + 1))
+            self.adapter_core.handle_message(memoryview(self.stimuli[names[n % len(names)]]))
+        self.broker.wait_for(first + 2 * count)
+
+    def close(self):
+        self.adapter_core.close()
+
+
+def sample(soak: Soak, stimuli: int) -> dict:
+    return {
+        'stimuli': stimuli,
+        'traced_bytes': tracemalloc.get_traced_memory()[0],
+        'rss_bytes': rss_bytes(),
+        'threads': threading.active_count(),
+        'queue_to_amp': soak.adapter_core.qthread_to_amp.queue.qsize(),
+        'queue_handle_message': soak.adapter_core.qthread_handle_message.queue.qsize(),
+    }
+
+
+def allocation_sites(soak: Soak, name: str, count: int, top: int = 5) -> list:
+    """ The sites that allocated the most memory while stimuli of one label type were handled. """
+    soak.pump([name], count)  # warm up
+    before = tracemalloc.take_snapshot()
+    soak.pump([name], count)
+    after = tracemalloc.take_snapshot()
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen *>')]
+    statistics_ = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')
+    return [{'site': '{file}:{line}'.format(file=os.path.relpath(stat.traceback[0].filename), line=stat.traceback[0].lineno),
+             'size_diff': stat.size_diff, 'count_diff': stat.count_diff}
+            for stat in statistics_[:top]]
+
+
+def sustained_growth(samples: list, key: str, tolerance: float) -> bool:
+    """ Whether the medians of the thirds of the samples increase, in total by more than the tolerance. """
+    values = [s[key] for s in samples]
+    third = len(values) // 3
+    if third < 2:
+        return False
+    medians = [statistics.median(values[i * third:(i + 1) * third]) for i in range(3)]
+    return medians[0] < medians[1] < medians[2] and medians[2] - medians[0] > tolerance
+
+
+def run(stimuli: int = 200000, sample_every: int = 2000, reconnect_every: int = 20000, in_flight: int = 16,
+        site_stimuli: int = 2000, tolerances: dict = None) -> dict:
+    """
+    Run the soak test.
+
+    Returns:
+        dict: The samples, allocation sites per label type, log volume, and the quantities with sustained growth
+    """
+    tolerances = dict({'traced_bytes': 1 << 20, 'rss_bytes': 16 << 20, 'threads': 0, 'queue_to_amp': in_flight,
+                       'queue_handle_message': in_flight}, **(tolerances or {}))
+    log_volume = LogVolume()
+    logging.getLogger().addHandler(log_volume)
+    tracemalloc.start()
+    soak = Soak(in_flight)
+    try:
+        soak.connect()
+        sites = {name: allocation_sites(soak, name, site_stimuli) for name in LABEL_TYPES}
+
+        names = list(LABEL_TYPES)
+        warm_up = max(sample_every, stimuli // 10)
+        soak.pump(names, warm_up)
+        records_before, log_bytes_before = log_volume.records, log_volume.bytes
+
+        samples = [sample(soak, 0)]
+        start = time.perf_counter()
+        done = 0
+        while done < stimuli:
+            count = min(sample_every, stimuli - done)
+            soak.pump(names, count)
+            done += count
+            if reconnect_every and done % reconnect_every < count:
+                soak.reconnect()
+            samples.append(sample(soak, done))
+        elapsed = time.perf_counter() - start
+    finally:
+        soak.close()
+        tracemalloc.stop()
+        logging.getLogger().removeHandler(log_volume)
+
+    return {
+        'stimuli': stimuli,
+        'stimuli_per_second': stimuli / elapsed,
+        'log_records_per_stimulus': (log_volume.records - records_before) / stimuli,
+        'log_bytes_per_stimulus': (log_volume.bytes - log_bytes_before) / stimuli,
+        'allocation_sites': sites,
+        'samples': samples,
+        'growth': [key for key, tolerance in tolerances.items() if sustained_growth(samples, key, tolerance)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stimuli', type=int, default=200000, help='Number of stimuli after the warm-up (default: 200000)')
+    parser.add_argument('--sample-every', type=int, default=2000, help='Stimuli between two samples (default: 2000)')
+    parser.add_argument('--reconnect-every', type=int, default=20000,
+                        help='Stimuli between two reconnects of AMP, 0 to never reconnect (default: 20000)')
+    parser.add_argument('--in-flight', type=int, default=16, help='Stimuli waiting for their response (default: 16)')
+    parser.add_argument('--log-level', default='INFO', help='Log level of the adapter (default: INFO)')
+    parser.add_argument('--json', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level)
+    result = run(args.stimuli, args.sample_every, args.reconnect_every, args.in_flight)
+
+    first, last = result['samples'][0], result['samples'][-1]
+    print('{stimuli} stimuli, {stimuli_per_second:.0f}/s, {log_records_per_stimulus:.1f} log records '
+          '({log_bytes_per_stimulus:.0f} bytes) per stimulus'.format(**result))
+    for key in ('traced_bytes', 'rss_bytes', 'threads', 'queue_to_amp', 'queue_handle_message'):
+        print('  {key:<22} {first:>12} -> {last:>12}{growth}'.format(
+            key=key, first=first[key], last=last[key], growth='  GROWING' if key in result['growth'] else ''))
+    for name, sites in result['allocation_sites'].items():
+        print('top allocation sites of {name}:'.format(name=name))
+        for site in sites:
+            print('  {size_diff:>+10} B {count_diff:>+7} blocks  {site}'.format(**site))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(result, file, indent=2)
+    if result['growth']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
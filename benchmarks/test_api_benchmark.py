@@ -0,0 +1,35 @@
+"""
+The API benchmark as a pytest suite: `python -m pytest benchmarks/test_api_benchmark.py`.
+Every case is checked to round trip, then measured briefly. Set API_BENCHMARK_JSON to a file
+name to write the results in the format of `api_benchmark.py --json`.
+"""
+import json
+import os
+import platform
+import time
+
+import pytest
+
+from api_benchmark import benchmark_case, cases, round_trips
+
+CASES = cases()
+RESULTS = {}
+
+
+@pytest.fixture(scope='module', autouse=True)
+def results_file():
+    yield
+    path = os.environ.get('API_BENCHMARK_JSON')
+    if path and RESULTS:
+        with open(path, 'w') as file:
+            json.dump({'python': platform.python_version(), 'time': time.time(), 'results': RESULTS}, file, indent=2)
+
+
+@pytest.mark.parametrize('name', list(CASES))
+def test_api_case(name):
+    dto, encode, decode = CASES[name]
+    assert round_trips(dto, encode, decode)
+
+    RESULTS[name] = result = benchmark_case(encode, decode, min_time=0.02)
+    assert result['encode_ops_per_second'] > 0 and result['decode_ops_per_second'] > 0
+
@@ -0,0 +1,15 @@
+"""
+The import benchmark as a pytest suite: `python -m pytest benchmarks/test_import_benchmark.py`.
+Every scenario is imported in a few fresh interpreters, and must not load any module twice.
+"""
+import pytest
+
+from import_benchmark import SCENARIOS, benchmark_scenario
+
+
+@pytest.mark.parametrize('name', list(SCENARIOS))
+def test_import_scenario(name):
+    result = benchmark_scenario(SCENARIOS[name], repeat=1)
+
+    assert result['duplicates'] == []
+    assert result['warm']['median_ms'] > 0 and result['cold']['median_ms'] > 0
@@ -0,0 +1,16 @@
+"""
+A short soak test as a pytest test: `python -m pytest benchmarks/test_soak.py`.
+Set SOAK_STIMULI to soak longer, e.g. the 200000 stimuli of `soak_test.py`.
+"""
+import os
+
+from soak_test import LABEL_TYPES, run
+
+
+def test_soak_has_no_sustained_growth():
+    stimuli = int(os.environ.get('SOAK_STIMULI', 12000))
+    result = run(stimuli, sample_every=stimuli // 12, reconnect_every=stimuli // 3, site_stimuli=500)
+
+    assert result['growth'] == []
+    assert set(result['allocation_sites']) == set(LABEL_TYPES)
+    assert result['samples'][-1]['threads'] == result['samples'][0]['threads']
@@ -1,4 +1,4 @@
-from setuptools import setup
+from setuptools import find_packages, setup
 
 # The information here can also be placed in setup.cfg - better separation of
 # logic and declaration, and simpler if you include description/version in a file.
@@ -9,5 +9,13 @@ setup(
     author_email="info@axini.com",
     description="Axini AMP Plugin Adapter for the SmartDoor example",
     package_dir={"": "src"},
-    python_requires='>=3.10',
+    packages=find_packages("src"),
+    python_requires='>=3.12',
+    install_requires=["protobuf", "websocket-client==1.9.2", "requests"],
+    entry_points={
+        "console_scripts": [
+            "amp-adapter = adapter.plugin_adapter:main",
+            "amp-fleet = adapter.fleet:main",
+        ],
+    },
 )
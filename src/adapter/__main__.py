@@ -0,0 +1,3 @@
+from .plugin_adapter import main
+
+main()
@@ -0,0 +1,308 @@
+import argparse
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import time
+
+FLEET_LOG_FORMAT = '%(asctime)s-[%(levelname)8s] %(processName)s %(threadName)s %(name)s::%(module)s|%(lineno)s:: %(message)s'
+FLEET_LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Top-level keys of a config that `supervisor.Supervisor.from_dict` uses as defaults for all instances
+INSTANCE_DEFAULTS = ('url', 'handler', 'ping_interval', 'ping_timeout', 'compress_threshold', 'keep_sut_warm')
+
+
+def shard_instances(config: dict) -> list:
+    """
+    Split the instances of a fleet config into one supervisor config per worker process.
+
+    Instances without an `endpoint` or `docker_container` configuration get one assigned,
+    round-robin, from the `synapses` list of the config. The defaults for all instances, such as
+    `url` and `keep_sut_warm`, are copied into every shard.
+
+    Args:
+        config (dict): The fleet config, see `Fleet`
+    Returns:
+        [dict]: Supervisor configs, see `supervisor.Supervisor.from_config`
+    """
+    synapses = config.get('synapses', [])
+    per_worker = max(1, config.get('instances_per_worker', 1))
+
+    instances = []
+    for index, instance in enumerate(config['instances']):
+        instance = dict(instance)
+        configuration = dict(instance.get('configuration', {}))
+        if synapses:
+            synapse = synapses[index % len(synapses)]
+            for key in ('endpoint', 'docker_container'):
+                if key in synapse:
+                    configuration.setdefault(key, synapse[key])
+        instance['configuration'] = configuration
+        instances.append(instance)
+
+    defaults = {key: config[key] for key in INSTANCE_DEFAULTS if key in config}
+    return [dict(defaults, instances=instances[start:start + per_worker])
+            for start in range(0, len(instances), per_worker)]
+
+
+def _worker_main(shard: dict, log_queue, metrics_queue, loglevel: int, report_interval: float):
+    """
+    Entry point of a worker process: run a supervisor for one shard and report its health.
+    The worker exits with code 1 as soon as one of its instances stops, so the fleet restarts it.
+    """
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.setLevel(loglevel)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    from .supervisor import Supervisor
+
+    try:
+        supervisor = Supervisor.from_dict(shard)
+        supervisor.start()
+    except Exception:
+        logging.exception('Worker failed to start')
+        _exit_worker(1, log_queue, metrics_queue)
+
+    while True:
+        stopped = supervisor.wait(report_interval)
+        metrics_queue.put((multiprocessing.current_process().name, supervisor.health()))
+        if stopped:
+            logging.error('Instances {names} stopped, ending the worker'.format(names=stopped))
+            _exit_worker(1, log_queue, metrics_queue)
+
+
+def _exit_worker(code: int, *queues):
+    """
+    End the worker process. The instance threads do not end by themselves, so the process is ended
+    with `os._exit`, after the queues to the parent have been flushed.
+    """
+    for process_queue in queues:
+        process_queue.close()
+        process_queue.join_thread()
+    os._exit(code)
+
+
+class Worker:
+    """
+    Bookkeeping of one worker process of the fleet.
+
+    Attributes:
+        name (str): Process name, e.g. 'worker-0'
+        shard (dict): Supervisor config of the instances run by this worker
+        process (multiprocessing.Process): The current process; replaced on restart
+        restarts (int): Number of times the worker has been restarted
+    """
+
+    def __init__(self, name: str, shard: dict):
+        self.name = name
+        self.shard = shard
+        self.process = None
+        self.restarts = 0
+        self.started_at = None
+        self.restart_at = None
+        self.failures = 0  # consecutive crashes, determines the backoff
+
+
+class Fleet:
+    """
+    Launches adapter instances in a pool of worker processes, so large test campaigns are not
+    limited by the GIL of a single process. Every worker runs a `supervisor.Supervisor` with one
+    or more instances. Crashed workers are restarted with exponential backoff. The logs of all
+    workers are written by the parent to one file, and their health reports are aggregated.
+
+    The config file has the form:
+
+        {
+          "url": "wss://...",
+          "handler": "matrix",
+          "instances_per_worker": 1,
+          "synapses": [
+            {"endpoint": "http://localhost:8008", "docker_container": "synapse1"},
+            {"endpoint": "http://localhost:8009", "docker_container": "synapse2"}
+          ],
+          "instances": [
+            {"name": "Matrix@run1", "token": "..."},
+            {"name": "Matrix@run2", "token": "..."}
+          ]
+        }
+
+    Attributes:
+        config (dict): The fleet config
+        workers ([Worker]): The workers
+        backoff (float): Delay before the first restart of a crashed worker, doubled per consecutive crash
+        max_backoff (float): Upper bound of the restart delay
+        stable_after (float): Seconds a worker must run before its crash counter is reset
+        report_interval (float): Seconds between two health reports of a worker
+        metrics_file (str): Optional file to which the aggregated view is written as JSON
+    """
+
+    def __init__(self, config: dict, loglevel: int = logging.INFO, log_file: str = 'output.txt',
+                 backoff: float = 1.0, max_backoff: float = 60.0, stable_after: float = 60.0,
+                 report_interval: float = 10.0, metrics_file: str = None):
+        self.config = config
+        self.loglevel = loglevel
+        self.log_file = log_file
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.report_interval = report_interval
+        self.metrics_file = metrics_file
+
+        self.context = multiprocessing.get_context('spawn')
+        self.log_queue = self.context.Queue()
+        self.metrics_queue = self.context.Queue()
+        self.workers = [Worker('worker-{n}'.format(n=n), shard) for n, shard in enumerate(shard_instances(config))]
+        self.health = {}  # worker name -> latest health report
+
+        self._listener = None
+
+    def start(self):
+        """ Start the log writer and all worker processes. """
+        file_handler = logging.FileHandler(self.log_file, mode='a')
+        file_handler.setFormatter(logging.Formatter(FLEET_LOG_FORMAT, datefmt=FLEET_LOG_DATE_FORMAT))
+        self._listener = logging.handlers.QueueListener(self.log_queue, file_handler)
+        self._listener.start()
+        logging.getLogger().addHandler(file_handler)  # records of the parent itself
+
+        for worker in self.workers:
+            self._spawn(worker)
+
+    def run_forever(self):
+        """ Start the fleet and supervise the workers until interrupted. """
+        self.start()
+        last_report = time.monotonic()
+        try:
+            while True:
+                self._collect_metrics(timeout=1.0)
+                self._check_workers()
+                if time.monotonic() - last_report >= self.report_interval:
+                    self.report()
+                    last_report = time.monotonic()
+        finally:
+            self.stop()
+
+    def stop(self):
+        """ Terminate all workers and flush the logs. """
+        for worker in self.workers:
+            if worker.process and worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process:
+                worker.process.join()
+        if self._listener:
+            self._listener.stop()
+
+    def aggregate(self) -> dict:
+        """
+        One view of the whole fleet: summed counters, worst latencies and the per-instance health.
+
+        Returns:
+            dict
+        """
+        counters = {}
+        histograms = {}
+        instances = {}
+        for worker_health in self.health.values():
+            for name, status in worker_health.items():
+                instances[name] = status
+                for counter, value in status['metrics']['counters'].items():
+                    counters[counter] = counters.get(counter, 0) + value
+                for histogram, snapshot in status['metrics']['histograms'].items():
+                    worst = histograms.setdefault(histogram, {'count': 0, 'p99': 0.0, 'max': 0.0})
+                    worst['count'] += snapshot['count']
+                    worst['p99'] = max(worst['p99'], snapshot['p99'])
+                    worst['max'] = max(worst['max'], snapshot['max'])
+
+        return {
+            'workers': {worker.name: {'pid': worker.process.pid if worker.process else None,
+                                      'alive': bool(worker.process and worker.process.is_alive()),
+                                      'restarts': worker.restarts}
+                        for worker in self.workers},
+            'counters': counters,
+            'histograms': histograms,
+            'instances': instances,
+        }
+
+    def report(self):
+        """ Log the aggregated view and write it to `metrics_file`. """
+        view = self.aggregate()
+        alive = sum(1 for worker in view['workers'].values() if worker['alive'])
+        logging.info('Fleet: {alive}/{total} workers alive, {instances} instances reporting, counters: {counters}'
+                     .format(alive=alive, total=len(self.workers), instances=len(view['instances']),
+                             counters=view['counters']))
+        if self.metrics_file:
+            with open(self.metrics_file, 'w') as file:
+                json.dump(dict(view, time=time.time()), file, indent=2)
+
+    def _spawn(self, worker: Worker):
+        worker.process = self.context.Process(
+            target=_worker_main, name=worker.name,
+            args=(worker.shard, self.log_queue, self.metrics_queue, self.loglevel, self.report_interval))
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+        logging.info('Started {name} (pid {pid}) with instances {instances}'.format(
+            name=worker.name, pid=worker.process.pid,
+            instances=[instance['name'] for instance in worker.shard['instances']]))
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.restart_at is not None:
+                if now >= worker.restart_at:
+                    worker.restarts += 1
+                    self._spawn(worker)
+                continue
+
+            if worker.process.is_alive():
+                if now - worker.started_at >= self.stable_after:
+                    worker.failures = 0
+                continue
+
+            delay = min(self.max_backoff, self.backoff * 2 ** worker.failures)
+            worker.failures += 1
+            worker.restart_at = now + delay
+            self.health.pop(worker.name, None)
+            logging.error('{name} exited with code {code}, restarting in {delay:.1f}s'.format(
+                name=worker.name, code=worker.process.exitcode, delay=delay))
+
+    def _collect_metrics(self, timeout: float):
+        try:
+            name, health = self.metrics_queue.get(timeout=timeout)
+            self.health[name] = health
+            while True:
+                name, health = self.metrics_queue.get_nowait()
+                self.health[name] = health
+        except queue.Empty:
+            pass
+
+
+def main():
+    """ Entry point of the `amp-fleet` command. """
+    parser = argparse.ArgumentParser(description='Run a fleet of adapter instances in worker processes')
+    parser.add_argument('config', help='JSON fleet config, see fleet.Fleet')
+    parser.add_argument('-ll', '--log_level', default='INFO',
+                        help='AMP Adapter logger level: ERROR, WARNING, INFO, DEBUG (default: INFO)')
+    parser.add_argument('--log-file', default='output.txt', help='Log file of the whole fleet (default: output.txt)')
+    parser.add_argument('--report-interval', type=float, default=10.0,
+                        help='Seconds between two aggregated health reports (default: 10)')
+    parser.add_argument('--metrics-file', help='File to which the aggregated view is written as JSON')
+    parser.add_argument('--max-backoff', type=float, default=60.0,
+                        help='Maximum delay before restarting a crashed worker (default: 60)')
+    args = parser.parse_args()
+
+    with open(args.config) as config_file:
+        fleet_config = json.load(config_file)
+
+    logging.basicConfig(level=args.log_level, format=FLEET_LOG_FORMAT, datefmt=FLEET_LOG_DATE_FORMAT)
+
+    fleet = Fleet(fleet_config, loglevel=args.log_level, log_file=args.log_file, max_backoff=args.max_backoff,
+                  report_interval=args.report_interval, metrics_file=args.metrics_file)
+    fleet.run_forever()
+
+
+if __name__ == '__main__':
+    main()
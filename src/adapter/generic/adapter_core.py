@@ -1,17 +1,29 @@
+from __future__ import annotations
+
 import logging
 import time
 
 from enum import Enum
 from typing import List
 from queue import Queue
-from threading import Thread
+from threading import Event, RLock, Thread, Timer
 
-from .api import label_pb2, message_pb2, announcement_pb2, configuration_pb2
 from .api.configuration import Configuration
 from .api.label import Label
 from .broker_connection import BrokerConnection
 from .handler import Handler
+from .lazy_import import lazy_import
+from .metrics import Metrics
 from .qthread import QThread
+from .reconnect import ReconnectManager
+from .util.payload_log import hexdump
+
+# Imported on first use, so only the modules needed to connect are loaded before connecting to AMP
+label_pb2 = lazy_import('.api.label_pb2', __package__)
+message_pb2 = lazy_import('.api.message_pb2', __package__)
+announcement_pb2 = lazy_import('.api.announcement_pb2', __package__)
+configuration_pb2 = lazy_import('.api.configuration_pb2', __package__)
+protobuf_message = lazy_import('google.protobuf.message')
 
 class State(Enum):
     """
@@ -35,37 +47,84 @@ class AdapterCore:
         name (str): The communicated name of this adapter
         broker_connection (BrokerConnection): The broker connection does the communication to AMP
         handler (adapter.generic.handler.Handler): The handler that handles the communication to the SUT
+        metrics (Metrics): Counters and latency histograms of this adapter
+        reconnect_manager (ReconnectManager): Backoff policy for reconnecting to AMP
+        keep_sut_warm (float): Seconds the SUT connection is kept after the connection with AMP dropped.
+            If AMP reconnects within this period with the same configuration, the handler is resumed
+            instead of restarted. 0 stops the handler immediately.
     """
 
-    def __init__(self, name: str, broker_connection: BrokerConnection, handler: Handler):
+    def __init__(self, name: str, broker_connection: BrokerConnection, handler: Handler,
+                 reconnect_manager: ReconnectManager = None, keep_sut_warm: float = 0.0):
         self.name = name
         self.broker_connection = broker_connection
         self.handler = handler
         self.state = State.DISCONNECTED
+        self.metrics = Metrics()
+        self.last_message_time = None
+        self.reconnect_manager = reconnect_manager or ReconnectManager()
+        self.keep_sut_warm = keep_sut_warm
+
+        self._stopped = Event()
+        self._sut_lock = RLock()  # held while the handler is started, reconfigured, resumed or stopped
+        self._sut_configuration = None  # configuration the running SUT connection was started with
+        self._sut_timer = None  # stops a SUT kept warm once the grace period has passed
 
         # QThread for sending messages to AMP.
-        self.qthread_to_amp = QThread(process_item = self._send_message_to_amp)
+        self.qthread_to_amp = QThread(process_item = self._send_message_to_amp,
+                                      name = '{name}/qthread_to_amp'.format(name=name))
         self.qthread_to_amp.start()
 
         # QThread for handling messages from AMP.
-        self.qthread_handle_message = QThread(process_item = self._handle_message)
+        self.qthread_handle_message = QThread(process_item = self._handle_message,
+                                              name = '{name}/qthread_handle_message'.format(name=name))
         self.qthread_handle_message.start()
 
     def start(self):
-        """ Start the adapter core which will open a connection with AMP. """
+        """
+        Start the adapter core which will open a connection with AMP.
+        Blocks while connected, and reconnects with backoff whenever the connection is closed,
+        until `stop` is called.
+        """
+        self._stopped.clear()
 
-        self._clear_qthread_queues()
+        while not self._stopped.is_set():
+            self._clear_qthread_queues()
 
-        if self.state == State.DISCONNECTED:
-            logging.info('Connecting to broker')
-            self.broker_connection.connect()
-        else:
-            logging.info('Connection started while already connected')
+            if self.state == State.DISCONNECTED:
+                logging.info('Connecting to broker')
+                self.broker_connection.connect()
+            else:
+                logging.info('Connection started while already connected')
+                return
+
+            self.state = State.DISCONNECTED
+            self.reconnect_manager.disconnected()
+            if self._stopped.is_set():
+                break
+
+            delay = self.reconnect_manager.next_delay()
+            logging.info('Trying to reconnect to AMP in {delay:.1f} seconds'.format(delay=delay))
+            self.metrics.increment('reconnects')
+            self._stopped.wait(delay)
+
+    def stop(self):
+        """ Close the connection with AMP without reconnecting, and stop the SUT. """
+        self._stopped.set()
+        self.broker_connection.close(reason='Adapter stopped')
+        self._stop_sut()
+
+    def close(self):
+        """ Stop the adapter like `stop`, and end its worker threads. The adapter core cannot be started again. """
+        self.stop()
+        self.qthread_handle_message.stop()
+        self.qthread_to_amp.stop()
 
     def on_open(self):
         """ Broker call back for when the connection is opened with AMP. """
         if self.state == State.DISCONNECTED:
             self.state = State.CONNECTED
+            self.reconnect_manager.connected()
 
             self.send_announcement(self.name, self.handler.supported_labels(),
                                    self.handler.get_configuration())
@@ -74,34 +133,69 @@ class AdapterCore:
             logging.info('Connection opened while already connected')
 
     def on_close(self):
-        """ Connection with AMP has been closed. Try to reconnect. """
+        """
+        Connection with AMP has been closed. `start` takes care of reconnecting once the
+        broker connection has returned. The SUT is stopped, or kept warm for `keep_sut_warm` seconds.
+        """
         self.state = State.DISCONNECTED
         self._clear_qthread_queues()
-        self.handler.stop()
-        logging.info('Trying to reconnect to AMP')
-        self.start() # reconnect to AMP - keep the adapter alive
+
+        with self._sut_lock:
+            if self._sut_configuration is not None and self.keep_sut_warm and not self._stopped.is_set():
+                logging.info('Keeping the SUT connection for {s} seconds'.format(s=self.keep_sut_warm))
+                timer = self._sut_timer = Timer(self.keep_sut_warm, lambda: self._stop_warm_sut(timer))
+                self._sut_timer.daemon = True
+                self._sut_timer.start()
+                return
+
+        self._stop_sut()
 
     def on_configuration(self, pb_config: configuration_pb2.Configuration):
         """
         Call back when a `Configuration` message is received from AMP.
+        A configuration received while already configured is applied without reconnecting to AMP:
+        in place if the handler supports it (see `Handler.reconfigure`), otherwise by restarting the SUT.
 
         Args:
             pb_config (configuration_pb2.Configuration)
         """
+        if self.state in (State.ANNOUNCED, State.CONFIGURED, State.READY):
+            configuration = self._decode_configuration(pb_config)
+            if configuration is None:
+                return
+
         if self.state == State.ANNOUNCED:
             logging.info('Configuration received')
             self.state = State.CONFIGURED
 
-            # Start the SUT
-            logging.info('Connecting to the SUT')
-            # try:
-            self.handler.set_configuration(Configuration.decode(pb_config))
-            self.handler.start()
+            with self._sut_lock:
+                if self._sut_timer:
+                    self._sut_timer.cancel()
+                    self._sut_timer = None
+                running = self._sut_configuration
+
+                if running is not None:
+                    changed = running.changes(configuration)
+                    if not changed:
+                        logging.info('Resuming the SUT connection that was kept during the reconnect')
+                        self.metrics.increment('sut_resumes')
+                        self.handler.set_configuration(configuration)
+                        self.handler.resume()
+                        return
+                    if self._reconfigure_sut(configuration, changed):
+                        return
+
+                self._start_sut(configuration)
+
+        elif self.state in (State.CONFIGURED, State.READY):
+            logging.info('New configuration received')
+            self.state = State.CONFIGURED
+            self._clear_qthread_queues()
 
-            # except Exception as e:
-            #     logging.error('Error connection to the SUT: {}'.format(e))
-            #     self.send_error(str(e))
-            #     return
+            with self._sut_lock:
+                changed = self._sut_configuration.changes(configuration) if self._sut_configuration else None
+                if changed is None or not self._reconfigure_sut(configuration, changed):
+                    self._start_sut(configuration)
 
         elif self.state == State.CONNECTED:
             message = 'Configuration received while not yet announced'
@@ -109,7 +203,7 @@ class AdapterCore:
             self.send_error(message)
 
         else:
-            message = 'Configuration received while already configured'
+            message = 'Configuration received while not connected'
             logging.error(message)
             self.send_error(message)
 
@@ -129,7 +223,10 @@ class AdapterCore:
             # try:
             # Perform the stimulus action (which could trigger a response).
             logging.debug("Call handler.stimulate for '{name}'".format(name=pb_label.label))
+            self.metrics.increment('stimuli')
+            start = time.perf_counter()
             self.handler.stimulate(pb_label)
+            self.metrics.observe('stimulus_latency', time.perf_counter() - start)
 
             # except Exception as e:
             #     logging.error('Exception: {ex}'.format(ex=e))
@@ -143,6 +240,7 @@ class AdapterCore:
         """ Call back when a Reset message is received. """
         if self.state == State.READY:
             logging.debug('Reset message received')
+            self.metrics.increment('resets')
             self._clear_qthread_queues()
 
             # try:
@@ -185,6 +283,7 @@ class AdapterCore:
         Args:
             message (str): Send an error message to AMP
         """
+        self.metrics.increment('errors')
         self._queue_message_to_amp(message_pb2.Message(error=message_pb2.Message.Error(message=message)))
         self.broker_connection.close(reason=message)
 
@@ -199,6 +298,7 @@ class AdapterCore:
 
         if pb_label.type == label_pb2.Label.LabelType.RESPONSE:
             logging.info('Sending response to AMP: !{label}'.format(label=pb_label.label))
+            self.metrics.increment('responses')
             self._queue_message_to_amp(message_pb2.Message(label=pb_label))
         else:
             message = 'Label is not of type Response'
@@ -245,25 +345,28 @@ class AdapterCore:
         logging.debug('Sending confirmation for stimulus ?{label} to AMP'.format(label=pb_label.label))
         self._queue_message_to_amp(message_pb2.Message(label=pb_label))
 
-    def handle_message(self, raw_message:str):
+    def handle_message(self, raw_message: memoryview):
         """
         Handle the message coming in from AMP.
         Adds the message to the queue of messages to be handled by
         qthread_handle_message.
 
         Args:
-            raw_message (str): Raw string message from AMP.
+            raw_message (memoryview): View of the raw message from AMP.
         """
         logging.debug('Adding message (id: {id}) from AMP to the queue to be handled'.format(id=id(raw_message)))
+        self.metrics.increment('messages_received')
+        self.last_message_time = time.time()
         self.qthread_handle_message.put(raw_message)
 
-    def _handle_message(self, raw_message:str):
+    def _handle_message(self, raw_message: memoryview):
         """
         QThread's process_item method for processing a raw_message from AMP.
-        Handles the message from AMP.
+        Handles the message from AMP. Messages that cannot be decoded are counted as
+        `malformed_messages` and dropped.
 
         Args:
-            raw_message (str): Raw string message from AMP.
+            raw_message (memoryview): View of the raw message from AMP; parsed without copying.
         """
 
         logging.debug('Starting the handling of message (id: {id}) from AMP'.format(id=id(raw_message)))
@@ -271,8 +374,11 @@ class AdapterCore:
 
         try:
             pb_message.ParseFromString(raw_message)
-        except Exception as e:
-            logging.error('Could not decode message due to: {ex}'.format(ex=e))
+        except protobuf_message.DecodeError as e:
+            self.metrics.increment('malformed_messages')
+            logging.error('Dropping message of {size} bytes that could not be decoded due to: {ex}, starting with: {dump}'
+                          .format(size=memoryview(raw_message).nbytes, ex=e, dump=hexdump(raw_message)))
+            return
 
         if pb_message.HasField('configuration'):
             logging.debug('Received a configuration')
@@ -291,6 +397,92 @@ class AdapterCore:
         else:
             logging.debug('Unknown message type: {msg}'.format(msg=pb_message))
 
+    def health(self) -> dict:
+        """
+        Health status of this adapter, suitable for JSON serialization.
+
+        Returns:
+            dict: name, state, seconds since the last message from AMP, queue sizes and metrics
+        """
+        return {
+            'name': self.name,
+            'state': self.state.name,
+            'seconds_since_last_message': time.time() - self.last_message_time if self.last_message_time else None,
+            'queue_to_amp': self.qthread_to_amp.queue.qsize(),
+            'queue_handle_message': self.qthread_handle_message.queue.qsize(),
+            'metrics': self.metrics.snapshot(),
+        }
+
+    def _decode_configuration(self, pb_config: configuration_pb2.Configuration) -> Configuration:
+        """
+        Decode the configuration and validate it against the handler's default configuration.
+
+        Returns:
+            Configuration: The validated configuration, or None if it was rejected
+        """
+        try:
+            return self.handler.validate_configuration(Configuration.decode(pb_config))
+        except ValueError as e:
+            logging.error(str(e))
+            self.send_error(str(e))
+            return None
+
+    def _start_sut(self, configuration: Configuration):
+        """ Stop the handler if it has been started, and start it with the given configuration. """
+        with self._sut_lock:
+            self._stop_sut()
+
+            # Start the SUT
+            logging.info('Connecting to the SUT')
+            # try:
+            self.handler.set_configuration(configuration)
+            self.handler.start()
+            self._sut_configuration = configuration
+
+        # except Exception as e:
+        #     logging.error('Error connection to the SUT: {}'.format(e))
+        #     self.send_error(str(e))
+        #     return
+
+    def _reconfigure_sut(self, configuration: Configuration, changed: set) -> bool:
+        """
+        Apply the configuration to the running handler in place.
+
+        Returns:
+            bool: Whether the handler applied it; if not, it still has to be restarted
+        """
+        logging.info('Reconfiguring the SUT: {names}'.format(names=', '.join(sorted(changed))))
+        with self._sut_lock:
+            self.handler.set_configuration(configuration)
+            if not self.handler.reconfigure(changed):
+                logging.info('The handler cannot apply the configuration in place, restarting the SUT')
+                return False
+            self._sut_configuration = configuration
+        self.metrics.increment('sut_reconfigures')
+        return True
+
+    def _stop_sut(self):
+        """ Stop the handler if it has been started. """
+        with self._sut_lock:
+            if self._sut_timer:
+                self._sut_timer.cancel()
+                self._sut_timer = None
+            if self._sut_configuration is None:
+                return
+            self._sut_configuration = None
+            self.handler.stop()
+
+    def _stop_warm_sut(self, timer: Timer):
+        """
+        Stop the SUT kept warm once its grace period has passed. A timer that already fired when
+        AMP reconnected and cancelled it leaves the SUT alone, as it has been resumed or restarted.
+        """
+        with self._sut_lock:
+            if self._sut_timer is not timer:
+                return
+            self._sut_timer = None
+            self._stop_sut()
+
     def _clear_qthread_queues(self):
         logging.info('Clearing queues with pending messages')
         self.qthread_to_amp.clear_queue()
@@ -312,3 +504,4 @@ class AdapterCore:
         """ QThread's process_item method for sending a message to AMP. """
         logging.debug('Sending message to AMP ({id})'.format(id=id(message)))
         self.broker_connection.send(message.SerializeToString())
+        self.metrics.increment('messages_sent')
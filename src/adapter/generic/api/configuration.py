@@ -1,8 +1,12 @@
+from __future__ import annotations
+
 from enum import Enum
 from typing import List
 
-import generic.api.configuration_pb2 as configuration_pb2
-from generic.api.type import Type
+from ..lazy_import import lazy_import
+from .type import Type
+
+configuration_pb2 = lazy_import('.configuration_pb2', __package__)
 
 
 class ConfigurationItem:
@@ -98,12 +102,93 @@ class Configuration:
     Data Transfer Object representing the Configuration object.
     This class allows for the en- and decoding to their Google Protobuf format
 
+    The items can be looked up by name in constant time, e.g. `configuration.value('endpoint')`, so
+    handlers can read their settings per stimulus. The index is built on the first lookup; replace
+    `items` rather than changing the list after that.
+
     Attributes:
         items ([ConfigurationItem])
     """
 
     def __init__(self, items: List[ConfigurationItem]):
         self.items = items
+        self._index = None  # name -> item, built on the first lookup
+        self._indexed = None  # the list of items the index was built from
+
+    def item(self, name: str) -> ConfigurationItem:
+        """
+        The item with the given name.
+
+        Args:
+            name (str): Name of the item, e.g. 'endpoint'
+        Returns:
+            ConfigurationItem
+        """
+        if self._indexed is not self.items:
+            self._index = {item.name: item for item in self.items}
+            self._indexed = self.items
+        try:
+            return self._index[name]
+        except KeyError:
+            raise ValueError('Unknown configuration item {name}'.format(name=name)) from None
+
+    def __contains__(self, name: str) -> bool:
+        try:
+            self.item(name)
+        except ValueError:
+            return False
+        return True
+
+    def value(self, name: str) -> int | float | str | bool:
+        """ The value of the item with the given name. """
+        return self.item(name).value
+
+    def changes(self, other: Configuration) -> set:
+        """
+        The names of the items whose value differs in the other configuration, including items
+        that only one of the configurations has.
+
+        Args:
+            other (Configuration): E.g. a new configuration received from AMP
+        Returns:
+            {str}: Names of the changed items
+        """
+        values = {item.name: item.value for item in self.items}
+        other_values = {item.name: item.value for item in other.items}
+        return {name for name in values.keys() | other_values.keys()
+                if name not in values or name not in other_values or values[name] != other_values[name]}
+
+    def validate(self, schema: Configuration) -> Configuration:
+        """
+        Check the configuration against a schema, usually the default configuration of a handler.
+        Every item must be known to the schema and have its type; an integer is accepted for a
+        decimal item. Items that are missing get the value of the schema.
+
+        Args:
+            schema (Configuration): The expected items, with their types and default values
+        Returns:
+            Configuration: The validated configuration, with the items in the order of the schema
+        """
+        errors = ['unknown item {name}'.format(name=item.name) for item in self.items if item.name not in schema]
+        items = []
+        for expected in schema.items:
+            if expected.name not in self:
+                items.append(ConfigurationItem(expected.name, expected.tipe, expected.description, expected.value))
+                continue
+
+            item = self.item(expected.name)
+            value = item.value
+            if expected.tipe == Type.DECIMAL and item.tipe == Type.INTEGER:
+                value = float(value)
+            elif item.tipe != expected.tipe:
+                errors.append('{name} should be {expected}, not {tipe}'.format(
+                    name=item.name, expected=expected.tipe.name, tipe=item.tipe.name))
+                continue
+            items.append(ConfigurationItem(item.name, expected.tipe, item.description, value))
+
+        if errors:
+            raise ValueError('Invalid configuration: {errors}'.format(errors=', '.join(errors)))
+        return Configuration(items)
 
     def encode(self):
         """
@@ -1,9 +1,13 @@
+from __future__ import annotations
+
 from datetime import datetime
 from enum import Enum
 from typing import List
 
-from generic.api import label_pb2
-from generic.api.parameter import Parameter
+from ..lazy_import import lazy_import
+from .parameter import Parameter
+
+label_pb2 = lazy_import('.label_pb2', __package__)
 
 
 class Sort(Enum):
@@ -1,10 +1,14 @@
+from __future__ import annotations
+
 from datetime import datetime, date
 from types import SimpleNamespace
 from typing import Any
 
-from generic.api import label_pb2
-from generic.api.type import Type
-from generic.util.namespace_util import to_obj
+from ..lazy_import import lazy_import
+from ..util.namespace_util import to_obj
+from .type import Type
+
+label_pb2 = lazy_import('.label_pb2', __package__)
 
 
 def _determine_type_from_value(value) -> Type:
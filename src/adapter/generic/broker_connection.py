@@ -1,6 +1,11 @@
 import logging
+import threading
+import time
 import websocket
 
+from .compression import PerMessageDeflate
+from .util.payload_log import PayloadLogger
+
 class BrokerConnection:
     """
     This class holds the connection with the Axini Modeling Platform. It is responsible
@@ -11,14 +16,26 @@ class BrokerConnection:
     Attributes:
         url (str): The websocket URL of the AMP instance that should be connected to.
         token (str): Token to authorize with.
+        ping_interval (float): Seconds between two heartbeat pings. 0 disables the heartbeat.
+        ping_timeout (float): Seconds without a pong after which AMP is considered dead and the
+            connection is closed, which triggers a reconnect. Defaults to `ping_interval`.
+        compression (PerMessageDeflate): Offered to AMP if a compression threshold is given;
+            messages of at least the threshold are then compressed if AMP accepts it.
     """
 
-    def __init__(self, url, token):
+    def __init__(self, url, token, ping_interval=0.0, ping_timeout=None, compress_threshold=None):
         self.url = url
         self.token = token
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout or ping_interval
+        self.compression = PerMessageDeflate(compress_threshold) if compress_threshold is not None else None
+        self.payload_log = PayloadLogger()
         self.adapter_core = None  # callback to adapter; register separately
         self.websocket = None  # reference to websocket; initialized on #connect
 
+        self._heartbeat_stopped = threading.Event()
+        self._last_pong = None
+
     def register_adapter_core(self, adapter_core):
         """
         Set the adapter core object reference. Must be injected after creation because of possible circular dependencies
@@ -34,13 +51,18 @@ class BrokerConnection:
         """
         logging.info('Connecting to AMP')
 
+        header = {'Authorization': 'Bearer {token}'.format(token=self.token)}
+        if self.compression:
+            header.update(self.compression.offer())
+
         self.websocket = websocket.WebSocketApp(
             self.url,
             on_open=lambda _: self.on_open(),
             on_close=lambda _, close_status_code, close_msg: self.on_close(close_status_code, close_msg),
             on_message=lambda _, msg: self.on_message(msg),
             on_error=lambda _, msg: self.on_error(msg),
-            header={'Authorization': 'Bearer {token}'.format(token=self.token)},
+            on_pong=lambda _, data: self.on_pong(data),
+            header=header,
         )
 
         self.websocket.run_forever()
@@ -50,6 +72,14 @@ class BrokerConnection:
         Callback handler for when the connection with the Axini Modeling Platform is opened.
         """
         logging.info('Successfully opened a connection')
+        if self.compression:
+            if self.compression.negotiate(self.websocket.sock.getheaders()):
+                self.compression.install(self.websocket.sock)
+                logging.info('Compressing messages of {n} bytes or more'.format(n=self.compression.threshold))
+            else:
+                logging.info('AMP declined compression, sending messages uncompressed')
+        if self.ping_interval:
+            self._start_heartbeat()
         self.adapter_core.on_open()
 
     def on_close(self, close_status_code, close_msg):
@@ -62,17 +92,36 @@ class BrokerConnection:
         """
         logging.info('WebSocket connection has been closed with code: {code}, with reason: {reason}'
                      .format(code=close_status_code, reason=close_msg))
+        self._heartbeat_stopped.set()
         self.adapter_core.on_close()
 
     def on_message(self, message):
         """
         Callback handler for when a message is received from the Axini Modeling Platform.
+        The message is passed on as a `memoryview` of the received frame, so it is not copied.
+
+        Args:
+            message (bytes): The message that was sent by the Axini Modeling Platform.
+        """
+        if isinstance(message, str):
+            message = message.encode()
+        self.payload_log.log('Received a message', message)
+        self.adapter_core.handle_message(memoryview(message))
+
+    def on_pong(self, data):
+        """
+        Callback handler for when AMP answers a heartbeat ping. The payload of the ping is the
+        time it was sent, so the round-trip time can be computed without any bookkeeping.
 
         Args:
-            message (str): The message that was sent by the Axini Modeling Platform.
+            data (bytes): Payload of the pong, echoed from the ping
         """
-        logging.debug('Received a message: {msg}'.format(msg=message))
-        self.adapter_core.handle_message(message)
+        self._last_pong = time.monotonic()
+        try:
+            rtt = (time.perf_counter_ns() - int(data)) / 1e9
+        except ValueError:
+            return  # not one of our pings
+        self.adapter_core.metrics.observe('broker_rtt', rtt)
 
     def on_error(self, err):
         """
@@ -102,6 +151,33 @@ class BrokerConnection:
         else:
             logging.warning('No websocket initialized to close')
 
+    def _start_heartbeat(self):
+        self._heartbeat_stopped = threading.Event()
+        self._last_pong = time.monotonic()
+        thread = threading.Thread(target=self._heartbeat, args=(self.websocket, self._heartbeat_stopped),
+                                  name='broker_heartbeat', daemon=True)
+        thread.start()
+
+    def _heartbeat(self, ws, stopped):
+        """ Ping AMP every `ping_interval` seconds and close the connection if the pongs stop. """
+        while not stopped.wait(self.ping_interval):
+            silence = time.monotonic() - self._last_pong
+            if silence > self.ping_interval + self.ping_timeout:
+                logging.error('No pong received from AMP for {s:.1f} seconds, closing the connection'.format(s=silence))
+                self.adapter_core.metrics.increment('heartbeat_timeouts')
+                # A closing handshake cannot complete with a dead peer. Aborting the socket wakes up
+                # the blocked run_forever loop, which then reports the connection as closed.
+                ws.keep_running = False
+                sock = ws.sock
+                if sock:
+                    sock.abort()
+                return
+
+            try:
+                ws.sock.ping(str(time.perf_counter_ns()))
+            except Exception as e:
+                logging.warning('Failed sending heartbeat ping: {ex}'.format(ex=e))
+
     def send(self, raw_message):
         """
         Sends the given message` to the Axini Modeling Platform
@@ -113,8 +189,14 @@ class BrokerConnection:
             logging.warning('No connection to websocket (yet). Is the adapter connected to AMP?')
         else:
             try:
-                logging.debug('Sending out message: {msg}'.format(msg=raw_message))
-                self.websocket.send(raw_message, websocket.ABNF.OPCODE_BINARY)
+                self.payload_log.log('Sending out message', raw_message)
+                if self.compression and self.compression.should_compress(raw_message):
+                    frame = self.compression.frame(raw_message)
+                    self.websocket.sock.send_frame(frame)
+                    self.adapter_core.metrics.increment('compressed_messages')
+                    self.adapter_core.metrics.increment('compression_saved_bytes', len(raw_message) - len(frame.data))
+                else:
+                    self.websocket.send(raw_message, websocket.ABNF.OPCODE_BINARY)
                 logging.debug('Success send')
             except Exception as e:
                 logging.error('Failed sending message, exception: {ex}'.format(ex=e))
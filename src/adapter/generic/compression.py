@@ -0,0 +1,133 @@
+import zlib
+
+import websocket
+
+from websocket._abnf import frame_buffer
+
+# The version of websocket-client whose private frame reader `InflatingFrameBuffer` extends; the
+# dependency is pinned to it, and the tests fail when the installed version differs
+WEBSOCKET_CLIENT_VERSION = '1.9.2'
+
+EXTENSION_NAME = 'permessage-deflate'
+EXTENSION_OFFER = 'permessage-deflate; client_no_context_takeover; server_no_context_takeover'
+
+# Every compressed message ends with an empty deflate block, which is not sent (RFC 7692, section 7.2.1)
+_DEFLATE_TAIL = b'\x00\x00\xff\xff'
+
+
+class PerMessageDeflate:
+    """
+    The permessage-deflate websocket extension (RFC 7692). Only messages of at least `threshold`
+    bytes are compressed, so small messages such as stimulus confirmations do not pay the
+    latency of compression.
+
+    No compression context is kept between messages: every message is compressed on its own.
+    This costs some compression ratio on similar messages, but keeps memory constant per
+    connection and allows messages to be compressed and decompressed independently.
+
+    Attributes:
+        threshold (int): Minimum size in bytes of a message to be compressed
+        level (int): zlib compression level
+        enabled (bool): Whether the server accepted the extension; set by `negotiate`
+    """
+
+    def __init__(self, threshold: int = 1024, level: int = 6):
+        self.threshold = threshold
+        self.level = level
+        self.enabled = False
+
+    @staticmethod
+    def offer() -> dict:
+        """
+        Returns:
+            dict: The handshake request header offering the extension
+        """
+        return {'Sec-WebSocket-Extensions': EXTENSION_OFFER}
+
+    def negotiate(self, response_headers: dict) -> bool:
+        """
+        Check whether the server accepted the extension in its handshake response.
+
+        Args:
+            response_headers (dict): Handshake response headers, with lower case names
+        Returns:
+            bool: True if messages may be compressed
+        """
+        extensions = (response_headers or {}).get('sec-websocket-extensions', '')
+        self.enabled = any(extension.split(';')[0].strip() == EXTENSION_NAME for extension in extensions.split(','))
+        return self.enabled
+
+    def should_compress(self, payload: bytes) -> bool:
+        return self.enabled and len(payload) >= self.threshold
+
+    def compress(self, payload: bytes) -> bytes:
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        data = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data[:-len(_DEFLATE_TAIL)] if data.endswith(_DEFLATE_TAIL) else data
+
+    @staticmethod
+    def decompress(payload: bytes) -> bytes:
+        return zlib.decompressobj(-zlib.MAX_WBITS).decompress(payload + _DEFLATE_TAIL)
+
+    def frame(self, payload: bytes, opcode: int = websocket.ABNF.OPCODE_BINARY) -> websocket.ABNF:
+        """
+        Create a single frame holding the message, compressed if it reaches the threshold.
+
+        Args:
+            payload (bytes): The message
+            opcode (int): Opcode of the frame
+        Returns:
+            websocket.ABNF
+        """
+        if self.should_compress(payload):
+            return websocket.ABNF(fin=1, rsv1=1, opcode=opcode, data=self.compress(payload))
+        return websocket.ABNF.create_frame(payload, opcode)
+
+    def install(self, sock: websocket.WebSocket):
+        """
+        Decompress the messages received on the given socket. Must be called after the
+        handshake, before the first message is received.
+
+        Args:
+            sock (websocket.WebSocket): The connected socket
+        """
+        sock.frame_buffer = InflatingFrameBuffer(sock._recv, sock.frame_buffer.skip_utf8_validation)
+
+
+class InflatingFrameBuffer(frame_buffer):
+    """
+    Frame reader decompressing the messages that the server compressed with permessage-deflate.
+    The compressed bit is only set on the first frame of a message, so the decompressor lives
+    until the final frame, and control frames in between are passed through untouched.
+
+    Decompressing cannot be left to `on_data`: websocket-client rejects frames with the compressed
+    bit set while reading them. This class therefore extends its private frame reader, which is why
+    websocket-client is pinned to `WEBSOCKET_CLIENT_VERSION`.
+    """
+
+    def __init__(self, recv_fn, skip_utf8_validation: bool):
+        super().__init__(recv_fn, skip_utf8_validation)
+        self._compressed = False
+        self._decompressor = None
+
+    def recv_header(self):
+        super().recv_header()
+        fin, rsv1, rsv2, rsv3, opcode, has_mask, length_bits = self.header
+        self._compressed = bool(rsv1)
+        # The compressed bit is handled here; the websocket client rejects frames with reserved bits set
+        self.header = (fin, 0, rsv2, rsv3, opcode, has_mask, length_bits)
+
+    def recv_frame(self) -> websocket.ABNF:
+        frame = super().recv_frame()
+        if frame.opcode in (websocket.ABNF.OPCODE_TEXT, websocket.ABNF.OPCODE_BINARY):
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if self._compressed else None
+        elif frame.opcode != websocket.ABNF.OPCODE_CONT:
+            return frame  # control frames are never compressed
+
+        if self._decompressor is not None:
+            data = self._decompressor.decompress(frame.data)
+            if frame.fin:
+                data += self._decompressor.decompress(_DEFLATE_TAIL)
+                self._decompressor = None
+            frame.data = data
+        return frame
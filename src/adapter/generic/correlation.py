@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+
+from collections import deque
+
+
+class Outstanding:
+    """
+    A stimulus waiting for its response.
+
+    Attributes:
+        command (str): Name of the stimulus, e.g. 'LOCK'
+        correlation_id (int): Correlation id AMP gave the stimulus, 0 if none
+        sent_at (float): `time.monotonic()` when the stimulus was sent
+        deadline (float): `time.monotonic()` after which the response is missing
+        timed_out (bool): Whether the deadline passed
+    """
+
+    def __init__(self, command: str, correlation_id: int, sent_at: float, deadline: float):
+        self.command = command
+        self.correlation_id = correlation_id
+        self.sent_at = sent_at
+        self.deadline = deadline
+        self.timed_out = False
+
+
+class Correlator:
+    """
+    Links the responses of a SUT that answers its stimuli in order to the stimuli that caused them.
+    Every stimulus is tracked with a deadline; the next response is attributed to the oldest
+    outstanding stimulus.
+
+    A stimulus without a response before its deadline is counted as a timeout, but stays tracked
+    for another `timeout` seconds, so a late response is still attributed to it instead of to a
+    later stimulus. A response while no stimulus is outstanding is unsolicited.
+
+    Metrics:
+        round_trip_<command> (histogram): seconds from a stimulus until its response, per command
+        response_timeouts (counter): stimuli without a response before their deadline
+        late_responses (counter): responses after the deadline of their stimulus
+        unsolicited_responses (counter): responses while no stimulus was outstanding
+        outstanding_stimuli (gauge): stimuli waiting for their response
+
+    So a slow SUT shows up as timeouts followed by late responses, and a SUT which does not
+    respond at all (quiescence) as timeouts only.
+
+    Attributes:
+        metrics (generic.metrics.Metrics): Registry for the metrics above
+        timeout (float): Seconds a stimulus may wait for its response
+        on_timeout (callable): Optional; called with the `Outstanding` stimulus when its deadline passes
+    """
+
+    def __init__(self, metrics, timeout: float = 5.0, on_timeout=None):
+        self.metrics = metrics
+        self.timeout = timeout
+        self.on_timeout = on_timeout
+
+        self.outstanding = deque()
+        self._changed = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._watch, name='correlator', daemon=True)
+        self._thread.start()
+
+    def track(self, command: str, correlation_id: int = 0):
+        """
+        Record a stimulus that has been sent.
+
+        Args:
+            command (str): Name of the stimulus, e.g. 'LOCK'
+            correlation_id (int): Correlation id AMP gave the stimulus
+        """
+        now = time.monotonic()
+        with self._changed:
+            self.outstanding.append(Outstanding(command, correlation_id, now, now + self.timeout))
+            self._update_gauge()
+            self._changed.notify()
+
+    def match(self) -> int:
+        """
+        Attribute a response to the oldest outstanding stimulus, and record the round trip.
+
+        Returns:
+            int: Correlation id of the stimulus, 0 if there is none
+        """
+        now = time.monotonic()
+        with self._changed:
+            if not self.outstanding:
+                self.metrics.increment('unsolicited_responses')
+                return 0
+            stimulus = self.outstanding.popleft()
+            self._update_gauge()
+
+        if stimulus.timed_out:
+            self.metrics.increment('late_responses')
+        self.metrics.observe('round_trip_{command}'.format(command=stimulus.command.lower()), now - stimulus.sent_at)
+        return stimulus.correlation_id
+
+    def clear(self):
+        """ Forget the outstanding stimuli, e.g. when the SUT is reset. """
+        with self._changed:
+            self.outstanding.clear()
+            self._update_gauge()
+
+    def stop(self):
+        with self._changed:
+            self._stopped = True
+            self._changed.notify()
+        self._thread.join()
+
+    def _update_gauge(self):
+        self.metrics.set_gauge('outstanding_stimuli', sum(1 for s in self.outstanding if not s.timed_out))
+
+    def _watch(self):
+        """ Wait for the nearest deadline, count the timeouts and discard stimuli past their grace period. """
+        with self._changed:
+            while not self._stopped:
+                now = time.monotonic()
+                expired = []
+                for stimulus in self.outstanding:
+                    if not stimulus.timed_out and stimulus.deadline <= now:
+                        stimulus.timed_out = True
+                        expired.append(stimulus)
+                while self.outstanding and self.outstanding[0].timed_out \
+                        and self.outstanding[0].deadline + self.timeout <= now:
+                    self.outstanding.popleft()
+                if expired:
+                    self._update_gauge()
+                    self._changed.release()
+                    try:
+                        self._expire(expired)
+                    finally:
+                        self._changed.acquire()
+                    continue
+
+                deadlines = [s.deadline + (self.timeout if s.timed_out else 0) for s in self.outstanding]
+                self._changed.wait(max(0.0, min(deadlines) - now) if deadlines else None)
+
+    def _expire(self, expired: list):
+        for stimulus in expired:
+            self.metrics.increment('response_timeouts')
+            logging.warning('No response to {command} (correlation id {id}) within {timeout} seconds'.format(
+                command=stimulus.command, id=stimulus.correlation_id, timeout=self.timeout))
+            if self.on_timeout:
+                self.on_timeout(stimulus)
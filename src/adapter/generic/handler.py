@@ -1,11 +1,15 @@
+from __future__ import annotations
+
 import logging
 
 from abc import ABC, abstractmethod
 from typing import List
 
-from generic.api import label_pb2
-from generic.api.configuration import Configuration
-from generic.api.label import Label
+from .api.configuration import Configuration
+from .api.label import Label
+from .lazy_import import lazy_import
+
+label_pb2 = lazy_import('.api.label_pb2', __package__)
 
 class Handler(ABC):
     """
@@ -14,6 +18,7 @@ class Handler(ABC):
 
     def __init__(self):
         self.adapter_core = None  # callback to adapter; register separately
+        self.shared_resources = None  # resources shared by all adapters in this process; set by the supervisor
 
     def register_adapter_core(self, adapter_core):
         """
@@ -33,6 +38,20 @@ class Handler(ABC):
         """ The current configuration of the adapter. """
         return self.configuration
 
+    def validate_configuration(self, configuration: Configuration) -> Configuration:
+        """
+        Check a configuration received from AMP against `default_configuration`, before it is set.
+        Handlers can extend this with checks of the values, e.g. ranges.
+
+        Args:
+            configuration (Configuration): The received configuration
+        Returns:
+            Configuration: The configuration with the items and types of the default configuration
+        Raises:
+            ValueError: If an item is unknown or has the wrong type
+        """
+        return configuration.validate(self.default_configuration())
+
     @abstractmethod
     def start(self):
         """
@@ -47,6 +66,28 @@ class Handler(ABC):
         """
         pass
 
+    def resume(self):
+        """
+        Continue testing with a SUT connection that was kept while the adapter reconnected to AMP.
+        The SUT must be brought back to its initial state before signalling ready, which by default
+        is done with `reset`. Handlers that know their SUT is still in its initial state can skip that.
+        """
+        self.reset()
+
+    def reconfigure(self, changed: set) -> bool:
+        """
+        Apply a new configuration to the running SUT in place, instead of stopping and starting it.
+        The new configuration has already been set. Only the resources depending on the changed
+        items need to be rebuilt; like `start`, the handler signals ready once the SUT is in its
+        initial state. By default nothing can be changed in place.
+
+        Args:
+            changed ({str}): Names of the configuration items whose value changed
+        Returns:
+            bool: Whether the configuration was applied; if not, the SUT is stopped and started again
+        """
+        return False
+
     @abstractmethod
     def stop(self):
         """
@@ -0,0 +1,95 @@
+import importlib
+import logging
+
+from importlib.metadata import entry_points
+
+ENTRY_POINT_GROUP = 'amp_adapter.handlers'
+
+BUILTIN_HANDLERS = {
+    'matrix': 'adapter.matrix.matrix_handler:MatrixHandler',
+    'smartdoor': 'adapter.smartdoor.handler:Handler',
+}
+
+
+class HandlerRegistry:
+    """
+    Registry of the SUT handlers an adapter can run, by name.
+
+    Handlers are registered as 'module:Class' references and only imported when selected,
+    so starting the adapter loads just the selected handler, its transport and their dependencies.
+    Besides the built-in handlers, installed packages can contribute handlers through the
+    `amp_adapter.handlers` entry point group.
+
+    Attributes:
+        targets (dict): Handler name -> 'module:Class' reference, handler class or entry point
+    """
+
+    def __init__(self, handlers: dict = None, entry_point_group: str = ENTRY_POINT_GROUP):
+        self.targets = dict(BUILTIN_HANDLERS if handlers is None else handlers)
+        self._loaded = {}
+
+        if entry_point_group:
+            self._discover(entry_point_group)
+
+    def register(self, name: str, target):
+        """
+        Register a handler.
+
+        Args:
+            name (str): Name used to select the handler, e.g. on the command line
+            target (str | type): 'module:Class' reference or the handler class itself
+        """
+        self.targets[name] = target
+        self._loaded.pop(name, None)
+
+    def names(self) -> list:
+        """ The names of all registered handlers. """
+        return sorted(self.targets)
+
+    def load(self, name: str) -> type:
+        """
+        Import the handler module (if needed) and return the handler class.
+
+        Args:
+            name (str): Name of the handler
+        Returns:
+            type: The handler class
+        """
+        if name in self._loaded:
+            return self._loaded[name]
+
+        if name not in self.targets:
+            raise ValueError('Unknown handler {name}, choose one of: {names}'
+                             .format(name=name, names=', '.join(self.names())))
+
+        target = self.targets[name]
+        if isinstance(target, str):
+            module_name, _, class_name = target.partition(':')
+            logging.debug('Importing handler {name} from {module}'.format(name=name, module=module_name))
+            handler_class = getattr(importlib.import_module(module_name), class_name)
+        elif hasattr(target, 'load'):
+            handler_class = target.load()  # importlib.metadata.EntryPoint
+        else:
+            handler_class = target
+
+        self._loaded[name] = handler_class
+        return handler_class
+
+    def create(self, name: str):
+        """
+        Instantiate the handler with the given name.
+
+        Args:
+            name (str): Name of the handler
+        Returns:
+            Handler: A new handler instance
+        """
+        return self.load(name)()
+
+    def _discover(self, group: str):
+        """ Register the handlers advertised by installed packages. Only reads metadata, imports nothing. """
+        for entry_point in entry_points(group=group):
+            self.targets.setdefault(entry_point.name, entry_point)
+
+
+registry = HandlerRegistry()
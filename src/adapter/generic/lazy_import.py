@@ -0,0 +1,131 @@
+import importlib
+import importlib.util
+import sys
+import time
+
+from types import ModuleType
+
+
+class LazyModule(ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Once imported, the attributes of the module are copied onto the stand-in, so later accesses are
+    plain attribute lookups. Only use it for modules whose attributes do not change after their import,
+    such as the generated `*_pb2` modules. The stand-in is not registered in `sys.modules`, so a normal
+    import of the module elsewhere still imports the real module, with its own dependencies.
+    """
+
+    def __getattr__(self, attribute: str):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(vars(module))
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        return '<lazy module {name!r}>'.format(name=self.__name__)
+
+
+def lazy_import(name: str, package: str = None) -> ModuleType:
+    """
+    Import a module when it is first used instead of now, to keep the startup of the adapter short.
+
+    Args:
+        name (str): Name of the module, may be relative to `package`, e.g. '.label_pb2'
+        package (str): Package a relative name is resolved against, usually `__package__`
+    Returns:
+        ModuleType: The module if it is already imported, a `LazyModule` otherwise
+    """
+    name = importlib.util.resolve_name(name, package)
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+class _TimedLoader:
+    """ Wraps a loader to time the execution of the modules it loads; delegates everything else. """
+
+    def __init__(self, loader, timer):
+        self._loader = loader
+        self._timer = timer
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._timer.enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.exit(module.__name__)
+
+    def __getattr__(self, attribute):
+        return getattr(self._loader, attribute)
+
+
+class ImportTimer:
+    """
+    Records how long importing every module takes, like `python -X importtime`, but from within the
+    adapter, so the report can be made at a chosen moment, e.g. just before connecting to AMP.
+
+    The timer is a meta path finder: it lets the other finders find the module, and wraps the loader
+    to time its execution. The cumulative time of a module includes the modules it imports.
+
+    Attributes:
+        records ([(str, float, float, int)]): Per imported module, in order of completion: name, self
+            and cumulative time in seconds, and nesting depth
+        started (float): `time.perf_counter()` when the timer was created
+    """
+
+    def __init__(self):
+        self.records = []
+        self.started = time.perf_counter()
+        self._stack = []  # per module being imported: start time and the time spent in nested imports
+
+    def install(self):
+        """ Start recording the imports. """
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        """ Stop recording the imports. """
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def enter(self):
+        self._stack.append([time.perf_counter(), 0.0])
+
+    def exit(self, name: str):
+        start, nested = self._stack.pop()
+        cumulative = time.perf_counter() - start
+        if self._stack:
+            self._stack[-1][1] += cumulative
+        self.records.append((name, cumulative - nested, cumulative, len(self._stack)))
+
+    def report(self, title: str = 'so far') -> str:
+        """
+        The recorded imports in the format of `python -X importtime`, followed by a summary.
+
+        Args:
+            title (str): Describes the moment of the report, e.g. 'before connecting to AMP'
+        Returns:
+            str: One line per imported module, with self and cumulative time in microseconds
+        """
+        lines = ['import time: self [us] | cumulative | imported package']
+        for name, own, cumulative, depth in self.records:
+            lines.append('import time: {own:>9.0f} | {cumulative:>10.0f} | {indent}{name}'.format(
+                own=own * 1e6, cumulative=cumulative * 1e6, indent='  ' * depth, name=name))
+        total = sum(cumulative for _, _, cumulative, depth in self.records if depth == 0)
+        lines.append('{n} modules imported {title} in {total:.1f} ms, {elapsed:.1f} ms after start'.format(
+            n=len(self.records), title=title, total=total * 1e3, elapsed=(time.perf_counter() - self.started) * 1e3))
+        return '\n'.join(lines)
@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+
+from collections import deque
+
+
+class Histogram:
+    """
+    Distribution of observed values. Keeps exact count, sum and max, and a bounded window of the
+    most recent samples for the percentiles, so memory stays constant during long runs.
+
+    Attributes:
+        window (int): Number of recent samples used for the percentiles
+    """
+
+    def __init__(self, window: int = 10000):
+        self.window = window
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction: float, ordered: list = None) -> float:
+        """
+        The value below which the given fraction of the recent samples fall.
+
+        Args:
+            fraction (float): e.g. 0.99 for the p99
+            ordered ([float]): Pre-sorted samples, to avoid sorting for every percentile
+        """
+        ordered = ordered if ordered is not None else sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5, ordered),
+            'p99': self.percentile(0.99, ordered),
+            'p999': self.percentile(0.999, ordered),
+            'max': self.max,
+        }
+
+
+class Metrics:
+    """
+    Thread-safe registry of named counters, gauges and histograms of one adapter instance.
+    Latencies are observed in seconds.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float):
+        """ Record the current value of a quantity that goes up and down, e.g. a backlog. """
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self) -> dict:
+        """
+        A copy of all metrics, suitable for JSON serialization.
+
+        Returns:
+            dict: {'counters': {name: int}, 'gauges': {name: float},
+                'histograms': {name: {count, mean, p50, p99, p999, max}}}
+        """
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'histograms': {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+            }
+
+
+class MetricsExporter:
+    """
+    Background thread periodically writing a JSON report, e.g. `AdapterCore.health`, to a file.
+
+    Attributes:
+        source (callable): Returns the report to write
+        path (str): File to (over)write
+        interval (float): Seconds between two writes
+    """
+
+    def __init__(self, source, path: str, interval: float = 10.0):
+        self.source = source
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics_exporter', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the thread and write a final report. """
+        self._stopped.set()
+        self.export()
+
+    def export(self):
+        with open(self.path, 'w') as file:
+            json.dump(dict(self.source(), time=time.time()), file, indent=2)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.export()
@@ -0,0 +1,178 @@
+import cProfile
+import functools
+import io
+import logging
+import pstats
+import signal
+import sys
+import threading
+
+from collections import Counter
+
+
+class SamplingProfiler:
+    """
+    Opt-in wall-clock profiler for the adapter.
+
+    A background thread periodically samples the stack frames of all other threads
+    (the websocket loop, the `QThread` workers, the SUT websocket thread, ...) and
+    aggregates them into collapsed stacks: one `thread;frame;...;frame count` line per
+    unique stack, the input format of flamegraph.pl, inferno and speedscope.
+
+    Additionally, methods can be wrapped with `wrap` so that the next calls are profiled
+    with cProfile after a snapshot has been requested with `request_cprofile` (by default
+    bound to SIGUSR2). Every profiled call is written to its own `.pstats` file.
+
+    Attributes:
+        interval (float): Seconds between two samples
+        output (str): Path of the collapsed stack file written by `dump`
+        cprofile_calls (int): Number of calls profiled per cProfile request
+    """
+
+    def __init__(self, interval: float = 0.01, output: str = 'profile.collapsed', cprofile_calls: int = 10):
+        self.interval = interval
+        self.output = output
+        self.cprofile_calls = cprofile_calls
+
+        self.samples = Counter()
+        self.sample_count = 0
+
+        self._frame_names = {}  # code object -> frame name; avoids formatting on every sample
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sampler, name='profiler', daemon=True)
+
+        self._cprofile_lock = threading.Lock()
+        self._cprofile_remaining = 0
+        self._cprofile_sequence = 0
+
+    def start(self):
+        """ Start sampling the stacks of all threads. """
+        logging.info('Starting sampling profiler (interval: {interval}s, output: {output})'
+                     .format(interval=self.interval, output=self.output))
+        self._thread.start()
+
+    def stop(self):
+        """ Stop sampling and write the collapsed stacks to `output`. """
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.dump()
+
+    def install_signal_handlers(self):
+        """
+        Bind SIGUSR1 to `dump` and SIGUSR2 to `request_cprofile`.
+        Must be called from the main thread. Does nothing on platforms without these signals.
+        """
+        if not hasattr(signal, 'SIGUSR1'):
+            logging.warning('Profiler signals are not supported on this platform')
+            return
+
+        signal.signal(signal.SIGUSR1, lambda _signum, _frame: self.dump())
+        signal.signal(signal.SIGUSR2, lambda _signum, _frame: self.request_cprofile())
+
+    def request_cprofile(self, calls: int = None):
+        """
+        Profile the next calls of all wrapped methods with cProfile.
+
+        Args:
+            calls (int): Number of calls to profile (default: `cprofile_calls`)
+        """
+        with self._cprofile_lock:
+            self._cprofile_remaining = calls or self.cprofile_calls
+        logging.info('cProfile snapshots requested for the next {n} calls'.format(n=self._cprofile_remaining))
+
+    def wrap(self, obj, method_name: str):
+        """
+        Replace `obj.method_name` with a wrapper that profiles the call with cProfile
+        whenever a snapshot has been requested with `request_cprofile`.
+
+        Args:
+            obj: Object owning the method, e.g. an `AdapterCore`
+            method_name (str): Name of the method to wrap, e.g. '_handle_message'
+        """
+        method = getattr(obj, method_name)
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            sequence = self._take_cprofile_slot()
+            if sequence is None:
+                return method(*args, **kwargs)
+
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(method, *args, **kwargs)
+            finally:
+                self._write_cprofile(profile, method_name, sequence)
+
+        setattr(obj, method_name, wrapper)
+
+    def collapsed(self) -> str:
+        """
+        The aggregated samples in collapsed stack format.
+
+        Returns:
+            str: One `frame;frame;... count` line per unique stack, most frequent first
+        """
+        with self._lock:
+            samples = self.samples.most_common()
+        return ''.join('{stack} {count}\n'.format(stack=';'.join(stack), count=count) for stack, count in samples)
+
+    def dump(self):
+        """ Write the collapsed stacks sampled so far to `output`. """
+        with open(self.output, 'w') as file:
+            file.write(self.collapsed())
+        logging.info('Wrote {n} stack samples to {output}'.format(n=self.sample_count, output=self.output))
+
+    def _sampler(self):
+        own_ident = threading.get_ident()
+
+        while not self._stopped.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == own_ident:
+                        continue
+                    stack = self._collapse(thread_names.get(ident, str(ident)), frame)
+                    self.samples[stack] += 1
+                self.sample_count += 1
+
+    def _collapse(self, thread_name, frame) -> tuple:
+        """ Turn a frame into a root-first tuple of frame names, prefixed with the thread name. """
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            name = self._frame_names.get(code)
+            if name is None:
+                name = '{module}:{function}'.format(module=frame.f_globals.get('__name__', '?'),
+                                                    function=code.co_qualname).replace(';', ':')
+                self._frame_names[code] = name
+            names.append(name)
+            frame = frame.f_back
+
+        names.append(thread_name.replace(';', ':'))
+        names.reverse()
+        return tuple(names)
+
+    def _take_cprofile_slot(self):
+        """ Claim one of the requested cProfile calls. Returns the sequence number or None. """
+        if not self._cprofile_remaining:
+            return None
+
+        with self._cprofile_lock:
+            if not self._cprofile_remaining:
+                return None
+            self._cprofile_remaining -= 1
+            self._cprofile_sequence += 1
+            return self._cprofile_sequence
+
+    def _write_cprofile(self, profile: cProfile.Profile, method_name: str, sequence: int):
+        path = '{output}.{method}.{seq}.pstats'.format(output=self.output, method=method_name.strip('_'), seq=sequence)
+        profile.dump_stats(path)
+
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(10)
+        logging.info('cProfile snapshot of {method} written to {path}\n{stats}'
+                     .format(method=method_name, path=path, stats=stream.getvalue()))
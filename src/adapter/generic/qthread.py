@@ -3,22 +3,25 @@ import logging
 from queue import Queue
 from threading import Thread
 
+_STOP = object()  # queued by `stop` to end the worker
+
 class QThread:
     """
     Class that manages a thread which processes items in a queue.
     Items can be added to the queue, and the queue can be emptied.
     """
 
-    def __init__(self, process_item):
+    def __init__(self, process_item, name=None):
         """
         Constructor.
         Args:
             process_item(item): method which is called for an item
                                 retrieved from the queue by the _worker
+            name(str): name of the worker thread, shown in logs and profiles
         """
         self.process_item = process_item
         self.queue = Queue()
-        self.thread = Thread(target = self._worker)
+        self.thread = Thread(target = self._worker, name = name)
 
     def start(self):
         self.thread.start()
@@ -27,6 +30,11 @@ class QThread:
         logging.debug('Adding item to the queue ({id})'.format(id=id(item)))
         self.queue.put(item)
 
+    def stop(self):
+        """ Stop the worker once the items queued before have been processed. """
+        self.queue.put(_STOP)
+        self.thread.join()
+
     def clear_queue(self):
         while not self.queue.empty():
             item = self.queue.get()
@@ -36,6 +44,9 @@ class QThread:
     def _worker(self):
         while True:
             item = self.queue.get()
+            if item is _STOP:
+                self.queue.task_done()
+                return
             logging.debug('Processing item from queue ({id})'.format(id=id(item)))
             self.process_item(item)
             self.queue.task_done()
@@ -0,0 +1,55 @@
+import random
+import time
+
+
+class ReconnectManager:
+    """
+    Decides how long to wait before reconnecting to AMP: exponential backoff with jitter,
+    so a fleet of adapters does not reconnect in lockstep when AMP comes back.
+
+    The delay after the n-th consecutive failed connection is
+    `min(max_delay, initial_delay * multiplier ** n)`, reduced by a random fraction of at most `jitter`.
+    A connection that stayed up for `reset_after` seconds resets the backoff.
+
+    Attributes:
+        initial_delay (float): Delay in seconds before the first reconnect
+        max_delay (float): Upper bound of the delay in seconds
+        multiplier (float): Growth factor of the delay per consecutive failure
+        jitter (float): Maximum fraction (0..1) by which the delay is randomly reduced
+        reset_after (float): Seconds a connection must be open before the backoff is reset
+    """
+
+    def __init__(self, initial_delay: float = 1.0, max_delay: float = 60.0, multiplier: float = 2.0,
+                 jitter: float = 0.5, reset_after: float = 30.0):
+        if not 0 <= jitter <= 1:
+            raise ValueError('jitter should be between 0 and 1')
+
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.reset_after = reset_after
+
+        self.attempts = 0
+        self._connected_at = None
+
+    def connected(self):
+        """ Record that the connection has been opened. """
+        self._connected_at = time.monotonic()
+
+    def disconnected(self):
+        """ Record that the connection has been closed. Resets the backoff if it was stable. """
+        if self._connected_at is not None and time.monotonic() - self._connected_at >= self.reset_after:
+            self.attempts = 0
+        self._connected_at = None
+
+    def next_delay(self) -> float:
+        """
+        The delay before the next connection attempt. Every call counts as a failed attempt.
+
+        Returns:
+            float: Delay in seconds
+        """
+        delay = min(self.max_delay, self.initial_delay * self.multiplier ** self.attempts)
+        self.attempts += 1
+        return delay * (1 - self.jitter * random.random())
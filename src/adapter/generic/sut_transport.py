@@ -0,0 +1,183 @@
+import logging
+import threading
+
+from collections import deque
+
+import websocket
+
+from .reconnect import ReconnectManager
+
+CONNECTING = 'connecting'
+CONNECTED = 'connected'
+DISCONNECTED = 'disconnected'
+STOPPED = 'stopped'
+
+
+class WebSocketTransport:
+    """
+    Websocket connection to a SUT which survives connection drops. When the connection is lost it
+    is reopened with the backoff of a `ReconnectManager`. Messages sent while the SUT is not
+    reachable are buffered, and sent in order as soon as the connection is open again. When the
+    buffer is full the oldest messages are dropped.
+
+    Metrics:
+        sut_reconnects (counter): connections opened after the first one
+        sut_buffered_sends, sut_dropped_sends (counters): messages buffered, and dropped from a full buffer
+        sut_send_buffer (gauge): messages waiting in the buffer
+
+    Attributes:
+        endpoint (str): URL of the SUT
+        on_message (callable): Called with every message of the SUT
+        on_open (callable): Optional; called with `reconnected` (bool) when the connection has been
+            opened and the buffer has been sent
+        on_state (callable): Optional; called with the new state on every state change
+        metrics (generic.metrics.Metrics): Optional; registry for the metrics above
+        reconnect (ReconnectManager): Backoff between connection attempts
+        buffer_size (int): Maximum number of buffered messages
+        state (str): CONNECTING, CONNECTED, DISCONNECTED or STOPPED
+    """
+
+    def __init__(self, endpoint: str, on_message, on_open=None, on_state=None, metrics=None,
+                 reconnect: ReconnectManager = None, buffer_size: int = 1000):
+        self.endpoint = endpoint
+        self.on_message = on_message
+        self.on_open = on_open
+        self.on_state = on_state
+        self.metrics = metrics
+        self.reconnect = reconnect or ReconnectManager(initial_delay=0.5, max_delay=10.0, reset_after=10.0)
+        self.buffer_size = buffer_size
+
+        self.state = DISCONNECTED
+        self.buffer = deque()
+        self.app = None
+        self.connections = 0
+        self._lock = threading.RLock()
+        self._connected = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def connect(self):
+        """ Start connecting in a background thread; returns immediately. """
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='sut_websocket', daemon=True)
+        self._thread.start()
+
+    def wait_until_connected(self, timeout: float = None) -> bool:
+        """
+        Wait until the SUT is reachable.
+
+        Args:
+            timeout (float): Seconds to wait at most, None to wait forever
+        Returns:
+            bool: Whether the connection is open
+        """
+        return self._connected.wait(timeout)
+
+    def send(self, message: str):
+        """
+        Send a message to the SUT, or buffer it if the SUT is not reachable.
+
+        Args:
+            message (str): Message to send
+        """
+        with self._lock:
+            if self.state == CONNECTED:
+                try:
+                    self.app.send(message)
+                    return
+                except (websocket.WebSocketConnectionClosedException, OSError) as e:
+                    logging.warning('Could not send to SUT, buffering: {e}'.format(e=e))
+                    self._set_state(DISCONNECTED)
+            self._buffer(message)
+
+    def stop(self):
+        """ Close the connection and stop reconnecting. Buffered messages are dropped. """
+        self._stopped.set()
+        with self._lock:
+            self._set_state(STOPPED)
+            self.buffer.clear()
+            app = self.app
+        if app:
+            app.keep_running = False
+            app.close()
+        if self._thread:
+            logging.debug('Stopping thread which handles WebSocket connection with SUT')
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                self._set_state(CONNECTING)
+                self.app = websocket.WebSocketApp(
+                    self.endpoint,
+                    on_open=lambda _: self._on_open(),
+                    on_close=lambda _, close_status_code, close_msg: self._on_close(),
+                    on_message=lambda _, msg: self.on_message(msg),
+                    on_error=lambda _, msg: logging.error('Error with connection to SUT: {e}'.format(e=msg)))
+            self.app.run_forever()
+
+            with self._lock:
+                if self._stopped.is_set():
+                    return
+                self._set_state(DISCONNECTED)
+            self.reconnect.disconnected()
+            delay = self.reconnect.next_delay()
+            logging.info('Reconnecting to SUT in {delay:.1f} seconds'.format(delay=delay))
+            self._stopped.wait(delay)
+
+    def _on_open(self):
+        self.reconnect.connected()
+        with self._lock:
+            self.connections += 1
+            reconnected = self.connections > 1
+            if reconnected:
+                self._increment('sut_reconnects')
+            while self.buffer:
+                message = self.buffer[0]
+                try:
+                    self.app.send(message)
+                except (websocket.WebSocketConnectionClosedException, OSError) as e:
+                    logging.warning('Connection to SUT lost while sending the buffer: {e}'.format(e=e))
+                    return
+                self.buffer.popleft()
+            self._gauge()
+            self._set_state(CONNECTED)
+        logging.info('Reconnected to SUT' if reconnected else 'Connected to SUT')
+        if self.on_open:
+            self.on_open(reconnected)
+
+    def _on_close(self):
+        logging.debug('Closed connection to SUT')
+        with self._lock:
+            if self.state != STOPPED:
+                self._set_state(DISCONNECTED)
+
+    def _buffer(self, message: str):
+        """ Add a message to the buffer; the caller holds `_lock`. """
+        if len(self.buffer) >= self.buffer_size:
+            self.buffer.popleft()
+            self._increment('sut_dropped_sends')
+        self.buffer.append(message)
+        self._increment('sut_buffered_sends')
+        self._gauge()
+
+    def _set_state(self, state: str):
+        """ The caller holds `_lock`. """
+        if state == self.state:
+            return
+        self.state = state
+        if state == CONNECTED:
+            self._connected.set()
+        else:
+            self._connected.clear()
+        if self.on_state:
+            self.on_state(state)
+
+    def _increment(self, name: str):
+        if self.metrics:
+            self.metrics.increment(name)
+
+    def _gauge(self):
+        if self.metrics:
+            self.metrics.set_gauge('sut_send_buffer', len(self.buffer))
@@ -0,0 +1,48 @@
+import itertools
+import logging
+
+
+def hexdump(payload, max_bytes: int = 64) -> str:
+    """
+    Hex dump of the start of a payload. Only the dumped prefix is copied.
+
+    Args:
+        payload (bytes|memoryview): The payload
+        max_bytes (int): Maximum number of bytes to dump
+    Returns:
+        str: e.g. '0a 02 08 01 ...'
+    """
+    view = memoryview(payload)
+    dump = view[:max_bytes].hex(' ')
+    return dump + ' ...' if len(view) > max_bytes else dump
+
+
+class PayloadLogger:
+    """
+    Logs raw payloads at debug level as truncated hex dumps, and only one in every `sample_every`
+    payloads, so debug logging does not copy and format every (large) frame.
+
+    Attributes:
+        sample_every (int): Log one in this many payloads
+        max_bytes (int): Maximum number of bytes dumped per payload
+    """
+
+    def __init__(self, sample_every: int = 100, max_bytes: int = 64):
+        self.sample_every = max(1, sample_every)
+        self.max_bytes = max_bytes
+        self._count = itertools.count()
+
+    def log(self, description: str, payload):
+        """
+        Log the payload if debug logging is enabled and it is sampled.
+
+        Args:
+            description (str): e.g. 'Received a message'
+            payload (bytes|memoryview): The payload
+        """
+        if not logging.getLogger().isEnabledFor(logging.DEBUG):
+            return
+        if next(self._count) % self.sample_every:
+            return
+        logging.debug('{description} ({size} bytes): {dump}'.format(
+            description=description, size=memoryview(payload).nbytes, dump=hexdump(payload, self.max_bytes)))
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import logging
+import time
+
+from datetime import datetime
+from typing import List
+
+from .api.configuration import ConfigurationItem, Configuration
+from .api.label import Label, Sort
+from .api.parameter import Parameter
+from .api.type import Type
+from .correlation import Correlator
+from .handler import Handler
+from .lazy_import import lazy_import
+from .sut_transport import CONNECTED, WebSocketTransport
+
+label_pb2 = lazy_import('.api.label_pb2', __package__)
+
+SEPARATOR = ':'
+
+# Parsers of the text value of a response parameter, by type
+_PARSERS = {
+    Type.INTEGER: int,
+    Type.DECIMAL: float,
+    Type.BOOLEAN: lambda value: value.lower() == 'true',
+    Type.STRING: str,
+}
+
+
+class LabelSpec:
+    """
+    Declarative description of a label and the text message it corresponds to at the SUT.
+    The message is the keyword, followed by the parameter values, separated by colons, e.g.
+    the stimulus `lock(passcode: 1234)` is the message 'LOCK:1234'.
+
+    The formatter of a stimulus and the parser of a response are compiled once, when the spec
+    is created, so stimulating and receiving do not rebuild them.
+
+    Attributes:
+        sort (Sort): Stimulus or response
+        name (str): Name of the label, e.g. 'lock'
+        parameters ({str: Type}): Types of the parameters, in the order of the message
+        keyword (str): First part of the message, the upper case name by default
+    """
+
+    def __init__(self, sort: Sort, name: str, parameters: dict = None, keyword: str = None):
+        self.sort = sort
+        self.name = name
+        self.parameters = parameters or {}
+        self.keyword = keyword or name.upper()
+        self.format = self._compile_formatter()
+        self.parse = self._compile_parser()
+
+    def label(self, channel: str) -> Label:
+        """
+        Returns:
+            Label: The label of this spec, for `supported_labels`
+        """
+        return Label(self.sort, self.name, channel,
+                     parameters=[Parameter(name, tipe) for name, tipe in self.parameters.items()])
+
+    def _compile_formatter(self):
+        """ Returns a function from the parameter values, in order, to the message. """
+        if not self.parameters:
+            return lambda _values: self.keyword
+        prefix = self.keyword + SEPARATOR
+        return lambda values: prefix + SEPARATOR.join(map(str, values))
+
+    def _compile_parser(self):
+        """ Returns a function from the parameter part of the message to the response parameters. """
+        fields = [(name, tipe, _PARSERS.get(tipe, str)) for name, tipe in self.parameters.items()]
+
+        def parse(arguments: str) -> List[Parameter]:
+            values = arguments.split(SEPARATOR, len(fields) - 1) if fields else []
+            if len(values) != len(fields):
+                raise ValueError('{keyword} expects {expected} parameters, got {arguments!r}'.format(
+                    keyword=self.keyword, expected=len(fields), arguments=arguments))
+            return [Parameter(name, tipe, parser(value)) for (name, tipe, parser), value in zip(fields, values)]
+        return parse
+
+
+def stimulus(name: str, **parameters) -> LabelSpec:
+    """ Spec of a stimulus, e.g. `stimulus('lock', passcode=Type.INTEGER)`. """
+    return LabelSpec(Sort.STIMULUS, name, parameters)
+
+
+def response(name: str, **parameters) -> LabelSpec:
+    """ Spec of a response, e.g. `response('opened')`. """
+    return LabelSpec(Sort.RESPONSE, name, parameters)
+
+
+class WebSocketHandler(Handler):
+    """
+    Handler for SUTs that speak a text protocol over a websocket, defined by a table of labels.
+    A subclass only declares its channel, labels and reset messages, e.g.
+
+        class Handler(WebSocketHandler):
+            CHANNEL = 'door'
+            LABELS = [stimulus('open'), response('opened')]
+
+    Stimuli are turned into messages by the compiled formatter of their spec, looked up by label
+    name; messages of the SUT are turned into responses by the parser of the spec of their keyword.
+    The SUT is reached through a reconnecting `WebSocketTransport`, and responses are correlated
+    with their stimuli by a `Correlator`, which also records the round trips and missing responses.
+
+    A reset sends `RESET_MESSAGE`; the adapter is ready for the next test case when the SUT answers
+    with `RESET_DONE`. Messages of the SUT without a spec are passed on as parameterless responses
+    and counted as `unknown_responses`.
+
+    Attributes:
+        CHANNEL (str): Channel of all labels
+        LABELS ([LabelSpec]): The supported labels
+        RESET_MESSAGE (str): Message resetting the SUT
+        RESET_DONE (str): Message of the SUT after a reset
+        DEFAULT_ENDPOINT (str): Default of the `endpoint` configuration item
+    """
+
+    CHANNEL = None
+    LABELS = []
+    RESET_MESSAGE = 'RESET'
+    RESET_DONE = 'RESET_PERFORMED'
+    DEFAULT_ENDPOINT = 'ws://localhost:3001'
+
+    def __init__(self):
+        super().__init__()
+        self.transport = None
+        self.correlator = None
+        self._stimuli = {spec.name: spec for spec in self.LABELS if spec.sort == Sort.STIMULUS}
+        self._responses = {spec.keyword: spec for spec in self.LABELS if spec.sort == Sort.RESPONSE}
+
+    def send_message_to_amp(self, raw_message: str):
+        """
+        Send a message of the SUT back to AMP as a response label.
+
+        Args:
+            raw_message (str): The message of the SUT
+        """
+        logging.debug('response received: {label}'.format(label=raw_message))
+
+        if raw_message == self.RESET_DONE:
+            # The RESET is buffered while the SUT is unreachable, so AMP is only told the adapter is ready
+            # once the SUT is reachable again.
+            self.adapter_core.send_ready()
+            return
+
+        label = self._message2label(raw_message)
+        label.correlation_id = self.correlator.match()
+        self.adapter_core.send_response(label)
+
+    def sut_state_changed(self, state: str):
+        """
+        Called when the connection to the SUT changes state, see `generic.sut_transport`.
+
+        Args:
+            state (str): The new state, e.g. 'connected'
+        """
+        logging.info('Connection to SUT {state}'.format(state=state))
+        self.adapter_core.metrics.set_gauge('sut_connected', 1 if state == CONNECTED else 0)
+
+    def start(self):
+        """
+        Start a test: connect to the SUT, which is reset once it is reachable.
+        """
+        self.correlator = Correlator(self.adapter_core.metrics, self.configuration.value('response_timeout'))
+        self._connect(self.configuration.value('endpoint'))
+
+    def reconfigure(self, changed: set) -> bool:
+        """
+        Apply a new endpoint or response timeout in place. A new endpoint replaces the transport,
+        which resets the SUT once it is reachable; otherwise the SUT is reset right away.
+
+        Args:
+            changed ({str}): Names of the configuration items whose value changed
+        Returns:
+            bool: Whether the configuration was applied
+        """
+        if not changed <= {'endpoint', 'response_timeout'}:
+            return False
+
+        self.correlator.clear()
+        self.correlator.timeout = self.configuration.value('response_timeout')
+        if 'endpoint' in changed:
+            self.transport.stop()
+            self._connect(self.configuration.value('endpoint'))
+        else:
+            self.reset()
+        return True
+
+    def reset(self):
+        """
+        Prepare the SUT for the next test case.
+        """
+        logging.info('Resetting the SUT for a new test case')
+        self.correlator.clear()
+        self.transport.send(self.RESET_MESSAGE)
+
+    def stop(self):
+        """
+        Stop the SUT from testing.
+        """
+        logging.info('Stopping the plugin handler')
+        self.transport.stop()
+        self.transport = None
+        self.correlator.stop()
+        self.correlator = None
+
+        logging.debug('Finished stopping the plugin handler')
+
+    def stimulate(self, pb_label: label_pb2.Label):
+        """
+        Processes a stimulus of a given label at the SUT.
+
+        Args:
+            pb_label (label_pb2.Label): stimulus that the Axini Modeling Platform has sent
+        """
+        sut_msg = self._label2message(pb_label)
+
+        # send confirmation of stimulus back to AMP
+        pb_label.timestamp = time.time_ns()
+        pb_label.physical_label = bytes(sut_msg, 'UTF-8')
+        self.adapter_core.send_stimulus_confirmation(pb_label)
+
+        # leading spaces are needed to justify the stimuli and responses
+        logging.info('      Injecting stimulus @SUT: ?{name}'.format(name=pb_label.label))
+        if sut_msg != self.RESET_MESSAGE:
+            # The SUT answers a reset with RESET_DONE, which is not a response to correlate
+            self.correlator.track(pb_label.label, pb_label.correlation_id)
+        self.transport.send(sut_msg)
+
+    def supported_labels(self) -> List[Label]:
+        """
+        The labels supported by the adapter.
+
+        Returns:
+             [Label]: List of all supported labels of this adapter
+        """
+        return [spec.label(self.CHANNEL) for spec in self.LABELS]
+
+    def default_configuration(self) -> Configuration:
+        """
+        The default configuration of this adapter.
+
+        Returns:
+            Configuration: the default configuration required by this adapter.
+        """
+        return Configuration([
+            ConfigurationItem(
+                name='endpoint',
+                tipe=Type.STRING,
+                description='Base websocket URL of the SUT',
+                value=self.DEFAULT_ENDPOINT),
+            ConfigurationItem(
+                name='response_timeout',
+                tipe=Type.DECIMAL,
+                description='seconds after which a missing response to a stimulus is counted as a timeout',
+                value=5.0),
+        ])
+
+    def _connect(self, endpoint: str):
+        """ Create the transport to the SUT and start connecting. """
+        self.transport = WebSocketTransport(endpoint, self.send_message_to_amp, on_open=self._on_open,
+                                            on_state=self.sut_state_changed, metrics=self.adapter_core.metrics)
+        logging.info('Connecting to {endpoint}'.format(endpoint=endpoint))
+        self.transport.connect()
+
+    def _on_open(self, reconnected: bool):
+        """ Reset the SUT on the first connection; after a reconnect the buffered messages are resent instead. """
+        if not reconnected:
+            self.transport.send(self.RESET_MESSAGE)
+
+    def _label2message(self, pb_label: label_pb2.Label) -> str:
+        """
+        Converts a Protobuf label to a SUT message. Only stimuli with parameters are decoded.
+
+        Args:
+            pb_label (label_pb2.Label)
+        Returns:
+            str: The message to be sent to the SUT.
+        """
+        spec = self._stimuli.get(pb_label.label)
+        if spec is None:
+            raise ValueError('Unsupported stimulus {name}'.format(name=pb_label.label))
+        if not pb_label.parameters:
+            return spec.format(())
+        values = {parameter.name: parameter.value for parameter in Label.decode(pb_label).parameters}
+        missing = [name for name in spec.parameters if name not in values]
+        if missing:
+            raise ValueError('Stimulus {name} misses parameters {missing}'.format(
+                name=pb_label.label, missing=', '.join(missing)))
+        return spec.format([values[name] for name in spec.parameters])
+
+    def _message2label(self, message: str) -> Label:
+        """
+        Converts a SUT message to a response Label.
+
+        Args:
+            message (str)
+        Returns:
+            Label: The converted message as a Label.
+        """
+        keyword, _, arguments = message.partition(SEPARATOR)
+        spec = self._responses.get(keyword)
+        name, parameters = message.lower(), []
+        if spec is None:
+            self.adapter_core.metrics.increment('unknown_responses')
+        else:
+            try:
+                name, parameters = spec.name, spec.parse(arguments)
+            except ValueError as e:
+                logging.error('Malformed response {message}: {e}'.format(message=message, e=e))
+                self.adapter_core.metrics.increment('unknown_responses')
+
+        return Label(
+            sort=Sort.RESPONSE,
+            name=name,
+            channel=self.CHANNEL,
+            parameters=parameters,
+            physical_label=bytes(message, 'UTF-8'),
+            timestamp=datetime.now())
@@ -0,0 +1,122 @@
+import logging
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .matrix_connection import MatrixConnection
+
+
+class AsyncMatrixConnection(MatrixConnection):
+    """
+    `MatrixConnection` performing independent requests concurrently on thread pools.
+
+    The requests themselves are blocking `requests` calls, made with one HTTP session, and so
+    one connection pool, per user. The logins at connect and the room deletions of a reset run
+    concurrently on a shared pool. `send` keeps the synchronous contract of `MatrixConnection`;
+    `submit` sends a stimulus without waiting for its response, so stimuli of different users are
+    pipelined. Every user has a single worker thread for its stimuli, so the stimuli of one user
+    are still performed in the order they were submitted.
+
+    Attributes:
+        max_workers (int): Maximum number of concurrent logins or room deletions
+    """
+
+    def __init__(self, endpoint, container_name, room_pool_size=0, http=None, max_workers=16, **kwargs):
+        super().__init__(endpoint, container_name, room_pool_size, http=http, **kwargs)
+        self.max_workers = max_workers
+        if self.owns_http:
+            self._mount_adapters(self.http)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='matrix_http')
+        self.user_http = {}  # user id -> requests.Session
+        self._user_executors = {}  # username -> single thread executor, performing the stimuli of a user in order
+        self._pending = set()  # futures of submitted stimuli
+        self._pending_lock = threading.Lock()
+
+    def session_for(self, user_session: dict):
+        user_id = user_session.get("user_id")
+        if user_id is None:
+            return self.http
+        http = self.user_http.get(user_id)
+        if http is None:
+            http = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+            http.mount("http://", adapter)
+            http.mount("https://", adapter)
+            http = self.user_http.setdefault(user_id, http)
+        return http
+
+    def login_users(self, users) -> dict:
+        sessions = self.executor.map(lambda user: self.login_user(user, user), users)
+        return dict(zip(users, sessions))
+
+    def delete_rooms(self, room_ids: list, admin_session):
+        list(self.executor.map(lambda room_id: self.delete_room(room_id, admin_session), room_ids))
+
+    def submit(self, label: str, params: dict) -> Future:
+        """
+        Send a stimulus without waiting for the response.
+
+        Args:
+            label (str): Name of the SUT message, e.g. 'JOIN_ROOM'
+            params (dict): Parameters of the stimulus
+        Returns:
+            concurrent.futures.Future: Resolves to the response message and its parameters, like `send`
+        """
+        username = params.get("username")
+        with self._pending_lock:
+            executor = self._user_executors.get(username)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"matrix_{username}")
+                self._user_executors[username] = executor
+            future = executor.submit(self.send, label, params)
+            self._pending.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def drain(self):
+        """Wait until all submitted stimuli have been answered."""
+        with self._pending_lock:
+            pending = list(self._pending)
+        for future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Pipelined stimulus failed: {e}")
+
+    def reset(self):
+        self.drain()
+        super().reset()
+
+    def set_endpoint(self, endpoint):
+        self.drain()
+        super().set_endpoint(endpoint)
+        if self.owns_http:
+            self._mount_adapters(self.http)
+        for http in self.user_http.values():
+            http.close()
+        self.user_http.clear()
+
+    def stop(self):
+        self.drain()
+        super().stop()
+        self.executor.shutdown()
+        with self._pending_lock:
+            executors = list(self._user_executors.values())
+            self._user_executors.clear()
+        for executor in executors:
+            executor.shutdown()
+        for http in self.user_http.values():
+            http.close()
+        self.user_http.clear()
+
+    def _mount_adapters(self, http: requests.Session):
+        """Let the HTTP session keep a connection per worker."""
+        http.mount("http://", HTTPAdapter(pool_maxsize=self.max_workers))
+        http.mount("https://", HTTPAdapter(pool_maxsize=self.max_workers))
+
+    def _discard(self, future: Future):
+        with self._pending_lock:
+            self._pending.discard(future)
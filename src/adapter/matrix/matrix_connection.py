@@ -1,10 +1,37 @@
+import itertools
 import logging
+import time
 from typing import Tuple
 import requests
-import subprocess
 from time import sleep
-import random
-import string
+from urllib.parse import quote
+
+from ..generic.lazy_import import lazy_import
+from .operations import OPERATIONS, Operation, FAIL, ROOM_CREATED_SUCCESS
+from .reset_strategy import create_reset_strategy, wait_until_ready
+from .room_pool import RoomPool
+from .room_state import RoomState
+
+# Only needed to restart the container, so not imported when starting the adapter
+subprocess = lazy_import("subprocess")
+
+USERS = ("one", "two", "three")
+ROOM_STATE_CACHE_MODES = ("off", "on", "strict")
+
+class TransactionIds:
+    """
+    Monotonic transaction ids for the client API. Synapse deduplicates requests with the same
+    transaction id of the same device, so every message needs a new id, while a retry of the same
+    message must reuse its id. The ids are prefixed with the creation time, so they stay unique
+    across sessions of the same device.
+    """
+
+    def __init__(self):
+        self.prefix = str(time.time_ns() // 1_000_000)
+        self._counter = itertools.count(1)
+
+    def next(self) -> str:
+        return f"{self.prefix}.{next(self._counter)}"
 
 class MatrixConnection:
     """
@@ -15,9 +42,20 @@ class MatrixConnection:
         endpoint (str): URL of the Matrix SUT
         container_Name (str): Name of the matrix container that is running on the same local machine.
             Needed in order to restart the SUT.
+        room_pool_size (int): Number of pre-created rooms kept ready per user for CREATE_ROOM. 0 disables the pool.
+        http (requests.Session): HTTP session whose connection pool is used for all requests.
+            Its connection pools may be shared with other connections in this process.
+        request_timeout (float): Seconds after which a stimulus request times out
+        max_retries (int): Number of times a rate limited, or timed out idempotent, stimulus is retried
+        txn_ids (TransactionIds): Transaction ids of the current user sessions
+        room_state (RoomState): Shadow of the room membership answering stimuli that are certain to fail
+            without a request; None if `room_state_cache` is 'off'
+        reset_strategy (PurgeReset|SnapshotReset): How a reset brings Synapse back to its initial state,
+            see `matrix.reset_strategy`
     """
 
-    def __init__(self, endpoint, container_name):
+    def __init__(self, endpoint, container_name, room_pool_size=0, http=None, request_timeout=30.0, max_retries=10,
+                 room_state_cache="off", reset_strategy="purge", snapshot_database=""):
         self.endpoint = endpoint
         self.one_session = None
         self.two_session = None
@@ -25,13 +63,25 @@ class MatrixConnection:
         self.session_dict = None
         self.full_url = endpoint + "/_matrix/client/v3/"
         self.container_name = container_name
+        self.room_pool_size = room_pool_size
+        self.room_pool = None
+        self.http = http or requests.Session()
+        self.owns_http = http is None
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.txn_ids = TransactionIds()
+        self.room_state = None
+        self.set_room_state_cache(room_state_cache)
+        self.admin_session = None
+        self.reset_strategy = None
+        self.set_reset_strategy(reset_strategy, snapshot_database)
     
     @staticmethod
     def get_auth_header(user_session):
         return {"Authorization": f"Bearer {user_session["access_token"]}"}
 
     def get_room_ids(self, admin_session) -> list:
-        response = requests.get(
+        response = self.http.get(
             self.endpoint + "/_synapse/admin/v1/rooms",
             headers=self.get_auth_header(admin_session),
         )
@@ -39,8 +89,8 @@ class MatrixConnection:
         return [x["room_id"] for x in response.json()["rooms"]]
 
     def delete_room(self, room_id: str, admin_session):
-        response = requests.delete(
-            self.endpoint + "/_synapse/admin/v2/rooms/" + room_id,
+        response = self.http.delete(
+            self.endpoint + "/_synapse/admin/v2/rooms/" + quote(room_id, safe=""),
             headers=self.get_auth_header(admin_session),
             json={
                 "purge": True,
@@ -49,8 +99,34 @@ class MatrixConnection:
                 }
             )
         #assert response.ok
-        print("Tried to delete", room_id)
+        logging.debug(f"Tried to delete {room_id}")
     
+    def fetch_room_state(self, room_id: str):
+        """Members and banned users of a room according to the server, as two sets of usernames.
+        Returns None if the room does not exist."""
+        response = self.http.get(
+            self.endpoint + "/_synapse/admin/v1/rooms/" + quote(room_id, safe="") + "/state",
+            headers=self.get_auth_header(self.admin_session),
+        )
+        if response.status_code == 404:
+            return None
+        assert response.ok
+        usernames = {session["user_id"]: username for username, session in self.session_dict.items()}
+        members, banned = set(), set()
+        for event in response.json()["state"]:
+            if event["type"] != "m.room.member" or event["state_key"] not in usernames:
+                continue
+            membership = event["content"].get("membership")
+            if membership == "join":
+                members.add(usernames[event["state_key"]])
+            elif membership == "ban":
+                banned.add(usernames[event["state_key"]])
+        return members, banned
+
+    def delete_rooms(self, room_ids: list, admin_session):
+        for room_id in room_ids:
+            self.delete_room(room_id, admin_session)
+
     def login_user(self, user, password) -> dict:
         """Log this user in and return their session."""
         def generate_login_body(user, password) -> dict:
@@ -64,7 +140,7 @@ class MatrixConnection:
                     }
             return body
         
-        response = requests.post(
+        response = self.http.post(
             self.full_url + "login",
             json = generate_login_body(user, password)
         )
@@ -72,153 +148,207 @@ class MatrixConnection:
         assert response.ok, f"Login failed for user {user}. You might need to restart the container"
         return response.json()
 
+    def login_users(self, users) -> dict:
+        """Log the given users in. Their password equals their name. Returns their sessions by username."""
+        return {user: self.login_user(user, user) for user in users}
+
     def connect(self):
         """
         Connect to the Matrix SUT. In our case this means establishing the user sessions.
         """
         logging.info('Connecting to Matrix and establishing user sessions...')
         self.reset()
-        # Use lambda functions to correctly pass the self variable.
-        self.one_session = self.login_user("one", "one")
-        self.two_session = self.login_user("two", "two")
-        self.three_session = self.login_user("three", "three")
-        self.session_dict = {
-            "one": self.one_session,
-            "two": self.two_session,
-            "three": self.three_session
-        }
+        self.session_dict = self.login_users(USERS)
+        self.txn_ids = TransactionIds()
+        self.one_session = self.session_dict["one"]
+        self.two_session = self.session_dict["two"]
+        self.three_session = self.session_dict["three"]
         logging.info('User sessions established sucesfully.')
-    
+        self.reset_strategy.prepare(self)
+        if self.room_pool_size:
+            self.room_pool = RoomPool(self, self.room_pool_size)
+            self.room_pool.start(self.session_dict)
+
     def reset(self):
-        """Rest the SUT and wait for 5 seconds.
-        """
-        admin_session = self.login_user("admin", "admin")
-        logging.info(f"Deleting all rooms, restarting synapse container and waiting 5 seconds...")
-        [self.delete_room(room_id, admin_session) for room_id in self.get_room_ids(admin_session)]
+        """Reset the SUT with the configured reset strategy, see `matrix.reset_strategy`."""
+        if self.room_pool:
+            self.room_pool.pause()
+        if self.room_state:
+            self.room_state.clear()
+        self.reset_strategy.reset(self)
+        if self.session_dict is not None:
+            # A snapshot strategy that was set while connected captures its snapshot now, on the clean database
+            self.reset_strategy.prepare(self)
+
+        if self.room_pool:
+            self.room_pool.resume(fill=True)
+
+    def set_endpoint(self, endpoint):
+        """Point the connection to another Synapse server. The user sessions, pooled rooms and room
+        state of the old server are dropped, so `connect` has to be called again."""
+        if self.room_pool:
+            self.room_pool.stop()
+            self.room_pool = None
+        if self.room_state:
+            self.room_state.clear()
+        self.session_dict = None
+        if self.owns_http:
+            self.http.close()
+            self.http = requests.Session()
+        self.endpoint = endpoint
+        self.full_url = endpoint + "/_matrix/client/v3/"
+        # A snapshot of the old server cannot be restored on the new one
+        self.set_reset_strategy(self.reset_strategy_name, self.snapshot_database)
+
+    def set_reset_strategy(self, name, snapshot_database=""):
+        """Switch to another reset strategy, see `matrix.reset_strategy`. A snapshot is captured at the next reset."""
+        self.reset_strategy = create_reset_strategy(name, snapshot_database)
+        self.reset_strategy_name = name
+        self.snapshot_database = snapshot_database
+
+    def set_room_state_cache(self, room_state_cache):
+        """Switch the room state cache `off`, `on` or to `strict`. The shadow starts empty."""
+        if room_state_cache not in ROOM_STATE_CACHE_MODES:
+            raise ValueError(f"room_state_cache should be one of {ROOM_STATE_CACHE_MODES}")
+        self.room_state = RoomState(strict=room_state_cache == "strict") if room_state_cache != "off" else None
+
+    def set_room_pool_size(self, room_pool_size):
+        """Replace the room pool by one of the given size, filled in the background if the users are logged in."""
+        if self.room_pool:
+            self.room_pool.stop()
+            self.room_pool = None
+        self.room_pool_size = room_pool_size
+        if room_pool_size and self.session_dict is not None:
+            self.room_pool = RoomPool(self, room_pool_size)
+            self.room_pool.start(self.session_dict)
+
+    def restart_container(self):
+        """Restart the synapse docker container and wait for 5 seconds."""
         subprocess.run(["docker", "restart", self.container_name])
         sleep(5)
         logging.info("Done restarting the container.")
 
+    def wait_until_ready(self):
+        """Wait until the synapse container answers requests again, e.g. after it was started."""
+        wait_until_ready(self.endpoint, self.http)
+
     def send(self, label: str, params: dict) -> Tuple[str, dict]:
         """
-        Send a message to the SUT, and return the response as a raw string message.
+        Perform the operation of the given stimulus as the user given by the `username` parameter,
+        see `matrix.operations.OPERATIONS`.
 
         Args:
-            message (str): Message to send
+            label (str): Name of the SUT message, e.g. 'JOIN_ROOM'
+            params (dict): Parameters of the stimulus
+        Returns:
+            str, dict: The response message and its parameters
         """
         logging.info(f'Sending message to SUT: {label}: {params}')
-        status_code = None
+        operation = OPERATIONS.get(label)
+        if operation is None:
+            logging.error(f"Unknown label: {label}")
+            return FAIL, {}
+
+        missing = [name for name in ['username'] + operation.params if name not in params]
+        if missing:
+            logging.error(f"Missing parameters for {label}: {missing}")
+            return FAIL, {}
+
         try:
             user_session = self.session_dict[params["username"]]
         except KeyError:
             logging.warning(f"User with the name {params["username"]} does not exist")
-            return "FAIL", {}
-        if label == "CREATE_ROOM":
-            status_code, room_id = self.create_room(user_session)
-            if status_code == 200:
-                return "ROOM_CREATED_SUCCESS", {"room_id": room_id}
-            else:
-                return "FAIL", {}
-        else:
-            room_id = params["room_id"]
-            if label == "JOIN_ROOM":
-                status_code = self.join_room(room_id=room_id, user_session=user_session)
-            elif label == "LEAVE_ROOM":
-                status_code = self.leave_room(room_id=room_id, user_session=user_session)
-            elif label == "SEND_MESSAGE":
-                message = params["message"]
-                status_code = self.send_message(room_id=room_id, user_session=user_session, message=message)
-            if label == "BAN_USER" or label == "UNBAN_USER":
+            return FAIL, {}
+        if self.room_pool:
+            self.room_pool.notify_activity()
+            if label == "CREATE_ROOM":
+                room_id = self.room_pool.take(params["username"])
+                if room_id:
+                    if self.room_state:
+                        self.room_state.update(label, params, {"room_id": room_id})
+                    return ROOM_CREATED_SUCCESS, {"room_id": room_id}
+
+        if self.room_state:
+            if self.room_state.verification_due():
+                self.room_state.verify(self.fetch_room_state)
+            reason = self.room_state.check(label, params)
+            if reason:
+                logging.info(f"Answering {label} without a request: {reason}")
+                self.room_state.short_circuited += 1
+                return FAIL, {}
+
+        txn_id = self.txn_ids.next() if operation.idempotent else None
+        try:
+            for attempt in range(self.max_retries + 1):
                 try:
-                    target_user = params["user_id"]
-                    target_user_session = self.session_dict[target_user]
-                except KeyError as e:
-                    logging.error(f"Targeted user with name {params["user_id"]} does not exist! Terminating the adapter.")
-                    return "FAIL", {}
-                if label == "BAN_USER":
-                    status_code = self.ban_user(room_id=room_id, user_session=user_session, target_user_session=target_user_session)
-                elif label == "UNBAN_USER":
-                    status_code = self.unban_user(room_id=room_id, user_session=user_session, target_user_session=target_user_session)
-                    logging.info(f"UNBAN INFO: User {params["username"]} to ban {params["user_id"]}!\tSTATUS CODE: {status_code}")
-            elif label == "INVITE_USER":
-                # TODO remove invites.
-                return "SUCCESS", {}
-        
-        #logging.error(f"Unkown label: {label}")
+                    status_code, result = self.perform(operation, user_session, params, txn_id)
+                except requests.Timeout:
+                    if txn_id is None or attempt == self.max_retries:
+                        raise
+                    logging.warning(f"Request timed out, retrying with the same transaction id {txn_id}")
+                    continue
+                if status_code != 429 or attempt == self.max_retries:
+                    break
+                delay = result.get("retry_after_ms", 1000) / 1000
+                logging.warning(f"Rate limited, try again after {delay} seconds.")
+                sleep(delay)
+        except KeyError as e:
+            logging.error(f"Targeted user with name {e} does not exist!")
+            return FAIL, {}
+        except requests.Timeout:
+            logging.error(f"Request for {label} timed out after {self.request_timeout} seconds")
+            return FAIL, {}
+
         logging.info(f"Response status code: {status_code}")
-        # TODO make it return the actual status code.
         if status_code == 200:
-            return "SUCCESS", {}
-        elif status_code == 429: # Rate limited, try again recursively
-            logging.warning("Rate limited, try again after one second.")
-            sleep(1)
-            return self.send(label, params)
+            if self.room_state:
+                self.room_state.update(label, params, result)
+            return operation.response, result
         else:
-            return "FAIL", {}
-    
-    def create_room(self, user_session: str):
-        def random_room_name():
-            return ''.join(random.choices(string.ascii_uppercase + string.digits, k=50))
-        
-        def create_room_json():
-            name_and_alias = random_room_name()
-            return {
-                    "name":name_and_alias,
-                    "visibility":"public",
-                    "preset":"public_chat",
-                    "room_alias_name":name_and_alias,
-                    "topic":"TOPIC",
-                    "initial_state":[]
-                }
-        response = requests.post(
-            self.full_url + "createRoom",
-            headers=self.get_auth_header(user_session=user_session),
-            json= create_room_json()
-        )
-        room_id = response.json()["room_id"]
-        return response.status_code, room_id
-        
-    def join_room(self, room_id: str, user_session: str):
-        response = requests.post(
-            self.full_url + "join/" + room_id,
-            headers=self.get_auth_header(user_session=user_session),
-        )
-        return response.status_code
+            return FAIL, {}
 
-    def leave_room(self, room_id: str, user_session: str):
-        response = requests.post(
-            self.full_url + "join/" + room_id,
-            headers=self.get_auth_header(user_session=user_session),
-        )
-        return response.status_code
+    def session_for(self, user_session: dict):
+        """The HTTP session used for the requests of the given user."""
+        return self.http
 
-    def send_message(self, room_id: str, user_session: str, message: str):
-        response = requests.put(
-            self.full_url + "rooms/" + room_id + "/send/m.room.message/" + str(random.randint),
-            headers=self.get_auth_header(user_session=user_session),
-            json= {
-                "msgtype": "m.text",
-                "body": message
-            }
-        )
-        return response.status_code
+    def perform(self, operation: Operation, user_session: dict, params: dict, txn_id: str = None) -> Tuple[int, dict]:
+        """
+        Send the request of an operation.
 
-    def ban_user(self, room_id: str, user_session: str, target_user_session: str):
-        response = requests.post(
-            self.full_url + "rooms/" + room_id + "/ban",
+        Args:
+            operation (Operation): The operation
+            user_session (dict): Session of the user performing the operation
+            params (dict): Parameters of the stimulus
+            txn_id (str): Transaction id of an idempotent operation; reuse it to retry the same request
+        Returns:
+            int, dict: The status code, and the parameters of the response label if the request succeeded,
+                or the error body otherwise
+        """
+        if operation.idempotent and txn_id is None:
+            txn_id = self.txn_ids.next()
+        # Room ids such as !abc:server contain characters that are not allowed in a path segment
+        path = operation.path.format(**{name: quote(str(value), safe="") for name, value in params.items()},
+                                     txn_id=txn_id)
+        body = operation.body(params, self.session_dict) if operation.body else None
+        response = self.session_for(user_session).request(
+            operation.method,
+            self.full_url + path,
             headers=self.get_auth_header(user_session=user_session),
-            json = {"user_id": target_user_session["user_id"],
-                    "reason": "Should be banned."}
+            json=body,
+            timeout=self.request_timeout
         )
-        return response.status_code
+        if response.status_code != 200:
+            try:
+                return response.status_code, response.json()
+            except ValueError:
+                return response.status_code, {}
+        result = operation.result(response.json()) if operation.result else {}
+        return response.status_code, result
 
-    def unban_user(self, room_id: str, user_session: str, target_user_session: str):
-        response = requests.post(
-            self.full_url + "rooms/" + room_id + "/unban",
-            headers=self.get_auth_header(user_session),
-            json = {"user_id": target_user_session["user_id"]}
-        )
-        return response.status_code
+    def create_room(self, user_session: dict):
+        """Create a room as the given user. Returns the status code and the room id."""
+        status_code, result = self.perform(OPERATIONS["CREATE_ROOM"], user_session, {})
+        return status_code, result.get("room_id")
 
     def on_open(self):
         """
@@ -231,6 +361,9 @@ class MatrixConnection:
         """
         Perform any cleanup if the SUT is closed.
         """
+        if self.room_pool:
+            self.room_pool.stop()
+            self.room_pool = None
         self.one_session = None
         self.two_session = None
         self.three_session = None
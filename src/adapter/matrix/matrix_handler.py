@@ -1,23 +1,21 @@
+from __future__ import annotations
+
 import logging
+import threading
 import time
 
 from datetime import datetime
 
-from generic.api import label_pb2
-from generic.api.configuration import ConfigurationItem, Configuration
-from generic.api.label import Label, Sort
-from generic.api.parameter import Type, Parameter
-from generic.handler import Handler as AbstractHandler
-from matrix.matrix_connection import MatrixConnection
+from ..generic.api.configuration import ConfigurationItem, Configuration
+from ..generic.api.label import Label, Sort
+from ..generic.api.parameter import Type, Parameter
+from ..generic.handler import Handler as AbstractHandler
+from ..generic.lazy_import import lazy_import
+from . import operations
+from .matrix_connection import MatrixConnection
 from time import sleep
 
-def _response(name, channel='matrix', parameters=None):
-    """ Helper method to create a response Label. """
-    return Label(Sort.RESPONSE, name, channel, parameters=parameters)
-
-def _stimulus(name, channel='matrix', parameters=None):
-    """ Helper method to create a stimulus Label. """
-    return Label(Sort.STIMULUS, name, channel, parameters=parameters)
+label_pb2 = lazy_import('..generic.api.label_pb2', __package__)
 
 class MatrixHandler(AbstractHandler):
     """
@@ -27,6 +25,11 @@ class MatrixHandler(AbstractHandler):
     def __init__(self):
         super().__init__()
         self.sut = None
+        self.pristine = False  # no stimuli have been sent since the last start or reset
+        self.pipelining = False
+        self.sync = None  # SyncStream observing events of other users, if enabled
+        self._generation = 0  # incremented on reset, so responses of stimuli pipelined before are dropped
+        self._generation_lock = threading.Lock()
 
     def send_message_to_amp(self, label: str, parameters: dict):
         """
@@ -43,25 +46,106 @@ class MatrixHandler(AbstractHandler):
         """
         Start a test.
         """
-        end_point = self.configuration.items[0].value
-        container_name = self.configuration.items[1].value
-        self.sut = MatrixConnection(end_point, container_name)
+        end_point = self.configuration.value('endpoint')
+        container_name = self.configuration.value('docker_container')
+        room_pool_size = self.configuration.value('room_pool_size')
+        async_client = self.configuration.value('async_client')
+        self.pipelining = self.configuration.value('pipelining')
+        room_state_cache = self.configuration.value('room_state_cache')
+        sync_events = self.configuration.value('sync_events')
+        reset_strategy = self.configuration.value('reset_strategy')
+        snapshot_database = self.configuration.value('snapshot_database')
+        if self.pipelining and not async_client:
+            logging.warning('Pipelining requires the async client, using the async client')
+            async_client = True
+        http = self.shared_resources.http_session() if self.shared_resources else None
+        if async_client:
+            from .async_connection import AsyncMatrixConnection as connection
+        else:
+            connection = MatrixConnection
+        self.sut = connection(end_point, container_name, room_pool_size, http=http, room_state_cache=room_state_cache,
+                              reset_strategy=reset_strategy, snapshot_database=snapshot_database)
         self.sut.connect()
+        if sync_events:
+            self._start_sync()
+        self.pristine = True
         self.adapter_core.send_ready()
 
+    def reconfigure(self, changed: set) -> bool:
+        """
+        Apply a new configuration to the running connection. The user sessions are kept, unless the
+        endpoint changed: then the users log in on the new server. Of the other items, only what
+        depends on them is rebuilt, e.g. the room pool for `room_pool_size`. Switching the client
+        (`async_client`, `pipelining`) restarts the SUT.
+
+        Args:
+            changed ({str}): Names of the configuration items whose value changed
+        Returns:
+            bool: Whether the configuration was applied in place
+        """
+        if changed & {'async_client', 'pipelining'}:
+            return False
+        self._drop_pipelined_responses()
+        configuration = self.configuration
+
+        if self.sync and changed & {'endpoint', 'sync_events'}:
+            self.sync.stop()
+            self.sync = None
+        if 'docker_container' in changed:
+            self.sut.container_name = configuration.value('docker_container')
+        if changed & {'docker_container', 'reset_strategy', 'snapshot_database'}:
+            self.sut.set_reset_strategy(configuration.value('reset_strategy'),
+                                        configuration.value('snapshot_database'))
+        if 'room_state_cache' in changed:
+            self.sut.set_room_state_cache(configuration.value('room_state_cache'))
+
+        if 'endpoint' in changed:
+            self.sut.room_pool_size = configuration.value('room_pool_size')
+            self.sut.set_endpoint(configuration.value('endpoint'))
+            self.sut.connect()
+            self.pristine = True
+        elif 'room_pool_size' in changed:
+            self.sut.set_room_pool_size(configuration.value('room_pool_size'))
+
+        if configuration.value('sync_events') and not self.sync:
+            self._start_sync()
+        self.resume()
+        return True
+
     def reset(self):
         """
         Prepare the SUT for the next test case and notify the SUT when reset is completed.
         """
         logging.info('Resetting the SUT for a new test case')
+        self._drop_pipelined_responses()
+        if self.sync:
+            self.sync.pause()
         self.sut.reset()
+        if self.sync:
+            self.sync.resume()
+        self.pristine = True
         self.adapter_core.send_ready()
 
+    def resume(self):
+        """
+        Continue with the user sessions that were kept while reconnecting to AMP.
+        Synapse is only reset if stimuli have been sent since the last reset.
+        """
+        if self.pristine:
+            logging.info('SUT is still in its initial state, skipping the reset')
+            self.adapter_core.send_ready()
+        else:
+            self.reset()
+
     def stop(self):
         """
         Stop the SUT from testing.
         """
         logging.info('Stopping the plugin handler')
+        self._drop_pipelined_responses()
+        if self.sync:
+            self.sync.stop()
+            self.sync = None
         self.sut.stop()
         self.sut = None
 
@@ -77,6 +161,7 @@ class MatrixHandler(AbstractHandler):
         # Sleep a little bit to prevent too many requests error.
         #sleep(0.2)
 
+        self.pristine = False
         label = Label.decode(pb_label)
         sut_msg, params = self._label2message(label)
         #print("SUT MESSAGE", sut_msg)
@@ -88,29 +173,43 @@ class MatrixHandler(AbstractHandler):
 
         # leading spaces are needed to justify the stimuli and responses
         logging.info('      Injecting stimulus @SUT: ?{name}'.format(name=label.name))
-        raw_message, parameters = self.sut.send(sut_msg, params)
-        self.send_message_to_amp(raw_message, parameters)
+        if self.pipelining:
+            generation = self._generation
+            self.sut.submit(sut_msg, params).add_done_callback(
+                lambda future: self._on_pipelined_response(future, generation))
+        else:
+            raw_message, parameters = self.sut.send(sut_msg, params)
+            self.send_message_to_amp(raw_message, parameters)
+
+    def _on_pipelined_response(self, future, generation: int):
+        """
+        Send the response of a pipelined stimulus to AMP once the SUT answered it, unless the SUT
+        has been reset since the stimulus was sent: AMP has moved on to the next test case then.
+        """
+        try:
+            raw_message, parameters = future.result()
+        except Exception as e:
+            logging.error(f'Pipelined stimulus failed: {e}')
+            raw_message, parameters = 'FAIL', {}
+        with self._generation_lock:
+            if generation != self._generation:
+                logging.debug(f'Dropping {raw_message}, the response to a stimulus sent before the reset')
+                return
+            self.send_message_to_amp(raw_message, parameters)
+
+    def _drop_pipelined_responses(self):
+        """ Drop the responses of the stimuli pipelined until now, e.g. when the test case ends. """
+        with self._generation_lock:
+            self._generation += 1
 
     def supported_labels(self):
         """
-        The labels supported by the adapter.
+        The labels supported by the adapter, generated from the Matrix operations.
 
         Returns:
              [Label]: List of all supported labels of this adapter
         """
-        return [
-            _stimulus('create_room', parameters=[Parameter('username', Type.STRING)]),
-            _stimulus('join_room', parameters=[Parameter('room', Type.STRING), Parameter('username', Type.STRING)]),
-            _stimulus('leave_room', parameters=[Parameter('room', Type.STRING), Parameter('username', Type.STRING)]),
-            _stimulus('send_message', parameters=[Parameter('message', Type.STRING), Parameter('room', Type.STRING), Parameter('username', Type.STRING)]),
-            _stimulus('invite_user', parameters=[Parameter('user_id', Type.STRING), Parameter('room', Type.STRING), Parameter('username', Type.STRING)]),
-            _stimulus('ban_user', parameters=[Parameter('user_id', Type.STRING), Parameter('room', Type.STRING), Parameter('username', Type.STRING)]),
-            _stimulus('unban_user', parameters=[Parameter('user_id', Type.STRING), Parameter('room', Type.STRING), Parameter('username', Type.STRING)]),
-
-            _response('succes'),
-            _response('room_created_success', parameters=[Parameter('room', Type.STRING)]),
-            _response('fail', parameters=[Parameter('error_code', Type.INTEGER)])
-        ]
+        return operations.supported_labels()
 
     def default_configuration(self) -> Configuration:
         """
@@ -129,9 +228,53 @@ class MatrixHandler(AbstractHandler):
                 name='docker_container',
                 tipe=Type.STRING,
                 description='name of the docker container that should be reset when appropriate.',
-                value="synapse")
+                value="synapse"),
+            ConfigurationItem(
+                name='room_pool_size',
+                tipe=Type.INTEGER,
+                description='number of rooms pre-created per user and handed out on create_room. 0 disables the pool.',
+                value=0),
+            ConfigurationItem(
+                name='async_client',
+                tipe=Type.BOOLEAN,
+                description='log in users and purge rooms on reset concurrently.',
+                value=False),
+            ConfigurationItem(
+                name='pipelining',
+                tipe=Type.BOOLEAN,
+                description='send stimuli of different users concurrently; implies async_client.',
+                value=False),
+            ConfigurationItem(
+                name='room_state_cache',
+                tipe=Type.STRING,
+                description='answer stimuli that are certain to fail without a request: off, on, or strict '
+                            '(periodically verified against the server).',
+                value='off'),
+            ConfigurationItem(
+                name='sync_events',
+                tipe=Type.BOOLEAN,
+                description='report joins, bans and messages of other users, observed through /sync, as responses.',
+                value=False),
+            ConfigurationItem(
+                name='reset_strategy',
+                tipe=Type.STRING,
+                description='how to reset Synapse: purge (delete all rooms and restart the container), '
+                            'sqlite_snapshot or postgres_snapshot (restore a database snapshot).',
+                value='purge'),
+            ConfigurationItem(
+                name='snapshot_database',
+                tipe=Type.STRING,
+                description='database to snapshot: the path in the Synapse container for sqlite_snapshot '
+                            '(default /data/homeserver.db), <postgres container>/<database> for postgres_snapshot.',
+                value='')
         ])
 
+    def _start_sync(self):
+        from .sync_stream import SyncStream
+
+        self.sync = SyncStream(self.sut, self.send_message_to_amp, self.adapter_core.metrics)
+        self.sync.start(self.sut.session_dict)
+
     def _label2message(self, label: Label):
         """
         Converts a Protobuf label to a SUT message.
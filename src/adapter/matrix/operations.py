@@ -0,0 +1,124 @@
+import random
+import string
+
+from ..generic.api.label import Label, Sort
+from ..generic.api.parameter import Parameter, Type
+
+CHANNEL = 'matrix'
+
+SUCCESS = 'SUCCESS'
+ROOM_CREATED_SUCCESS = 'ROOM_CREATED_SUCCESS'
+FAIL = 'FAIL'
+
+MEMBER_EVENT = 'MEMBER_EVENT'
+MESSAGE_EVENT = 'MESSAGE_EVENT'
+
+# Responses of the model and their parameters
+RESPONSES = {
+    SUCCESS: [],
+    ROOM_CREATED_SUCCESS: ['room_id'],
+    FAIL: [],
+}
+
+# Responses for events of other users, observed through /sync, see `matrix.sync_stream`
+EVENT_RESPONSES = {
+    MEMBER_EVENT: ['username', 'room_id', 'user_id', 'membership'],
+    MESSAGE_EVENT: ['username', 'room_id', 'sender', 'message'],
+}
+
+
+def _random_room_name():
+    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=50))
+
+
+def _create_room_body(_params: dict, _sessions: dict) -> dict:
+    name_and_alias = _random_room_name()
+    return {
+        "name": name_and_alias,
+        "visibility": "public",
+        "preset": "public_chat",
+        "room_alias_name": name_and_alias,
+        "topic": "TOPIC",
+        "initial_state": []
+    }
+
+
+def _message_body(params: dict, _sessions: dict) -> dict:
+    return {"msgtype": "m.text", "body": params["message"]}
+
+
+def _target_user_body(reason: str = None):
+    """ Body naming the user given by the `user_id` parameter, which is the name of one of our users. """
+    def body(params: dict, sessions: dict) -> dict:
+        body = {"user_id": sessions[params["user_id"]]["user_id"]}
+        if reason:
+            body["reason"] = reason
+        return body
+    return body
+
+
+class Operation:
+    """
+    Declarative description of a Matrix operation, performed on a stimulus of the model.
+    Every operation is performed by the user given by the `username` parameter.
+
+    Attributes:
+        label (str): Name of the stimulus, e.g. 'join_room'
+        method (str): HTTP method
+        path (str): Path relative to the client API, formatted with the parameters, e.g. 'rooms/{room_id}/leave'
+        params ([str]): Parameters of the stimulus besides `username`, all required
+        body (callable): Optional; builds the JSON body from the parameters and the user sessions by username
+        response (str): Response label when the operation succeeded
+        result (callable): Optional; maps the JSON response to the parameters of the response label
+        idempotent (bool): Whether the path contains a transaction id, so the request can safely be retried
+    """
+
+    def __init__(self, label: str, method: str, path: str, params: list = None, body=None,
+                 response: str = SUCCESS, result=None):
+        self.label = label
+        self.method = method
+        self.path = path
+        self.params = params or []
+        self.body = body
+        self.response = response
+        self.result = result
+        self.idempotent = '{txn_id}' in path
+
+    @property
+    def name(self) -> str:
+        """ Name of the SUT message, e.g. 'JOIN_ROOM'. """
+        return self.label.upper()
+
+    def stimulus(self) -> Label:
+        """
+        Returns:
+            Label: The stimulus label of this operation
+        """
+        parameters = [Parameter(name, Type.STRING) for name in ['username'] + self.params]
+        return Label(Sort.STIMULUS, self.label, CHANNEL, parameters=parameters)
+
+
+OPERATIONS = {operation.name: operation for operation in [
+    Operation('create_room', 'POST', 'createRoom', body=_create_room_body,
+              response=ROOM_CREATED_SUCCESS, result=lambda json: {'room_id': json['room_id']}),
+    Operation('join_room', 'POST', 'join/{room_id}', params=['room_id']),
+    Operation('leave_room', 'POST', 'rooms/{room_id}/leave', params=['room_id']),
+    Operation('send_message', 'PUT', 'rooms/{room_id}/send/m.room.message/{txn_id}', params=['message', 'room_id'],
+              body=_message_body),
+    Operation('ban_user', 'POST', 'rooms/{room_id}/ban', params=['user_id', 'room_id'],
+              body=_target_user_body(reason='Should be banned.')),
+    Operation('unban_user', 'POST', 'rooms/{room_id}/unban', params=['user_id', 'room_id'],
+              body=_target_user_body()),
+]}
+
+
+def supported_labels() -> list:
+    """
+    The stimuli of all operations, their responses and the responses for observed events.
+
+    Returns:
+        [Label]
+    """
+    responses = [Label(Sort.RESPONSE, name.lower(), CHANNEL, parameters=[Parameter(p, Type.STRING) for p in params])
+                 for name, params in dict(RESPONSES, **EVENT_RESPONSES).items()]
+    return [operation.stimulus() for operation in OPERATIONS.values()] + responses
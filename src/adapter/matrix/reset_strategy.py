@@ -0,0 +1,188 @@
+import logging
+import os
+import time
+
+from abc import ABC, abstractmethod
+
+import requests
+
+from ..generic.lazy_import import lazy_import
+
+subprocess = lazy_import("subprocess")  # only needed by the snapshot strategies
+
+RESET_STRATEGIES = ("purge", "sqlite_snapshot", "postgres_snapshot")
+
+
+class PurgeReset:
+    """
+    Deletes every room created by the test through the admin API and restarts the Synapse
+    container. Rooms in the room pool have not been touched by the test case, so they are kept.
+    Its duration grows with the number of rooms the test case created.
+    """
+
+    def prepare(self, connection):
+        """Called at connect, after the users logged in."""
+
+    def reset(self, connection):
+        pooled_rooms = connection.room_pool.idle_rooms() if connection.room_pool else set()
+        admin_session = connection.admin_session = connection.login_user("admin", "admin")
+        logging.info(f"Deleting all rooms, restarting synapse container and waiting 5 seconds...")
+        connection.delete_rooms([room_id for room_id in connection.get_room_ids(admin_session)
+                                 if room_id not in pooled_rooms], admin_session)
+        connection.restart_container()
+
+
+class SnapshotReset(ABC):
+    """
+    Restores a snapshot of the Synapse database, captured at the first connect right after the
+    users logged in, while the Synapse container is stopped. The duration does not depend on the
+    length of the test case. As the snapshot holds the sessions of that connect, including their
+    access tokens, the users stay logged in. The room pool is emptied, as its rooms are not in
+    the snapshot.
+
+    Until the snapshot has been captured, i.e. on the very first reset, the rooms are purged.
+    Subclasses implement `capture` and `restore` for a database backend.
+
+    Attributes:
+        captured (bool): Whether the snapshot has been captured
+    """
+
+    def __init__(self):
+        self.captured = False
+
+    def prepare(self, connection):
+        if self.captured:
+            return
+        logging.info("Capturing a snapshot of the Synapse database...")
+        self._stopped(connection, self.capture)
+        self.captured = True
+
+    def reset(self, connection):
+        if not self.captured:
+            PurgeReset().reset(connection)
+            return
+        logging.info("Restoring the snapshot of the Synapse database...")
+        self._stopped(connection, self.restore)
+        if connection.room_pool:
+            connection.room_pool.clear()
+
+    @abstractmethod
+    def capture(self, connection):
+        """Copy the database of the stopped Synapse container to the snapshot."""
+        pass
+
+    @abstractmethod
+    def restore(self, connection):
+        """Replace the database of the stopped Synapse container with the snapshot."""
+        pass
+
+    @staticmethod
+    def docker(*args):
+        subprocess.run(["docker", *args], check=True, stdout=subprocess.DEVNULL)
+
+    def _stopped(self, connection, action):
+        """Perform the action while the Synapse container is stopped, so the database is consistent."""
+        self.docker("stop", connection.container_name)
+        try:
+            action(connection)
+        finally:
+            self.docker("start", connection.container_name)
+            connection.wait_until_ready()
+
+
+class SqliteSnapshotReset(SnapshotReset):
+    """
+    Snapshot of a SQLite database, copied out of and back into the (stopped) Synapse container.
+
+    Attributes:
+        database (str): Path of the database in the Synapse container
+        snapshot (str): Path of the snapshot on this machine
+    """
+
+    def __init__(self, database="/data/homeserver.db"):
+        super().__init__()
+        self.database = database
+        self.snapshot = None
+
+    def capture(self, connection):
+        import tempfile
+        self.snapshot = os.path.join(tempfile.gettempdir(), f"{connection.container_name}_snapshot.db")
+        self.docker("cp", f"{connection.container_name}:{self.database}", self.snapshot)
+
+    def restore(self, connection):
+        self.docker("cp", self.snapshot, f"{connection.container_name}:{self.database}")
+
+
+class PostgresSnapshotReset(SnapshotReset):
+    """
+    Snapshot of a Postgres database as a template database next to it, in the Postgres container.
+    Restoring drops the database and creates it again from the template.
+
+    Attributes:
+        container (str): Name of the Postgres container
+        database (str): Name of the Synapse database
+        user (str): Postgres user owning the database
+    """
+
+    def __init__(self, container, database="synapse", user="synapse"):
+        super().__init__()
+        self.container = container
+        self.database = database
+        self.user = user
+
+    @property
+    def template(self) -> str:
+        return f"{self.database}_snapshot"
+
+    def capture(self, connection):
+        self.psql(f'DROP DATABASE IF EXISTS "{self.template}"')
+        self.psql(f'CREATE DATABASE "{self.template}" TEMPLATE "{self.database}"')
+
+    def restore(self, connection):
+        self.psql(f'DROP DATABASE "{self.database}"')
+        self.psql(f'CREATE DATABASE "{self.database}" TEMPLATE "{self.template}"')
+
+    def psql(self, statement: str):
+        self.docker("exec", self.container, "psql", "-U", self.user, "-d", "postgres", "-c", statement)
+
+
+def create_reset_strategy(name: str, snapshot_database: str = ""):
+    """
+    Create a reset strategy by name.
+
+    Args:
+        name (str): One of `RESET_STRATEGIES`
+        snapshot_database (str): For 'sqlite_snapshot' the path of the database in the Synapse
+            container, for 'postgres_snapshot' '<postgres container>/<database>'. Empty for the default.
+    Returns:
+        PurgeReset|SnapshotReset
+    """
+    if name == "purge":
+        return PurgeReset()
+    if name == "sqlite_snapshot":
+        return SqliteSnapshotReset(snapshot_database or "/data/homeserver.db")
+    if name == "postgres_snapshot":
+        container, _, database = snapshot_database.partition("/")
+        if not container:
+            raise ValueError("postgres_snapshot needs the database as '<postgres container>/<database>'")
+        return PostgresSnapshotReset(container, database or "synapse")
+    raise ValueError(f"reset_strategy should be one of {RESET_STRATEGIES}")
+
+
+def wait_until_ready(endpoint: str, http, timeout: float = 30.0, interval: float = 0.1):
+    """
+    Wait until Synapse answers client requests again, e.g. after its container was started.
+
+    Raises:
+        TimeoutError: If Synapse is not ready within the timeout
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if http.get(endpoint + "/_matrix/client/versions", timeout=interval * 10).ok:
+                return
+        except requests.RequestException:
+            pass
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Synapse at {endpoint} is not ready after {timeout} seconds")
+        time.sleep(interval)
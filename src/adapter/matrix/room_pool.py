@@ -0,0 +1,177 @@
+import logging
+import threading
+import time
+
+from collections import deque
+
+
+class RoomPool:
+    """
+    Pool of pre-created rooms, handed out on CREATE_ROOM stimuli instead of sending a `createRoom`,
+    which is one of the slowest Synapse operations.
+
+    Rooms are created in a background thread while the SUT is idle, i.e. when no stimulus has been
+    sent for `idle_after` seconds, and right away after the start and after a reset, so neither
+    waits for the pool. While the pool of a user is empty, CREATE_ROOM creates the room directly.
+    A pooled room is created exactly like
+    `MatrixConnection.create_room` does (fresh random alias, creator is the only member) and is handed
+    out at most once, so it is indistinguishable from a room created on demand.
+    Rooms that were never handed out survive a reset and are reused in the next test case.
+
+    Attributes:
+        connection (MatrixConnection): Connection used to create the rooms
+        size (int): Number of rooms kept ready per user
+        idle_after (float): Seconds without stimuli before the pool is topped up in the background
+    """
+
+    def __init__(self, connection, size: int, idle_after: float = 0.5):
+        self.connection = connection
+        self.size = size
+        self.idle_after = idle_after
+
+        self.rooms = {}  # username -> deque of room ids that were never handed out
+        self.last_activity = 0.0
+
+        self._lock = threading.Lock()  # guards `rooms`; never held during a request
+        self._create_lock = threading.Lock()
+        self._paused = threading.Event()
+        self._refill = threading.Event()
+        self._eager = threading.Event()  # fill the next round without waiting for the SUT to become idle
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, usernames):
+        """
+        Start filling the pool for the given users in the background.
+
+        Args:
+            usernames ([str]): Users for which rooms are pre-created
+        """
+        with self._lock:
+            for username in usernames:
+                self.rooms.setdefault(username, deque())
+
+        self._thread = threading.Thread(target=self._worker, name='matrix_room_pool', daemon=True)
+        self._thread.start()
+        self._eager.set()
+        self._refill.set()
+
+    def stop(self):
+        """ Stop the background thread. Pooled rooms are forgotten. """
+        self._stopped.set()
+        self._refill.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self.rooms.clear()
+
+    def take(self, username: str):
+        """
+        Hand out a pooled room of the given user.
+
+        Args:
+            username (str)
+        Returns:
+            str: The room id, or None if the pool of this user is empty.
+        """
+        self.notify_activity()
+        with self._lock:
+            pool = self.rooms.get(username)
+            room_id = pool.popleft() if pool else None
+
+        self._refill.set()
+        return room_id
+
+    def notify_activity(self):
+        """ Mark the SUT as busy, postponing background room creation. """
+        self.last_activity = time.monotonic()
+
+    def idle_rooms(self) -> set:
+        """
+        The rooms which have not been handed out, and therefore have not been touched by the test.
+
+        Returns:
+            {str}: Room ids
+        """
+        with self._lock:
+            return {room_id for pool in self.rooms.values() for room_id in pool}
+
+    def clear(self):
+        """ Forget the pooled rooms, e.g. when a reset removed them from the SUT. """
+        with self._lock:
+            for pool in self.rooms.values():
+                pool.clear()
+
+    def pause(self):
+        """ Stop creating rooms, e.g. while the SUT is being reset. Waits for a pending creation. """
+        self._paused.set()
+        with self._create_lock:
+            pass
+
+    def resume(self, fill: bool = False):
+        """
+        Resume creating rooms after `pause`.
+
+        Args:
+            fill (bool): Fill the pool in the background right away instead of waiting for the SUT to become idle
+        """
+        if fill:
+            self._eager.set()
+        self._paused.clear()
+        self._refill.set()
+
+    def fill(self):
+        """ Synchronously create rooms until the pool of every user is full. """
+        for username in list(self.rooms):
+            while len(self.rooms[username]) < self.size and not self._stopped.is_set():
+                if not self._create(username):
+                    break
+        logging.info('Room pool filled: {sizes}'.format(sizes={u: len(p) for u, p in self.rooms.items()}))
+
+    def _worker(self):
+        while not self._stopped.is_set():
+            self._refill.wait()
+            self._refill.clear()
+            eager = self._eager.is_set()
+            self._eager.clear()
+
+            for username in list(self.rooms):
+                while not self._stopped.is_set() and not self._paused.is_set() \
+                        and len(self.rooms[username]) < self.size:
+                    idle = time.monotonic() - self.last_activity
+                    if idle < self.idle_after and not eager:
+                        self._stopped.wait(self.idle_after - idle)
+                        continue
+                    if not self._create(username):
+                        break
+
+    def _create(self, username: str) -> bool:
+        """
+        Create one room for the given user and add it to the pool, unless the pool is full.
+        The creations are serialized, and the size check and the append happen under the same
+        `_create_lock`, so `fill` and the background thread cannot overfill the pool together.
+        """
+        with self._create_lock:
+            if self._paused.is_set() and threading.current_thread() is self._thread:
+                return False
+            with self._lock:
+                if len(self.rooms[username]) >= self.size:
+                    return False
+
+            user_session = self.connection.session_dict[username]
+            try:
+                status_code, room_id = self.connection.create_room(user_session)
+            except Exception as e:
+                logging.warning('Could not create a pooled room for {user}: {ex}'.format(user=username, ex=e))
+                return False
+
+            if status_code != 200:
+                logging.warning('Could not create a pooled room for {user}: status {code}'
+                                .format(user=username, code=status_code))
+                return False
+
+            with self._lock:
+                self.rooms[username].append(room_id)
+        logging.debug('Added room {room} to the pool of {user}'.format(room=room_id, user=username))
+        return True
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+
+
+class RoomState:
+    """
+    Local shadow of the membership and bans of the rooms created in the current test case, updated
+    from successful responses. It answers stimuli that are certain to fail, such as stimuli with an
+    empty or unknown room, or a message to a room the user is not in, without a request to Synapse.
+
+    The shadow only knows rooms created since the last reset, which are all the rooms of the test
+    case, as a reset deletes all other rooms. Stimuli it cannot judge are always sent to Synapse.
+
+    In strict mode the shadow is compared with the state on the server every `verify_interval`
+    seconds. Differences are logged and the server state is taken over.
+
+    Attributes:
+        strict (bool): Periodically verify the shadow against the server
+        verify_interval (float): Seconds between two verifications in strict mode
+        short_circuited (int): Number of stimuli answered without a request
+        mismatches (int): Number of rooms whose shadow differed from the server in strict mode
+    """
+
+    def __init__(self, strict: bool = False, verify_interval: float = 10.0):
+        self.strict = strict
+        self.verify_interval = verify_interval
+        self.rooms = {}  # room id -> {'creator': str, 'members': set of usernames, 'banned': set of usernames}
+        self.short_circuited = 0
+        self.mismatches = 0
+        self._last_verified = time.monotonic()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """ Forget all rooms, e.g. after a reset. """
+        with self._lock:
+            self.rooms.clear()
+            self._last_verified = time.monotonic()
+
+    def check(self, label: str, params: dict):
+        """
+        Judge a stimulus before it is sent.
+
+        Args:
+            label (str): Name of the SUT message, e.g. 'JOIN_ROOM'
+            params (dict): Parameters of the stimulus
+        Returns:
+            str: Why the stimulus is certain to fail, or None if it has to be sent to Synapse
+        """
+        if label == "CREATE_ROOM":
+            return None
+
+        username = params.get("username")
+        room_id = params.get("room_id")
+        if not room_id:
+            return "no room given"
+
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                return f"unknown room {room_id}"
+
+            if label == "JOIN_ROOM":
+                if username in room["banned"]:
+                    return f"{username} is banned from {room_id}"
+            elif label in ("LEAVE_ROOM", "SEND_MESSAGE"):
+                if username not in room["members"]:
+                    return f"{username} is not in {room_id}"
+            elif label in ("BAN_USER", "UNBAN_USER"):
+                # Only the creator has the power level to (un)ban in a room created with the public_chat preset
+                if username != room["creator"] or username not in room["members"]:
+                    return f"{username} may not (un)ban in {room_id}"
+        return None
+
+    def update(self, label: str, params: dict, result: dict):
+        """
+        Apply a stimulus that succeeded.
+
+        Args:
+            label (str): Name of the SUT message, e.g. 'JOIN_ROOM'
+            params (dict): Parameters of the stimulus
+            result (dict): Parameters of the response
+        """
+        username = params.get("username")
+        with self._lock:
+            if label == "CREATE_ROOM":
+                self.rooms[result["room_id"]] = {"creator": username, "members": {username}, "banned": set()}
+                return
+
+            room = self.rooms.get(params.get("room_id"))
+            if room is None:
+                return
+            if label == "JOIN_ROOM":
+                room["members"].add(username)
+            elif label == "LEAVE_ROOM":
+                room["members"].discard(username)
+            elif label == "BAN_USER":
+                room["members"].discard(params["user_id"])
+                room["banned"].add(params["user_id"])
+            elif label == "UNBAN_USER":
+                room["banned"].discard(params["user_id"])
+
+    def verification_due(self) -> bool:
+        return self.strict and time.monotonic() - self._last_verified >= self.verify_interval
+
+    def verify(self, fetch_room_state):
+        """
+        Compare the shadow with the server and take over the server state where they differ.
+
+        Args:
+            fetch_room_state (callable): Returns the members and banned usernames of a room id as
+                two sets, or None if the room does not exist
+        """
+        with self._lock:
+            room_ids = list(self.rooms)
+            self._last_verified = time.monotonic()
+
+        for room_id in room_ids:
+            server_state = fetch_room_state(room_id)
+            with self._lock:
+                room = self.rooms.get(room_id)
+                if room is None:
+                    continue
+                if server_state is None:
+                    logging.warning(f"Room state cache: {room_id} no longer exists on the server")
+                    self.mismatches += 1
+                    del self.rooms[room_id]
+                    continue
+                members, banned = server_state
+                if (members, banned) != (room["members"], room["banned"]):
+                    logging.warning(f"Room state cache: {room_id} differs from the server: "
+                                    f"members {room['members']} != {members}, banned {room['banned']} != {banned}")
+                    self.mismatches += 1
+                    room["members"], room["banned"] = members, banned
@@ -0,0 +1,216 @@
+import json
+import logging
+import threading
+import time
+
+from collections import deque
+
+import requests
+
+from .operations import MEMBER_EVENT, MESSAGE_EVENT
+
+# Only the events the responses are made of, and no history on the initial sync
+SYNC_FILTER = json.dumps({
+    'presence': {'types': []},
+    'account_data': {'types': []},
+    'room': {'timeline': {'types': ['m.room.member', 'm.room.message']},
+             'state': {'types': []}, 'ephemeral': {'types': []}, 'account_data': {'types': []}},
+})
+
+
+def event_response(username: str, room_id: str, event: dict, usernames: dict):
+    """
+    The response for an event observed by a user, see `matrix.operations.EVENT_RESPONSES`.
+
+    Args:
+        username (str): The user that observed the event
+        room_id (str): Room of the event
+        event (dict): The event from the sync response
+        usernames ({str: str}): Usernames by user id
+    Returns:
+        (str, dict): The response message and its parameters, or None if the event is not reported
+    """
+    sender = usernames.get(event.get('sender'))
+    if sender is None or sender == username:
+        return None  # events of unknown users, and the user's own stimuli
+
+    content = event.get('content', {})
+    if event.get('type') == 'm.room.member':
+        subject = usernames.get(event.get('state_key'))
+        if subject is None:
+            return None
+        return MEMBER_EVENT, {'username': username, 'room_id': room_id, 'user_id': subject,
+                              'membership': content.get('membership', '')}
+    if event.get('type') == 'm.room.message':
+        return MESSAGE_EVENT, {'username': username, 'room_id': room_id, 'sender': sender,
+                               'message': content.get('body', '')}
+    return None
+
+
+class SyncStream:
+    """
+    Observes events pushed by the server, such as other users joining, being banned or sending
+    messages. Every user session long-polls `/sync` in its own thread with incremental `since`
+    tokens. Observed events are put in one bounded buffer, from which a separate thread passes
+    them to `on_event`, so neither polling nor stimulus handling waits for the other.
+    When the buffer is full the oldest events are dropped.
+
+    Metrics:
+        sync_events, sync_dropped_events, sync_errors (counters): observed, dropped and failed polls
+        sync_backlog (gauge): events waiting in the buffer
+        sync_latency (histogram): seconds from the event on the server until it is passed on
+        sync_poll (histogram): duration of a /sync request
+
+    Attributes:
+        connection (MatrixConnection): Connection holding the user sessions
+        on_event (callable): Called with the response message and its parameters
+        metrics (generic.metrics.Metrics): Registry for the metrics above
+        timeout_ms (int): Long-poll timeout of a /sync request
+        buffer_size (int): Maximum number of buffered events
+    """
+
+    def __init__(self, connection, on_event, metrics, timeout_ms: int = 10000, buffer_size: int = 1000):
+        self.connection = connection
+        self.on_event = on_event
+        self.metrics = metrics
+        self.timeout_ms = timeout_ms
+        self.buffer_size = buffer_size
+
+        self.buffer = deque()
+        self._available = threading.Condition()
+        self._stopped = threading.Event()
+        self._generation = 0  # incremented on pause and resume, so polls started before are discarded
+        self._paused = False
+        self._sessions = {}
+        self._since = {}  # username -> stream position of the next sync
+        self._threads = []
+
+    def start(self, sessions: dict):
+        """
+        Start polling for the given user sessions. Events from this moment on are observed.
+
+        Args:
+            sessions ({str: dict}): User sessions by username
+        """
+        self._stopped.clear()
+        self._threads = []
+        self._sessions = dict(sessions)
+        self._since = self._current_positions()
+        usernames = {session['user_id']: username for username, session in sessions.items()}
+        for username, session in sessions.items():
+            thread = threading.Thread(target=self._poll, args=(username, session, usernames),
+                                      name=f'matrix_sync_{username}', daemon=True)
+            self._threads.append(thread)
+        self._threads.append(threading.Thread(target=self._deliver, name='matrix_sync_delivery', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stop polling and drop the buffered events. Waits until the threads have ended, so a poll in
+        progress can delay stopping by up to the long-poll timeout; its events are discarded.
+        """
+        self._stopped.set()
+        with self._available:
+            self.buffer.clear()
+            self._available.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def pause(self):
+        """ Ignore events until `resume`, e.g. the room deletions of a reset. """
+        with self._available:
+            self._paused = True
+            self._generation += 1
+            self.buffer.clear()
+            self.metrics.set_gauge('sync_backlog', 0)
+
+    def resume(self):
+        """ Observe events again, from this moment on. """
+        positions = self._current_positions()
+        with self._available:
+            self._since = positions
+            self._paused = False
+            self._generation += 1
+
+    def _current_positions(self) -> dict:
+        """ The current stream position of every user, from a sync without waiting. """
+        positions = {}
+        for username, session in self._sessions.items():
+            try:
+                positions[username] = self._sync(requests, session, None)['next_batch']
+            except (requests.RequestException, ValueError, KeyError) as e:
+                logging.warning(f'Sync of {username} failed: {e}')
+                self.metrics.increment('sync_errors')
+        return positions
+
+    def _sync(self, http, session: dict, since: str) -> dict:
+        params = {'filter': SYNC_FILTER, 'timeout': self.timeout_ms if since else 0}
+        if since:
+            params['since'] = since
+        start = time.perf_counter()
+        response = http.get(self.connection.full_url + 'sync', params=params,
+                            headers=self.connection.get_auth_header(session), timeout=self.timeout_ms / 1000 + 10)
+        response.raise_for_status()
+        body = response.json()
+        self.metrics.observe('sync_poll', time.perf_counter() - start)
+        return body
+
+    def _poll(self, username: str, session: dict, usernames: dict):
+        http = requests.Session()
+        while not self._stopped.is_set():
+            with self._available:
+                paused, generation, since = self._paused, self._generation, self._since.get(username)
+            if paused:
+                self._stopped.wait(0.1)
+                continue
+
+            try:
+                body = self._sync(http, session, since)
+            except (requests.RequestException, ValueError) as e:
+                logging.warning(f'Sync of {username} failed: {e}')
+                self.metrics.increment('sync_errors')
+                self._stopped.wait(1)
+                continue
+
+            with self._available:
+                if self._stopped.is_set():
+                    return
+                if generation != self._generation:
+                    continue  # paused or resumed while polling; continue from the new position
+                if since is not None:
+                    for section in ('join', 'leave'):
+                        for room_id, room in body.get('rooms', {}).get(section, {}).items():
+                            for event in room.get('timeline', {}).get('events', []):
+                                self._buffer(event_response(username, room_id, event, usernames), event)
+                self._since[username] = body.get('next_batch', since)
+
+    def _buffer(self, response, event: dict):
+        """ Add a response to the buffer; the caller holds `_available`. """
+        if response is None:
+            return
+        if len(self.buffer) >= self.buffer_size:
+            self.buffer.popleft()
+            self.metrics.increment('sync_dropped_events')
+        self.buffer.append((response, event.get('origin_server_ts')))
+        self.metrics.increment('sync_events')
+        self.metrics.set_gauge('sync_backlog', len(self.buffer))
+        self._available.notify()
+
+    def _deliver(self):
+        while True:
+            with self._available:
+                while not self.buffer and not self._stopped.is_set():
+                    self._available.wait()
+                if self._stopped.is_set():
+                    return
+                (message, params), timestamp = self.buffer.popleft()
+                self.metrics.set_gauge('sync_backlog', len(self.buffer))
+
+            if timestamp:
+                self.metrics.observe('sync_latency', max(0.0, time.time() - timestamp / 1000))
+            try:
+                self.on_event(message, params)
+            except Exception as e:
+                logging.error(f'Could not pass on {message} {params}: {e}')
@@ -1,15 +1,75 @@
 import argparse
 import logging
 import socket
+import sys
 
-from generic.adapter_core import AdapterCore
-from generic.broker_connection import BrokerConnection
-from smartdoor.handler import Handler
-from matrix.matrix_handler import MatrixHandler
+from typing import TYPE_CHECKING
 
-ADAPTER_NAME = 'Matrix'
+if __name__ == '__main__' and not __package__:
+    # Started as a script, `python src/adapter/plugin_adapter.py`: run it as a module of the package instead,
+    # with the directory of the package on the path rather than the package directory itself
+    import os
+    import runpy
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runpy.run_module('adapter.plugin_adapter', run_name='__main__', alter_sys=True)
+    sys.exit()
 
-def start_plugin_adapter(adapter_name: str, url: str, token: str, loglevel: int):
+from .generic.lazy_import import ImportTimer
+
+# Installed before the adapter modules are imported, so their imports are timed as well
+import_timer = ImportTimer() if '--import-time' in sys.argv else None
+if import_timer:
+    import_timer.install()
+
+from .generic.adapter_core import AdapterCore  # noqa: E402
+from .generic.broker_connection import BrokerConnection  # noqa: E402
+from .generic.handler_registry import registry  # noqa: E402
+from .generic.metrics import MetricsExporter  # noqa: E402
+from .generic.reconnect import ReconnectManager  # noqa: E402
+
+if TYPE_CHECKING:
+    from .generic.profiler import SamplingProfiler  # imported only with --profile
+
+DEFAULT_HANDLER = 'matrix'
+
+# Options of a single adapter; in supervisor mode the config file sets them per instance
+INSTANCE_OPTIONS = ('name', 'url', 'token', 'handler', 'profile', 'profile_interval', 'profile_output',
+                    'reconnect_max_delay', 'keep_sut_warm', 'ping_interval', 'ping_timeout', 'compress_threshold',
+                    'metrics_file', 'metrics_interval', 'import_time')
+
+LOG_FORMAT = '%(asctime)s-[%(levelname)8s] %(name)s::%(module)s|%(lineno)s:: %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def create_adapter_core(adapter_name: str, url: str, token: str, handler_name: str = DEFAULT_HANDLER,
+                        broker_options: dict = None, **core_options) -> AdapterCore:
+    """
+    Create an adapter core with its broker connection and handler, wired together.
+
+    Args:
+        adapter_name (str): Name of the adapter
+        url (str): Url of the Axini Modeling Platform
+        token (str): Token needed to authenticate with the Axini Modeling Platform
+        handler_name (str): Name of the handler in the handler registry (default 'matrix')
+        broker_options (dict): Keyword arguments for `BrokerConnection`, e.g. `ping_interval`
+        core_options: Keyword arguments for `AdapterCore`, e.g. `keep_sut_warm`
+
+    Returns:
+        AdapterCore: The adapter core, not yet connected to AMP
+    """
+    broker_connection = BrokerConnection(url, token, **(broker_options or {}))
+    handler = registry.create(handler_name)
+
+    adapter_core = AdapterCore(adapter_name, broker_connection, handler, **core_options)
+
+    broker_connection.register_adapter_core(adapter_core)
+    handler.register_adapter_core(adapter_core)
+
+    return adapter_core
+
+def start_plugin_adapter(adapter_name: str, url: str, token: str, loglevel: int,
+                         profiler: 'SamplingProfiler' = None, handler_name: str = DEFAULT_HANDLER,
+                         broker_options: dict = None, metrics_file: str = None, metrics_interval: float = 10.0,
+                         import_timer: ImportTimer = None, **core_options):
     """
     Start the adapter and connect with AMP.
 
@@ -18,51 +78,138 @@ def start_plugin_adapter(adapter_name: str, url: str, token: str, loglevel: int)
         url (str): Url of the Axini Modeling Platform
         token (str): Token needed to authenticate with the Axini Modeling Platform
         loglevel (int): Loglevel constant
+        profiler (SamplingProfiler): Optional profiler sampling all adapter threads (default None)
+        handler_name (str): Name of the handler in the handler registry (default 'matrix')
+        broker_options (dict): Keyword arguments for `BrokerConnection`, e.g. `ping_interval`
+        metrics_file (str): Optional file to which the health and metrics are written as JSON (default None)
+        metrics_interval (float): Seconds between two writes of the metrics file (default 10)
+        import_timer (ImportTimer): Optional timer whose report is printed just before connecting to AMP (default None)
+        core_options: Keyword arguments for `AdapterCore`, e.g. `keep_sut_warm`
     """
     logging.basicConfig(
         filemode='a',
         filename="output.txt",
         level=loglevel,
-        format='%(asctime)s-[%(levelname)8s] %(name)s::%(module)s|%(lineno)s:: %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
+        format=LOG_FORMAT,
+        datefmt=LOG_DATE_FORMAT
     )
 
-    broker_connection = BrokerConnection(url, token)
-    # Change this between Handler and MatrixHandler to switch.
-    handler = MatrixHandler()
+    adapter_core = create_adapter_core(adapter_name, url, token, handler_name, broker_options, **core_options)
 
-    adapter_core = AdapterCore(adapter_name, broker_connection, handler)
+    if profiler:
+        profiler.wrap(adapter_core, '_handle_message')
+        # The worker thread holds on to the bound method, so point it to the wrapper.
+        adapter_core.qthread_handle_message.process_item = adapter_core._handle_message
+        profiler.install_signal_handlers()
+        profiler.start()
 
-    broker_connection.register_adapter_core(adapter_core)
-    handler.register_adapter_core(adapter_core)
+    exporter = None
+    if metrics_file:
+        exporter = MetricsExporter(adapter_core.health, metrics_file, metrics_interval)
+        exporter.start()
 
-    adapter_core.start()
+    if import_timer:
+        report = import_timer.report('before connecting to AMP')
+        print(report, file=sys.stderr)
+        logging.info(report.splitlines()[-1])
 
-if __name__ == '__main__':
+    try:
+        adapter_core.start()
+    finally:
+        if profiler:
+            profiler.stop()
+        if exporter:
+            exporter.stop()
+
+def main():
+    """ Entry point of the `amp-adapter` command. """
     print("Parsing arguments")
     parser = argparse.ArgumentParser()
     parser.add_argument('-n', '--name',
                         help='Adapter name suffix visible in AMP: "some_suffix" (optional)', required=False)
     parser.add_argument('-u', '--url',
-                        help='AMP Adapter URL reference: "wss://..."', required=True)
+                        help='AMP Adapter URL reference: "wss://..." (required unless --supervise is given)')
     parser.add_argument('-t', '--token',
-                        help='AMP Adapter Token: "kjhsdkhk..."', required=True)
+                        help='AMP Adapter Token: "kjhsdkhk..." (required unless --supervise is given)')
     parser.add_argument('-ll', '--log_level',
                         help='AMP Adapter logger level: ERROR, WARNING, INFO, DEBUG (default: INFO)',
                         required=False)
+    parser.add_argument('--handler', choices=registry.names(), default=DEFAULT_HANDLER,
+                        help='SUT handler to run (default: {default})'.format(default=DEFAULT_HANDLER))
+    parser.add_argument('--profile', action='store_true',
+                        help='Sample the stacks of all adapter threads into a collapsed stack file (flamegraph input). '
+                             'SIGUSR1 writes the file, SIGUSR2 profiles the next handled messages with cProfile')
+    parser.add_argument('--profile-interval', type=float, default=0.01,
+                        help='Seconds between two stack samples (default: 0.01)', required=False)
+    parser.add_argument('--profile-output', default='profile.collapsed',
+                        help='Collapsed stack output file (default: profile.collapsed)', required=False)
+    parser.add_argument('--reconnect-max-delay', type=float, default=60.0,
+                        help='Maximum seconds between two attempts to reconnect to AMP (default: 60)')
+    parser.add_argument('--keep-sut-warm', type=float, default=0.0, metavar='SECONDS',
+                        help='Keep the SUT connection and sessions this long after the connection with AMP dropped, '
+                             'so a quick reconnect does not restart the SUT (default: 0)')
+    parser.add_argument('--ping-interval', type=float, default=0.0,
+                        help='Seconds between two heartbeat pings to AMP; the round-trip times are recorded '
+                             'as the broker_rtt metric. 0 disables the heartbeat (default: 0)')
+    parser.add_argument('--ping-timeout', type=float,
+                        help='Seconds without a pong after which the connection is considered dead and '
+                             'reconnected (default: the ping interval)')
+    parser.add_argument('--compress-threshold', type=int, metavar='BYTES',
+                        help='Offer permessage-deflate compression to AMP and compress messages of at least '
+                             'this many bytes, such as announcements (default: no compression)')
+    parser.add_argument('--metrics-file',
+                        help='File to which the health and metrics (latencies, round-trip times) are written as JSON')
+    parser.add_argument('--metrics-interval', type=float, default=10.0,
+                        help='Seconds between two writes of the metrics file (default: 10)')
+    parser.add_argument('--import-time', action='store_true',
+                        help='Print the import time of every module, like python -X importtime, '
+                             'just before connecting to AMP')
+    parser.add_argument('--supervise', metavar='CONFIG',
+                        help='Run all adapter instances of this JSON config file in one process (see supervisor.py)')
+    parser.add_argument('--health-interval', type=float, default=30.0,
+                        help='Seconds between two health reports in supervisor mode (default: 30)')
+    parser.add_argument('--health-file',
+                        help='File to which the health reports are written as JSON in supervisor mode')
 
     args = parser.parse_args()
 
+    if args.supervise:
+        given = ['--' + option.replace('_', '-') for option in INSTANCE_OPTIONS
+                 if getattr(args, option) != parser.get_default(option)]
+        if given:
+            parser.error('argument --supervise: not allowed with {options}, set them in the config file'.format(
+                options=', '.join(given)))
+    elif not (args.url and args.token):
+        parser.error('the following arguments are required: -u/--url, -t/--token')
+
     # Create the name as displayed on the adapter page of AMP
     suffix = socket.gethostname()
     if args.name:
         suffix = args.name
 
-    name = ADAPTER_NAME + "@" + suffix
+    name = args.handler.capitalize() + "@" + suffix
 
     if not args.log_level:
         log_level = logging.INFO
     else:
         log_level = args.log_level
 
-    start_plugin_adapter(name, args.url, args.token, log_level)
+    profiler = None
+    if args.profile:
+        from .generic.profiler import SamplingProfiler
+        profiler = SamplingProfiler(interval=args.profile_interval, output=args.profile_output)
+
+    if args.supervise:
+        from .supervisor import start_supervisor
+        start_supervisor(args.supervise, log_level, args.health_interval, args.health_file)
+    else:
+        start_plugin_adapter(name, args.url, args.token, log_level, profiler=profiler, handler_name=args.handler,
+                             broker_options={'ping_interval': args.ping_interval, 'ping_timeout': args.ping_timeout,
+                                             'compress_threshold': args.compress_threshold},
+                             metrics_file=args.metrics_file, metrics_interval=args.metrics_interval,
+                             import_timer=import_timer,
+                             reconnect_manager=ReconnectManager(max_delay=args.reconnect_max_delay),
+                             keep_sut_warm=args.keep_sut_warm)
+
+if __name__ == '__main__':
+    main()
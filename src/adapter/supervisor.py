@@ -0,0 +1,271 @@
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .generic.adapter_core import AdapterCore
+from .plugin_adapter import DEFAULT_HANDLER, LOG_DATE_FORMAT, create_adapter_core
+
+SUPERVISOR_LOG_FORMAT = '%(asctime)s-[%(levelname)8s] %(threadName)s %(name)s::%(module)s|%(lineno)s:: %(message)s'
+
+
+class SharedResources:
+    """
+    Resources shared by all adapter instances in one process. Created lazily, so instances
+    whose handler does not need a resource do not pay for it.
+
+    Attributes:
+        pool_maxsize (int): Maximum number of pooled HTTP connections per host
+    """
+
+    def __init__(self, pool_maxsize: int = 10):
+        self.pool_maxsize = pool_maxsize
+        self._http_adapter = None
+        self._lock = threading.Lock()
+
+    def http_session(self):
+        """
+        A new `requests.Session` for one instance. Sessions are not shared, since `requests.Session`
+        is not documented to be thread-safe; only their `HTTPAdapter`, whose urllib3 connection pools
+        are, is shared by all instances. Do not close the session, that closes the shared pools.
+
+        Returns:
+            requests.Session
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        with self._lock:
+            if self._http_adapter is None:
+                self._http_adapter = HTTPAdapter(pool_connections=self.pool_maxsize, pool_maxsize=self.pool_maxsize)
+        session = requests.Session()
+        session.mount('http://', self._http_adapter)
+        session.mount('https://', self._http_adapter)
+        return session
+
+
+class Supervisor:
+    """
+    Hosts several independent adapter instances in one process. Every instance has its own
+    `AdapterCore`, `BrokerConnection` and handler, and its broker loop blocks its own thread, so
+    there is one thread per instance. The instances share HTTP connection pools and one logging
+    pipeline.
+
+    Attributes:
+        instances ({str: AdapterCore}): The adapter instances by name
+        shared_resources (SharedResources): Resources shared by the handlers of all instances
+        health_interval (float): Seconds between two health reports
+        health_file (str): Optional file to which every health report is written as JSON
+    """
+
+    def __init__(self, health_interval: float = 30.0, health_file: str = None):
+        self.instances = {}
+        self.shared_resources = SharedResources()
+        self.health_interval = health_interval
+        self.health_file = health_file
+
+        self._executor = None
+        self._futures = {}
+        self._stopped = threading.Event()
+
+    @classmethod
+    def from_config(cls, path: str, **kwargs):
+        """
+        Create a supervisor from a JSON config file of the form:
+
+            {
+              "url": "wss://...",                 (default for all instances)
+              "handler": "matrix",                (default for all instances)
+              "instances": [
+                {"name": "Matrix@run1", "token": "...",
+                 "configuration": {"endpoint": "http://localhost:8008", "docker_container": "synapse1"}},
+                ...
+              ]
+            }
+
+        The `configuration` values replace the defaults the handler announces to AMP.
+
+        Args:
+            path (str): Path of the config file
+        Returns:
+            Supervisor
+        """
+        with open(path) as file:
+            return cls.from_dict(json.load(file), **kwargs)
+
+    @classmethod
+    def from_dict(cls, config: dict, **kwargs):
+        """
+        Create a supervisor from an already parsed config, see `from_config`.
+
+        Args:
+            config (dict)
+        Returns:
+            Supervisor
+        """
+        supervisor = cls(**kwargs)
+        for instance in config['instances']:
+            supervisor.add_instance(
+                name=instance['name'],
+                url=instance.get('url', config.get('url')),
+                token=instance['token'],
+                handler_name=instance.get('handler', config.get('handler', DEFAULT_HANDLER)),
+                configuration=instance.get('configuration'),
+                broker_options={key: instance.get(key, config.get(key))
+                                for key in ('ping_interval', 'ping_timeout', 'compress_threshold')
+                                if key in instance or key in config},
+                keep_sut_warm=instance.get('keep_sut_warm', config.get('keep_sut_warm', 0.0)))
+        return supervisor
+
+    def add_instance(self, name: str, url: str, token: str, handler_name: str = DEFAULT_HANDLER,
+                     configuration: dict = None, broker_options: dict = None, **core_options) -> AdapterCore:
+        """
+        Add an adapter instance.
+
+        Args:
+            name (str): Name of the adapter as shown in AMP; must be unique
+            url (str): Url of the Axini Modeling Platform
+            token (str): Token needed to authenticate with the Axini Modeling Platform
+            handler_name (str): Name of the handler in the handler registry
+            configuration (dict): Configuration item values replacing the handler's defaults
+            broker_options (dict): Keyword arguments for `BrokerConnection`, e.g. `ping_interval`
+            core_options: Keyword arguments for `AdapterCore`, e.g. `keep_sut_warm`
+        Returns:
+            AdapterCore: The adapter core of the new instance
+        """
+        if name in self.instances:
+            raise ValueError('An adapter instance named {name} already exists'.format(name=name))
+
+        adapter_core = create_adapter_core(name, url, token, handler_name, broker_options, **core_options)
+        adapter_core.handler.shared_resources = self.shared_resources
+
+        overrides = dict(configuration or {})
+        for item in adapter_core.handler.get_configuration().items:
+            if item.name in overrides:
+                item.value = overrides.pop(item.name)
+        if overrides:
+            adapter_core.close()
+            raise ValueError('Unknown configuration items for {name}: {keys}'.format(name=name, keys=list(overrides)))
+
+        self.instances[name] = adapter_core
+        return adapter_core
+
+    def start(self):
+        """
+        Connect all instances to AMP, each on its own thread. The executor has a worker per instance,
+        since `AdapterCore.start` only returns when the instance stops; it is used for the futures,
+        which tell whether an instance died.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=len(self.instances), thread_name_prefix='adapter')
+        for name, adapter_core in self.instances.items():
+            logging.info('Starting adapter instance {name}'.format(name=name))
+            self._futures[name] = self._executor.submit(self._run_instance, adapter_core)
+
+    def wait(self, timeout: float = None) -> list:
+        """
+        Wait until an instance has stopped, e.g. because its broker loop raised, or the timeout passed.
+
+        Args:
+            timeout (float): Seconds to wait at most; None waits until an instance stopped
+        Returns:
+            [str]: Names of the instances that have stopped
+        """
+        wait(self._futures.values(), timeout, return_when=FIRST_COMPLETED)
+        return [name for name, future in self._futures.items() if future.done()]
+
+    def run_forever(self):
+        """ Start all instances and report their health every `health_interval` seconds. """
+        self.start()
+        while not self._stopped.wait(self.health_interval):
+            self.report_health()
+
+    def stop(self):
+        """ Stop reporting health. The instances keep their connections until the process exits. """
+        self._stopped.set()
+
+    def health(self) -> dict:
+        """
+        Health status of every instance.
+
+        Returns:
+            dict: Instance name -> `AdapterCore.health()` plus whether its broker loop is running
+        """
+        health = {}
+        for name, adapter_core in self.instances.items():
+            future = self._futures.get(name)
+            status = adapter_core.health()
+            status['running'] = bool(future) and not future.done()
+            if future and future.done() and future.exception():
+                status['exception'] = repr(future.exception())
+            health[name] = status
+        return health
+
+    def report_health(self):
+        """ Log a one-line health summary per instance and write the full report to `health_file`. """
+        health = self.health()
+        for name, status in health.items():
+            histograms = status['metrics']['histograms']
+            logging.info('Health {name}: running={running} state={state} received={received} errors={errors} '
+                         'stimulus p99={stimulus:.4f}s rtt p99={rtt:.4f}s'.format(
+                name=name, running=status['running'], state=status['state'],
+                received=status['metrics']['counters'].get('messages_received', 0),
+                errors=status['metrics']['counters'].get('errors', 0),
+                stimulus=histograms.get('stimulus_latency', {}).get('p99', 0.0),
+                rtt=histograms.get('broker_rtt', {}).get('p99', 0.0)))
+
+        if self.health_file:
+            with open(self.health_file, 'w') as file:
+                json.dump({'time': time.time(), 'instances': health}, file, indent=2)
+
+    @staticmethod
+    def _run_instance(adapter_core: AdapterCore):
+        threading.current_thread().name = adapter_core.name
+        adapter_core.start()
+
+
+def configure_logging(loglevel: int, filename: str = 'output.txt') -> logging.handlers.QueueListener:
+    """
+    Route the log records of all instances through one queue to a single file writer thread, so
+    adapter threads never block on file I/O. Records include the thread name, which starts with
+    the instance name.
+
+    Args:
+        loglevel (int): Loglevel constant
+        filename (str): Log file
+    Returns:
+        logging.handlers.QueueListener: The started listener; stop it to flush the queue
+    """
+    log_queue = queue.SimpleQueue()
+
+    file_handler = logging.FileHandler(filename, mode='a')
+    file_handler.setFormatter(logging.Formatter(SUPERVISOR_LOG_FORMAT, datefmt=LOG_DATE_FORMAT))
+
+    root = logging.getLogger()
+    root.setLevel(loglevel)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def start_supervisor(config_path: str, loglevel: int, health_interval: float = 30.0, health_file: str = None):
+    """
+    Start all adapter instances of the given config file in this process.
+
+    Args:
+        config_path (str): Path of the JSON config file, see `Supervisor.from_config`
+        loglevel (int): Loglevel constant
+        health_interval (float): Seconds between two health reports
+        health_file (str): Optional file to which the health reports are written as JSON
+    """
+    listener = configure_logging(loglevel)
+    supervisor = Supervisor.from_config(config_path, health_interval=health_interval, health_file=health_file)
+    try:
+        supervisor.run_forever()
+    finally:
+        listener.stop()
@@ -1,5 +1,7 @@
+import pytest
+
 from adapter.generic.api import configuration_pb2
-from adapter.generic.api.configuration import ConfigurationItem
+from adapter.generic.api.configuration import Configuration, ConfigurationItem
 from adapter.generic.api.type import Type
 
 
@@ -20,3 +22,53 @@ def test_pb_configuration_iteam_can_be_decoded():
     pb_item = configuration_pb2.Configuration.Item(key='config_item', description='some desc', string='some val')
 
     assert ConfigurationItem.decode(pb_item) == ConfigurationItem('config_item', Type.STRING, 'some desc', 'some val')
+
+
+def _configuration(endpoint='ws://localhost:3001', timeout=5.0):
+    return Configuration([ConfigurationItem('endpoint', Type.STRING, 'SUT url', endpoint),
+                          ConfigurationItem('response_timeout', Type.DECIMAL, 'Seconds', timeout)])
+
+
+def test_configuration_items_can_be_looked_up_by_name():
+    configuration = _configuration()
+
+    assert configuration.item('endpoint').tipe == Type.STRING
+    assert configuration.value('response_timeout') == 5.0
+    with pytest.raises(ValueError):
+        configuration.value('docker_container')
+
+
+def test_configuration_changes_are_the_items_with_a_different_value():
+    configuration = _configuration()
+    extended = Configuration(_configuration().items + [ConfigurationItem('debug', Type.BOOLEAN, 'Debug', True)])
+
+    assert configuration.changes(_configuration()) == set()
+    assert configuration.changes(_configuration(endpoint='ws://other:3001')) == {'endpoint'}
+    assert configuration.changes(extended) == {'debug'}
+
+
+def test_configuration_is_validated_against_the_schema():
+    received = Configuration([ConfigurationItem('response_timeout', Type.INTEGER, 'Seconds', 2)])
+
+    validated = received.validate(_configuration())
+
+    assert [(item.name, item.tipe, item.value) for item in validated.items] == [
+        ('endpoint', Type.STRING, 'ws://localhost:3001'), ('response_timeout', Type.DECIMAL, 2.0)]
+
+
+def test_configuration_with_unknown_or_mistyped_items_is_rejected():
+    received = Configuration([ConfigurationItem('endpoint', Type.BOOLEAN, 'SUT url', True),
+                              ConfigurationItem('debug', Type.BOOLEAN, 'Debug', True)])
+
+    with pytest.raises(ValueError, match='unknown item debug, endpoint should be STRING, not BOOLEAN'):
+        received.validate(_configuration())
+
+
+def test_configuration_index_follows_replaced_items():
+    configuration = _configuration()
+    configuration.value('endpoint')
+
+    configuration.items = [ConfigurationItem('debug', Type.BOOLEAN, 'Debug', True)]
+
+    assert 'debug' in configuration
+    assert 'endpoint' not in configuration
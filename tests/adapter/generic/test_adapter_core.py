@@ -0,0 +1,241 @@
+import threading
+import time
+
+import pytest
+
+from adapter.generic.adapter_core import AdapterCore, State
+from adapter.generic.api import message_pb2
+from adapter.generic.api.configuration import Configuration, ConfigurationItem
+from adapter.generic.api.label import Label, Sort
+from adapter.generic.api.type import Type
+from adapter.generic.handler import Handler
+from adapter.generic.reconnect import ReconnectManager
+
+
+class FakeBroker:
+    """ Stand-in for `BrokerConnection`; `connect` returns when the connection is closed, like the real one. """
+
+    def __init__(self, connections=1):
+        self.connections = connections
+        self.connects = 0
+        self.sent = []
+        self.closed = False
+
+    def register_adapter_core(self, adapter_core):
+        self.adapter_core = adapter_core
+
+    def connect(self):
+        self.connects += 1
+        if self.connects >= self.connections:
+            self.adapter_core.stop()
+
+    def send(self, raw_message: bytes):
+        self.sent.append(raw_message)
+
+    def close(self, reason='', code=-1):
+        self.closed = True
+
+
+class RecordingHandler(Handler):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def start(self):
+        self.calls.append('start')
+        self.adapter_core.send_ready()
+
+    def reset(self):
+        self.calls.append('reset')
+        self.adapter_core.send_ready()
+
+    def resume(self):
+        self.calls.append('resume')
+        self.adapter_core.send_ready()
+
+    def stop(self):
+        self.calls.append('stop')
+
+    def stimulate(self, pb_label):
+        self.calls.append('stimulate')
+
+    def supported_labels(self):
+        return []
+
+    def default_configuration(self) -> Configuration:
+        return Configuration([ConfigurationItem('endpoint', Type.STRING, 'SUT url', 'fake://')])
+
+
+@pytest.fixture
+def make_core():
+    cores = []
+
+    def make(connections=1, **options):
+        broker, handler = FakeBroker(connections), RecordingHandler()
+        adapter_core = AdapterCore('Fake@test', broker, handler,
+                                   reconnect_manager=ReconnectManager(initial_delay=0.001, jitter=0.0), **options)
+        broker.register_adapter_core(adapter_core)
+        handler.register_adapter_core(adapter_core)
+        cores.append(adapter_core)
+        return adapter_core
+    yield make
+    for adapter_core in cores:
+        adapter_core.close()
+
+
+def _configure(adapter_core):
+    adapter_core.on_open()
+    adapter_core.on_configuration(adapter_core.handler.default_configuration().encode())
+
+
+def test_start_reconnects_until_stopped(make_core):
+    adapter_core = make_core(connections=3)
+
+    adapter_core.start()
+
+    assert adapter_core.broker_connection.connects == 3
+    assert adapter_core.metrics.snapshot()['counters']['reconnects'] == 2
+    assert adapter_core.state == State.DISCONNECTED
+
+
+def test_sut_is_stopped_when_the_connection_closes_without_keep_warm(make_core):
+    adapter_core = make_core()
+    _configure(adapter_core)
+
+    adapter_core.on_close()
+
+    assert adapter_core.handler.calls == ['start', 'stop']
+
+
+def test_warm_sut_is_resumed_when_amp_reconnects_in_time(make_core):
+    adapter_core = make_core(keep_sut_warm=5.0)
+    _configure(adapter_core)
+
+    adapter_core.on_close()
+    _configure(adapter_core)
+
+    assert adapter_core.handler.calls == ['start', 'resume']
+    assert adapter_core.metrics.snapshot()['counters']['sut_resumes'] == 1
+    assert adapter_core.state == State.READY
+
+
+def test_warm_sut_is_stopped_when_amp_does_not_reconnect_in_time(make_core):
+    adapter_core = make_core(keep_sut_warm=0.05)
+    _configure(adapter_core)
+
+    adapter_core.on_close()
+    assert adapter_core.handler.calls == ['start']
+    time.sleep(0.2)
+
+    assert adapter_core.handler.calls == ['start', 'stop']
+    _configure(adapter_core)
+    assert adapter_core.handler.calls == ['start', 'stop', 'start']
+
+
+def test_warm_sut_timer_that_fired_before_the_reconnect_leaves_the_sut_alone(make_core):
+    adapter_core = make_core(keep_sut_warm=5.0)
+    _configure(adapter_core)
+    adapter_core.on_close()
+    timer = adapter_core._sut_timer
+
+    _configure(adapter_core)  # cancels the timer, too late if it is already running
+    timer.function()
+
+    assert adapter_core.handler.calls == ['start', 'resume']
+    assert adapter_core.state == State.READY
+
+
+class SlowStoppingHandler(RecordingHandler):
+    def __init__(self):
+        super().__init__()
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.calls.append('stopping')
+        self.stopping.set()
+        time.sleep(0.1)
+        self.calls.append('stop')
+
+
+def test_sut_is_started_only_after_the_warm_sut_has_stopped(make_core):
+    adapter_core = make_core(keep_sut_warm=0.01)
+    adapter_core.handler = handler = SlowStoppingHandler()
+    handler.register_adapter_core(adapter_core)
+    _configure(adapter_core)
+
+    adapter_core.on_close()
+    assert handler.stopping.wait(5)
+    _configure(adapter_core)
+
+    assert handler.calls == ['start', 'stopping', 'stop', 'start']
+
+
+class ReconfiguringHandler(RecordingHandler):
+    def __init__(self, in_place=True):
+        super().__init__()
+        self.in_place = in_place
+
+    def reconfigure(self, changed):
+        self.calls.append(('reconfigure', changed))
+        if self.in_place:
+            self.adapter_core.send_ready()
+        return self.in_place
+
+
+def _reconfiguring_core(make_core, in_place=True, **options):
+    adapter_core = make_core(**options)
+    adapter_core.handler = handler = ReconfiguringHandler(in_place)
+    handler.register_adapter_core(adapter_core)
+    _configure(adapter_core)
+    return adapter_core
+
+
+def _other_endpoint():
+    return Configuration([ConfigurationItem('endpoint', Type.STRING, 'SUT url', 'other://')]).encode()
+
+
+def test_new_configuration_while_ready_is_applied_in_place(make_core):
+    adapter_core = _reconfiguring_core(make_core)
+
+    adapter_core.on_configuration(_other_endpoint())
+
+    assert adapter_core.handler.calls == ['start', ('reconfigure', {'endpoint'})]
+    assert adapter_core.handler.configuration.value('endpoint') == 'other://'
+    assert adapter_core.metrics.snapshot()['counters']['sut_reconfigures'] == 1
+    assert adapter_core.state == State.READY
+
+
+def test_sut_is_restarted_when_the_handler_cannot_reconfigure_in_place(make_core):
+    adapter_core = _reconfiguring_core(make_core, in_place=False)
+
+    adapter_core.on_configuration(_other_endpoint())
+
+    assert adapter_core.handler.calls == ['start', ('reconfigure', {'endpoint'}), 'stop', 'start']
+    assert 'sut_reconfigures' not in adapter_core.metrics.snapshot()['counters']
+    assert adapter_core.state == State.READY
+
+
+def test_warm_sut_is_reconfigured_when_amp_reconnects_with_another_configuration(make_core):
+    adapter_core = _reconfiguring_core(make_core, keep_sut_warm=5.0)
+
+    adapter_core.on_close()
+    adapter_core.on_open()
+    adapter_core.on_configuration(_other_endpoint())
+
+    assert adapter_core.handler.calls == ['start', ('reconfigure', {'endpoint'})]
+    assert adapter_core.metrics.snapshot()['counters']['sut_reconfigures'] == 1
+    assert adapter_core._sut_timer is None
+
+
+def test_malformed_frames_are_dropped_without_closing_the_connection(make_core):
+    adapter_core = make_core()
+    _configure(adapter_core)
+    stimulus = message_pb2.Message(label=Label(Sort.STIMULUS, 'open', 'door').encode()).SerializeToString()
+
+    adapter_core._handle_message(memoryview(b'\x0a\xff'))  # a label field longer than the frame
+    adapter_core._handle_message(memoryview(stimulus))
+
+    assert adapter_core.metrics.snapshot()['counters']['malformed_messages'] == 1
+    assert not adapter_core.broker_connection.closed
+    assert adapter_core.state == State.READY
+    assert adapter_core.handler.calls == ['start', 'stimulate']
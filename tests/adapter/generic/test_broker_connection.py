@@ -0,0 +1,62 @@
+import threading
+import time
+
+from types import SimpleNamespace
+
+from adapter.generic.broker_connection import BrokerConnection
+from adapter.generic.metrics import Metrics
+
+
+class FakeSocket:
+    """ Stand-in for `websocket.WebSocket`; answers pings with a pong if `answer` is set. """
+
+    def __init__(self, connection, answer=True):
+        self.connection = connection
+        self.answer = answer
+        self.pings = 0
+        self.aborted = threading.Event()
+
+    def ping(self, payload):
+        self.pings += 1
+        if self.answer:
+            self.connection.on_pong(payload.encode())
+
+    def abort(self):
+        self.aborted.set()
+
+
+def _heartbeat(answer):
+    connection = BrokerConnection('ws://localhost:1', 'token', ping_interval=0.01, ping_timeout=0.03)
+    connection.register_adapter_core(SimpleNamespace(metrics=Metrics(), on_close=lambda: None))
+    connection.websocket = SimpleNamespace(keep_running=True, sock=None)
+    connection.websocket.sock = FakeSocket(connection, answer)
+    connection._start_heartbeat()
+    return connection
+
+
+def test_heartbeat_measures_the_round_trip_time():
+    connection = _heartbeat(answer=True)
+    time.sleep(0.1)
+    connection.on_close(1000, 'done')
+
+    histograms = connection.adapter_core.metrics.snapshot()['histograms']
+    assert histograms['broker_rtt']['count'] >= 3
+    assert not connection.websocket.sock.aborted.is_set()
+    assert connection.websocket.keep_running
+
+
+def test_connection_without_pongs_is_aborted():
+    connection = _heartbeat(answer=False)
+
+    assert connection.websocket.sock.aborted.wait(1)
+    assert not connection.websocket.keep_running
+    assert connection.adapter_core.metrics.snapshot()['counters']['heartbeat_timeouts'] == 1
+
+
+def test_pongs_without_a_timestamp_are_ignored():
+    connection = _heartbeat(answer=False)
+    connection._heartbeat_stopped.set()
+
+    connection.on_pong(b'keepalive')
+
+    assert 'broker_rtt' not in connection.adapter_core.metrics.snapshot()['histograms']
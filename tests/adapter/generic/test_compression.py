@@ -0,0 +1,81 @@
+import io
+import socket
+
+import websocket
+
+from adapter.generic.compression import WEBSOCKET_CLIENT_VERSION, PerMessageDeflate, InflatingFrameBuffer
+
+
+def _server_frame(payload: bytes, opcode: int, fin: int = 1, rsv1: int = 0) -> bytes:
+    """ An unmasked frame as sent by the server. """
+    return bytes([fin << 7 | rsv1 << 6 | opcode, len(payload)]) + payload
+
+
+def test_compress_decompress_round_trip():
+    compression = PerMessageDeflate()
+    payload = b'label' * 1000
+
+    compressed = compression.compress(payload)
+
+    assert len(compressed) < len(payload)
+    assert compression.decompress(compressed) == payload
+
+
+def test_only_messages_from_the_threshold_are_compressed():
+    compression = PerMessageDeflate(threshold=100)
+    compression.enabled = True
+
+    assert compression.frame(b'x' * 99).rsv1 == 0
+    assert compression.frame(b'x' * 100).rsv1 == 1
+
+
+def test_nothing_is_compressed_if_the_server_declines():
+    compression = PerMessageDeflate(threshold=0)
+
+    assert not compression.negotiate({'upgrade': 'websocket'})
+    assert compression.frame(b'x' * 100).rsv1 == 0
+
+
+def test_negotiate_accepts_extension_with_parameters():
+    compression = PerMessageDeflate()
+
+    assert compression.negotiate({'sec-websocket-extensions': 'permessage-deflate; server_no_context_takeover'})
+
+
+def test_inflating_frame_buffer_decompresses_fragmented_messages():
+    compression = PerMessageDeflate()
+    payload = compression.compress(b'announcement' * 20)
+    stream = io.BytesIO(
+        _server_frame(payload[:10], websocket.ABNF.OPCODE_BINARY, fin=0, rsv1=1)
+        + _server_frame(b'ping', websocket.ABNF.OPCODE_PING)
+        + _server_frame(payload[10:], websocket.ABNF.OPCODE_CONT)
+        + _server_frame(b'plain', websocket.ABNF.OPCODE_BINARY))
+    frames = InflatingFrameBuffer(stream.read, skip_utf8_validation=True)
+
+    first, ping, last, plain = [frames.recv_frame() for _ in range(4)]
+
+    assert first.rsv1 == 0
+    assert ping.data == b'ping'
+    assert first.data + last.data == b'announcement' * 20
+    assert plain.data == b'plain'
+
+
+def test_websocket_client_is_the_version_the_frame_buffer_extends():
+    # InflatingFrameBuffer depends on the internals of this version; check them before changing the pin
+    assert websocket.__version__ == WEBSOCKET_CLIENT_VERSION
+
+
+def test_installed_frame_buffer_decompresses_messages_of_a_socket():
+    compression = PerMessageDeflate()
+    payload = compression.compress(b'announcement' * 20)
+    client, server = socket.socketpair()
+    ws = websocket.WebSocket(skip_utf8_validation=True)
+    ws.sock, ws.connected = client, True
+    try:
+        compression.install(ws)
+        server.sendall(_server_frame(payload, websocket.ABNF.OPCODE_BINARY, rsv1=1))
+
+        assert ws.recv() == b'announcement' * 20
+    finally:
+        client.close()
+        server.close()
@@ -0,0 +1,52 @@
+import time
+
+from adapter.generic.correlation import Correlator
+from adapter.generic.metrics import Metrics
+
+
+def test_responses_are_attributed_to_stimuli_in_order():
+    metrics = Metrics()
+    correlator = Correlator(metrics, timeout=5.0)
+    try:
+        correlator.track('LOCK', 11)
+        correlator.track('OPEN', 12)
+
+        assert correlator.match() == 11
+        assert correlator.match() == 12
+        assert correlator.match() == 0
+
+        snapshot = metrics.snapshot()
+        assert snapshot['histograms']['round_trip_lock']['count'] == 1
+        assert snapshot['histograms']['round_trip_open']['count'] == 1
+        assert snapshot['counters'] == {'unsolicited_responses': 1}
+        assert snapshot['gauges']['outstanding_stimuli'] == 0
+    finally:
+        correlator.stop()
+
+
+def test_missing_response_is_a_timeout_and_a_late_one_is_still_attributed():
+    metrics = Metrics()
+    timed_out = []
+    correlator = Correlator(metrics, timeout=0.05, on_timeout=timed_out.append)
+    try:
+        correlator.track('UNLOCK', 7)
+        time.sleep(0.08)
+        assert [stimulus.correlation_id for stimulus in timed_out] == [7]
+
+        assert correlator.match() == 7
+        assert metrics.snapshot()['counters'] == {'response_timeouts': 1, 'late_responses': 1}
+    finally:
+        correlator.stop()
+
+
+def test_unanswered_stimuli_are_forgotten_after_the_grace_period():
+    metrics = Metrics()
+    correlator = Correlator(metrics, timeout=0.02)
+    try:
+        correlator.track('CLOSE', 3)
+        time.sleep(0.1)
+
+        assert correlator.match() == 0
+        assert metrics.snapshot()['counters'] == {'response_timeouts': 1, 'unsolicited_responses': 1}
+    finally:
+        correlator.stop()
@@ -0,0 +1,51 @@
+import sys
+
+import pytest
+
+from adapter.generic.handler_registry import HandlerRegistry
+
+
+@pytest.fixture
+def handler_module(tmp_path, monkeypatch):
+    (tmp_path / 'lazy_test_handler.py').write_text(
+        'class LazyHandler:\n'
+        '    pass\n'
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield 'lazy_test_handler'
+    sys.modules.pop('lazy_test_handler', None)
+
+
+def test_registered_handlers_are_listed_by_name():
+    registry = HandlerRegistry({'b': 'mod:B', 'a': 'mod:A'}, entry_point_group=None)
+
+    assert registry.names() == ['a', 'b']
+
+
+def test_handler_module_is_imported_only_when_loaded(handler_module):
+    registry = HandlerRegistry({'lazy': handler_module + ':LazyHandler'}, entry_point_group=None)
+
+    assert handler_module not in sys.modules
+
+    handler = registry.create('lazy')
+
+    assert handler_module in sys.modules
+    assert type(handler).__name__ == 'LazyHandler'
+    assert registry.load('lazy') is type(handler)
+
+
+def test_handler_classes_can_be_registered_directly():
+    class SomeHandler:
+        pass
+
+    registry = HandlerRegistry({}, entry_point_group=None)
+    registry.register('some', SomeHandler)
+
+    assert isinstance(registry.create('some'), SomeHandler)
+
+
+def test_unknown_handler_is_rejected():
+    registry = HandlerRegistry({}, entry_point_group=None)
+
+    with pytest.raises(ValueError):
+        registry.load('unknown')
@@ -0,0 +1,44 @@
+import sys
+
+import pytest
+
+from adapter.generic.lazy_import import ImportTimer, LazyModule, lazy_import
+
+
+@pytest.fixture
+def module_dir(tmp_path, monkeypatch):
+    (tmp_path / 'lazy_example.py').write_text('import lazy_example_dependency\nVALUE = 42\n')
+    (tmp_path / 'lazy_example_dependency.py').write_text('')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield tmp_path
+    for name in ('lazy_example', 'lazy_example_dependency'):
+        sys.modules.pop(name, None)
+
+
+def test_module_is_imported_on_first_use(module_dir):
+    module = lazy_import('lazy_example')
+
+    assert isinstance(module, LazyModule)
+    assert 'lazy_example' not in sys.modules
+    assert module.VALUE == 42
+    assert 'lazy_example' in sys.modules
+
+
+def test_imported_module_is_returned_as_is():
+    assert lazy_import('.lazy_import', 'adapter.generic') is sys.modules['adapter.generic.lazy_import']
+
+
+def test_timer_records_nested_imports(module_dir):
+    timer = ImportTimer()
+    timer.install()
+    try:
+        import lazy_example  # noqa: F401
+    finally:
+        timer.uninstall()
+
+    names = [name for name, _, _, _ in timer.records]
+    assert names == ['lazy_example_dependency', 'lazy_example']
+    (_, _, nested, depth), (_, own, cumulative, _) = timer.records
+    assert depth == 1
+    assert cumulative == pytest.approx(own + nested)
+    assert timer.report().splitlines()[-1].startswith('2 modules imported so far')
@@ -0,0 +1,41 @@
+from adapter.generic.metrics import Histogram, Metrics
+
+
+def test_counters_are_incremented():
+    metrics = Metrics()
+    metrics.increment('stimuli')
+    metrics.increment('stimuli', 2)
+
+    assert metrics.snapshot()['counters'] == {'stimuli': 3}
+
+
+def test_gauges_keep_the_last_value():
+    metrics = Metrics()
+
+    metrics.set_gauge('backlog', 3)
+    metrics.set_gauge('backlog', 1)
+
+    assert metrics.snapshot()['gauges'] == {'backlog': 1}
+
+
+def test_histogram_reports_percentiles():
+    histogram = Histogram()
+    for value in range(1, 1001):
+        histogram.observe(value / 1000)
+
+    snapshot = histogram.snapshot()
+
+    assert snapshot['count'] == 1000
+    assert snapshot['p50'] == 0.501
+    assert snapshot['p99'] == 0.991
+    assert snapshot['max'] == 1.0
+
+
+def test_histogram_memory_is_bounded_by_its_window():
+    histogram = Histogram(window=10)
+    for value in range(100):
+        histogram.observe(value)
+
+    assert len(histogram.samples) == 10
+    assert histogram.count == 100
+    assert histogram.percentile(0.0) == 90
@@ -0,0 +1,47 @@
+import threading
+import time
+
+from adapter.generic.profiler import SamplingProfiler
+
+
+def _busy_worker(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler_samples_named_threads_into_collapsed_stacks(tmp_path):
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_worker, args=(stop,), name='qthread_to_amp')
+    profiler = SamplingProfiler(interval=0.001, output=str(tmp_path / 'profile.collapsed'))
+
+    worker.start()
+    profiler.start()
+    time.sleep(0.05)
+    profiler.stop()
+    stop.set()
+    worker.join()
+
+    lines = (tmp_path / 'profile.collapsed').read_text().splitlines()
+
+    assert profiler.sample_count > 0
+    assert any(line.startswith('qthread_to_amp;') and '_busy_worker' in line for line in lines)
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+
+def test_wrapped_method_is_only_profiled_on_request(tmp_path):
+    class Core:
+        def _handle_message(self, message):
+            return message * 2
+
+    core = Core()
+    profiler = SamplingProfiler(output=str(tmp_path / 'profile.collapsed'))
+    profiler.wrap(core, '_handle_message')
+
+    assert core._handle_message(1) == 2
+    assert not list(tmp_path.glob('*.pstats'))
+
+    profiler.request_cprofile(calls=2)
+    for i in range(3):
+        assert core._handle_message(i) == i * 2
+
+    assert len(list(tmp_path.glob('*.pstats'))) == 2
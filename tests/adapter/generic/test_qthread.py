@@ -0,0 +1,14 @@
+from adapter.generic.qthread import QThread
+
+
+def test_stop_processes_the_queued_items_and_ends_the_worker():
+    processed = []
+    qthread = QThread(process_item=processed.append, name='test_qthread')
+    qthread.start()
+
+    for item in range(3):
+        qthread.put(item)
+    qthread.stop()
+
+    assert processed == [0, 1, 2]
+    assert not qthread.thread.is_alive()
@@ -0,0 +1,44 @@
+import pytest
+
+from adapter.generic.reconnect import ReconnectManager
+
+
+def test_delay_grows_exponentially_up_to_the_maximum():
+    manager = ReconnectManager(initial_delay=1.0, max_delay=10.0, multiplier=2.0, jitter=0.0)
+
+    assert [manager.next_delay() for _ in range(6)] == [1.0, 2.0, 4.0, 8.0, 10.0, 10.0]
+
+
+def test_jitter_only_shortens_the_delay():
+    manager = ReconnectManager(initial_delay=4.0, multiplier=1.0, jitter=0.5)
+
+    delays = [manager.next_delay() for _ in range(100)]
+
+    assert all(2.0 <= delay <= 4.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_stable_connection_resets_the_backoff():
+    manager = ReconnectManager(initial_delay=1.0, jitter=0.0, reset_after=0.0)
+    manager.next_delay()
+    manager.next_delay()
+
+    manager.connected()
+    manager.disconnected()
+
+    assert manager.next_delay() == 1.0
+
+
+def test_short_connection_keeps_the_backoff():
+    manager = ReconnectManager(initial_delay=1.0, jitter=0.0, reset_after=60.0)
+    manager.next_delay()
+
+    manager.connected()
+    manager.disconnected()
+
+    assert manager.next_delay() == 2.0
+
+
+def test_jitter_must_be_a_fraction():
+    with pytest.raises(ValueError):
+        ReconnectManager(jitter=1.5)
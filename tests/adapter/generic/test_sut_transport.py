@@ -0,0 +1,45 @@
+import websocket
+
+from adapter.generic.metrics import Metrics
+from adapter.generic.sut_transport import CONNECTED, DISCONNECTED, WebSocketTransport
+
+
+class FakeApp:
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    def send(self, message):
+        if self.closed:
+            raise websocket.WebSocketConnectionClosedException('closed')
+        self.sent.append(message)
+
+
+def test_messages_are_buffered_while_disconnected_and_the_oldest_dropped_when_full():
+    metrics = Metrics()
+    transport = WebSocketTransport('ws://localhost:0', on_message=None, metrics=metrics, buffer_size=2)
+
+    for message in ('OPEN', 'CLOSE', 'LOCK:1234'):
+        transport.send(message)
+
+    assert list(transport.buffer) == ['CLOSE', 'LOCK:1234']
+    assert metrics.snapshot()['counters'] == {'sut_buffered_sends': 3, 'sut_dropped_sends': 1}
+
+
+def test_buffer_is_replayed_in_order_on_reconnect():
+    states, opened = [], []
+    transport = WebSocketTransport('ws://localhost:0', on_message=None, on_open=opened.append, on_state=states.append)
+    transport.app = FakeApp()
+    transport._on_open()
+    transport.app.closed = True
+
+    transport.send('OPEN')  # the connection dropped: buffered
+    transport._on_close()
+    transport.send('CLOSE')
+    transport.app = FakeApp()
+    transport._on_open()
+
+    assert transport.app.sent == ['OPEN', 'CLOSE']
+    assert opened == [False, True]
+    assert states == [CONNECTED, DISCONNECTED, CONNECTED]
+    assert transport.wait_until_connected(0)
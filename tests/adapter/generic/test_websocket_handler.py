@@ -0,0 +1,116 @@
+import pytest
+
+from adapter.generic.api import label_pb2
+from adapter.generic.api.label import Label, Sort
+from adapter.generic.api.parameter import Parameter
+from adapter.generic.api.type import Type
+from adapter.generic.correlation import Correlator
+from adapter.generic.metrics import Metrics
+from adapter.generic.websocket_handler import WebSocketHandler, response, stimulus
+
+
+class DoorHandler(WebSocketHandler):
+    CHANNEL = 'door'
+    LABELS = [
+        stimulus('open'),
+        stimulus('reset'),
+        stimulus('lock', passcode=Type.INTEGER),
+        stimulus('change_code', old=Type.INTEGER, new=Type.INTEGER),
+        response('opened'),
+        response('code_changed', old=Type.INTEGER, new=Type.STRING),
+    ]
+
+
+class FakeAdapterCore:
+    def __init__(self):
+        self.metrics = Metrics()
+        self.sent = []
+
+    def send_stimulus_confirmation(self, pb_label):
+        pass
+
+    def send_ready(self):
+        self.sent.append('ready')
+
+    def send_response(self, label):
+        self.sent.append((label.name, label.correlation_id))
+
+
+class FakeTransport:
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+def _handler():
+    handler = DoorHandler()
+    handler.register_adapter_core(FakeAdapterCore())
+    return handler
+
+
+def test_stimuli_are_formatted_by_their_spec():
+    handler = _handler()
+    lock = Label(Sort.STIMULUS, 'lock', 'door', parameters=[Parameter('passcode', Type.INTEGER, 1234)]).encode()
+
+    assert handler._label2message(label_pb2.Label(label='open', channel='door')) == 'OPEN'
+    assert handler._label2message(lock) == 'LOCK:1234'
+    with pytest.raises(ValueError):
+        handler._label2message(label_pb2.Label(label='kick', channel='door'))
+
+
+def test_stimulus_parameters_are_formatted_in_the_order_of_the_spec():
+    handler = _handler()
+    change = Label(Sort.STIMULUS, 'change_code', 'door', parameters=[
+        Parameter('new', Type.INTEGER, 5678), Parameter('old', Type.INTEGER, 1234)]).encode()
+    incomplete = Label(Sort.STIMULUS, 'change_code', 'door', parameters=[Parameter('new', Type.INTEGER, 5678)]).encode()
+
+    assert handler._label2message(change) == 'CHANGE_CODE:1234:5678'
+    with pytest.raises(ValueError, match='misses parameters old'):
+        handler._label2message(incomplete)
+
+
+def test_messages_are_parsed_into_responses():
+    handler = _handler()
+
+    opened = handler._message2label('OPENED')
+    changed = handler._message2label('CODE_CHANGED:1234:ab:cd')
+    unknown = handler._message2label('SHUT_OFF')
+
+    assert (opened.name, opened.parameters) == ('opened', [])
+    assert changed.name == 'code_changed'
+    assert [(p.name, p.value) for p in changed.parameters] == [('old', 1234), ('new', 'ab:cd')]
+    assert unknown.name == 'shut_off'
+    assert handler.adapter_core.metrics.snapshot()['counters'] == {'unknown_responses': 1}
+
+
+def test_supported_labels_follow_the_table():
+    labels = _handler().supported_labels()
+
+    assert [(label.sort, label.name) for label in labels] == [
+        (Sort.STIMULUS, 'open'), (Sort.STIMULUS, 'reset'), (Sort.STIMULUS, 'lock'), (Sort.STIMULUS, 'change_code'),
+        (Sort.RESPONSE, 'opened'), (Sort.RESPONSE, 'code_changed')]
+    assert [p.name for p in labels[2].parameters] == ['passcode']
+
+
+def test_only_the_connection_settings_are_reconfigured_in_place():
+    handler = _handler()
+
+    assert not handler.reconfigure({'endpoint', 'passcode'})
+
+
+def test_reset_stimulus_is_not_correlated_with_a_response():
+    handler = _handler()
+    handler.transport, handler.correlator = FakeTransport(), Correlator(handler.adapter_core.metrics)
+
+    try:
+        handler.stimulate(label_pb2.Label(label='reset', channel='door', correlation_id=1))
+        handler.send_message_to_amp('RESET_PERFORMED')
+        handler.stimulate(label_pb2.Label(label='open', channel='door', correlation_id=2))
+        handler.send_message_to_amp('OPENED')
+    finally:
+        handler.correlator.stop()
+
+    assert handler.transport.messages == ['RESET', 'OPEN']
+    assert handler.adapter_core.sent == ['ready', ('opened', 2)]
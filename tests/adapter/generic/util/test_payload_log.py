@@ -0,0 +1,27 @@
+import logging
+
+from adapter.generic.util.payload_log import PayloadLogger, hexdump
+
+
+def test_hexdump_truncates_large_payloads():
+    assert hexdump(b'\x0a\x02\x08\x01') == '0a 02 08 01'
+    assert hexdump(memoryview(b'\x00' * 1000), max_bytes=2) == '00 00 ...'
+
+
+def test_only_sampled_payloads_are_logged(caplog):
+    payload_log = PayloadLogger(sample_every=3, max_bytes=4)
+
+    with caplog.at_level(logging.DEBUG):
+        for _ in range(7):
+            payload_log.log('Received a message', b'\x01' * 100)
+
+    assert [record.getMessage() for record in caplog.records] == ['Received a message (100 bytes): 01 01 01 01 ...'] * 3
+
+
+def test_nothing_is_logged_above_debug_level(caplog):
+    payload_log = PayloadLogger(sample_every=1)
+
+    with caplog.at_level(logging.INFO):
+        payload_log.log('Received a message', b'\x01')
+
+    assert not caplog.records
@@ -0,0 +1,123 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from adapter.generic.api.label import Label, Sort
+from adapter.generic.api.parameter import Parameter
+from adapter.generic.api.type import Type
+from adapter.generic.metrics import Metrics
+from adapter.matrix.async_connection import AsyncMatrixConnection
+from adapter.matrix.matrix_connection import MatrixConnection
+from adapter.matrix.matrix_handler import MatrixHandler
+
+
+class ScriptedConnection(AsyncMatrixConnection):
+    """ Performs stimuli by recording them instead of sending requests; `blocked` stimuli wait for `release`. """
+
+    def __init__(self):
+        super().__init__('http://localhost:8008', 'synapse', http=object())
+        self.performed = []
+        self.blocked = {}
+
+    def send(self, label, params):
+        if label in self.blocked:
+            assert self.blocked[label].wait(5)
+        if label == 'FAIL_HARD':
+            raise RuntimeError('connection reset')
+        self.performed.append((params['username'], label))
+        return 'SUCCESS', {}
+
+
+@pytest.fixture
+def connection():
+    connection = ScriptedConnection()
+    yield connection
+    connection.stop()
+
+
+def test_stimuli_of_one_user_stay_in_order_while_other_users_go_ahead(connection):
+    connection.blocked['JOIN_ROOM'] = threading.Event()
+
+    first = connection.submit('JOIN_ROOM', {'username': 'one'})
+    second = connection.submit('SEND_MESSAGE', {'username': 'one'})
+    other = connection.submit('SEND_MESSAGE', {'username': 'two'})
+
+    assert other.result(5) == ('SUCCESS', {})
+    assert not first.done() and not second.done()
+    connection.blocked['JOIN_ROOM'].set()
+    connection.drain()
+
+    assert connection.performed == [('two', 'SEND_MESSAGE'), ('one', 'JOIN_ROOM'), ('one', 'SEND_MESSAGE')]
+    assert second.done()
+
+
+def test_failures_reach_the_future_and_drain_goes_on(connection):
+    failed = connection.submit('FAIL_HARD', {'username': 'one'})
+    after = connection.submit('LEAVE_ROOM', {'username': 'one'})
+
+    connection.drain()
+
+    with pytest.raises(RuntimeError, match='connection reset'):
+        failed.result()
+    assert after.result() == ('SUCCESS', {})
+    assert connection._pending == set()
+
+
+def test_logins_are_returned_per_user(connection, monkeypatch):
+    monkeypatch.setattr(connection, 'login_user', lambda username, password: {'user_id': '@' + username})
+
+    assert connection.login_users(['one', 'two']) == {'one': {'user_id': '@one'}, 'two': {'user_id': '@two'}}
+
+
+class RecordingAdapterCore:
+    def __init__(self):
+        self.metrics = Metrics()
+        self.sent = []
+
+    def send_stimulus_confirmation(self, pb_label):
+        pass
+
+    def send_response(self, label):
+        self.sent.append(label.name)
+
+    def send_ready(self):
+        self.sent.append('ready')
+
+
+def test_responses_of_stimuli_pipelined_before_a_reset_are_dropped(connection, monkeypatch):
+    monkeypatch.setattr(MatrixConnection, 'reset', lambda self: None)
+    handler = MatrixHandler()
+    handler.register_adapter_core(RecordingAdapterCore())
+    handler.sut, handler.pipelining = connection, True
+    connection.blocked['JOIN_ROOM'] = threading.Event()
+    def join():
+        return Label(Sort.STIMULUS, 'join_room', 'matrix', parameters=[
+            Parameter('username', Type.STRING, 'one'), Parameter('room_id', Type.STRING, '!room:localhost')]).encode()
+
+    handler.stimulate(join())
+    threading.Timer(0.1, connection.blocked['JOIN_ROOM'].set).start()
+    handler.reset()  # waits for the pipelined stimulus
+    del connection.blocked['JOIN_ROOM']
+    handler.stimulate(join())
+    connection.drain()
+    deadline = time.monotonic() + 5
+    while len(handler.adapter_core.sent) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)  # the response is sent by a callback, just after the future is resolved
+
+    assert connection.performed == [('one', 'JOIN_ROOM'), ('one', 'JOIN_ROOM')]
+    assert handler.adapter_core.sent == ['ready', 'success']
+
+
+def test_matrix_handler_imports_the_async_client_and_sync_stream_only_when_enabled():
+    src = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src')
+    loaded = subprocess.run(
+        [sys.executable, '-c', 'import sys, adapter.matrix.matrix_handler; '
+                               'print(sorted(name for name in sys.modules if name.startswith("adapter.matrix")))'],
+        env=dict(os.environ, PYTHONPATH=os.path.abspath(src)), capture_output=True, text=True, check=True).stdout
+
+    assert 'adapter.matrix.async_connection' not in loaded
+    assert 'adapter.matrix.sync_stream' not in loaded
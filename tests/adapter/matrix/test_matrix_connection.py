@@ -0,0 +1,140 @@
+import os
+import re
+
+import pytest
+import requests
+
+from adapter.matrix import matrix_connection, operations
+from adapter.matrix.matrix_connection import MatrixConnection, TransactionIds
+from adapter.matrix.matrix_handler import MatrixHandler
+
+MODEL = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'model.aml')
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, json=None):
+        self.status_code = status_code
+        self._json = json or {}
+
+    def json(self):
+        return self._json
+
+
+class FakeSession:
+    """ Stand-in for `requests.Session` recording the requests and answering them from a list. """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, method, url, headers=None, json=None, timeout=None):
+        self.requests.append((method, url, json))
+        response = self.responses.pop(0) if self.responses else FakeResponse()
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def _connection(*responses) -> MatrixConnection:
+    connection = MatrixConnection('http://localhost:8008', 'synapse', http=FakeSession(*responses))
+    connection.session_dict = {name: {'access_token': name, 'user_id': '@{name}:localhost'.format(name=name)}
+                               for name in ('one', 'two', 'three')}
+    return connection
+
+
+def _model_labels() -> dict:
+    """ The labels of model.aml: (sort, name) -> parameter names. """
+    with open(MODEL) as model:
+        return {(sort, name): re.findall(r"'(\w+)' =>", parameters or '')
+                for sort, name, parameters in re.findall(r"^\s*(stimulus|response) '(\w+)'(?:, \{(.*)\})?$",
+                                                         model.read(), re.M)}
+
+
+def test_operations_are_keyed_by_their_sut_message():
+    assert all(name == operation.label.upper() for name, operation in operations.OPERATIONS.items())
+    assert [name for name, operation in operations.OPERATIONS.items() if operation.idempotent] == ['SEND_MESSAGE']
+
+
+def test_supported_labels_match_the_model():
+    labels = {(label.sort.name.lower(), label.name): [p.name for p in label.parameters]
+              for label in MatrixHandler().supported_labels()}
+
+    model = _model_labels()
+
+    assert len(model) == 9
+    for label, parameters in model.items():
+        assert labels.get(label) is not None and sorted(labels[label]) == sorted(parameters), label
+    assert {name.lower() for name in operations.OPERATIONS} == {name for sort, name in model if sort == 'stimulus'}
+
+
+def test_stimuli_are_routed_to_their_request():
+    connection = _connection()
+
+    connection.send('JOIN_ROOM', {'username': 'one', 'room_id': '!abc:localhost'})
+    connection.send('BAN_USER', {'username': 'one', 'user_id': 'two', 'room_id': '!abc:localhost'})
+
+    assert connection.http.requests == [
+        ('POST', 'http://localhost:8008/_matrix/client/v3/join/%21abc%3Alocalhost', None),
+        ('POST', 'http://localhost:8008/_matrix/client/v3/rooms/%21abc%3Alocalhost/ban',
+         {'user_id': '@two:localhost', 'reason': 'Should be banned.'})]
+
+
+def test_create_room_answers_with_the_room_id():
+    connection = _connection(FakeResponse(json={'room_id': '!new:localhost'}))
+
+    assert connection.send('CREATE_ROOM', {'username': 'two'}) == ('ROOM_CREATED_SUCCESS', {'room_id': '!new:localhost'})
+
+
+@pytest.mark.parametrize('label, params', [
+    ('KICK_USER', {'username': 'one'}),
+    ('LEAVE_ROOM', {'username': 'one'}),
+    ('LEAVE_ROOM', {'username': 'four', 'room_id': '!abc:localhost'}),
+])
+def test_unknown_stimuli_parameters_and_users_fail_without_a_request(label, params):
+    connection = _connection()
+
+    assert connection.send(label, params) == ('FAIL', {})
+    assert connection.http.requests == []
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(matrix_connection, 'sleep', slept.append)
+    return slept
+
+
+def test_rate_limited_requests_wait_as_long_as_the_server_asks(sleeps):
+    connection = _connection(FakeResponse(429, {'retry_after_ms': 250}), FakeResponse(429, {}), FakeResponse())
+
+    assert connection.send('LEAVE_ROOM', {'username': 'one', 'room_id': '!abc:localhost'}) == ('SUCCESS', {})
+    assert sleeps == [0.25, 1.0]
+    assert len(connection.http.requests) == 3
+
+
+def test_timed_out_messages_are_retried_with_the_same_transaction_id(sleeps):
+    connection = _connection(requests.Timeout(), FakeResponse())
+    message = {'username': 'one', 'message': 'hi', 'room_id': '!abc:localhost'}
+
+    assert connection.send('SEND_MESSAGE', message) == ('SUCCESS', {})
+    connection.send('SEND_MESSAGE', message)
+
+    first, retry, next_message = [url for _, url, _ in connection.http.requests]
+    assert first == retry
+    assert next_message != first
+    assert sleeps == []
+
+
+def test_timed_out_requests_without_transaction_id_are_not_retried(sleeps):
+    connection = _connection(requests.Timeout(), FakeResponse())
+
+    assert connection.send('JOIN_ROOM', {'username': 'one', 'room_id': '!abc:localhost'}) == ('FAIL', {})
+    assert len(connection.http.requests) == 1
+
+
+def test_transaction_ids_count_up_under_one_prefix():
+    ids = TransactionIds()
+    first, second = ids.next(), ids.next()
+
+    assert first != second and first.split('.')[0] == second.split('.')[0]
+    assert int(second.split('.')[1]) == int(first.split('.')[1]) + 1
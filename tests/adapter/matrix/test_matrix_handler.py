@@ -0,0 +1,54 @@
+import pytest
+
+from adapter.generic.metrics import Metrics
+from adapter.matrix.matrix_handler import MatrixHandler
+
+
+class FakeAdapterCore:
+    def __init__(self):
+        self.metrics = Metrics()
+        self.readies = 0
+
+    def send_ready(self):
+        self.readies += 1
+
+
+class FakeConnection:
+    def __init__(self):
+        self.calls = []
+
+    def set_room_pool_size(self, size):
+        self.calls.append(('set_room_pool_size', size))
+
+    def set_room_state_cache(self, mode):
+        self.calls.append(('set_room_state_cache', mode))
+
+    def reset(self):
+        self.calls.append('reset')
+
+
+def _handler(**values):
+    handler = MatrixHandler()
+    handler.register_adapter_core(FakeAdapterCore())
+    configuration = handler.default_configuration()
+    for item in configuration.items:
+        item.value = values.get(item.name, item.value)
+    handler.set_configuration(configuration)
+    handler.sut = FakeConnection()
+    return handler
+
+
+@pytest.mark.parametrize('changed', [{'async_client'}, {'pipelining'}, {'async_client', 'room_pool_size'}])
+def test_switching_the_client_is_not_applied_in_place(changed):
+    handler = _handler(async_client=True)
+
+    assert not handler.reconfigure(changed)
+    assert handler.sut.calls == []
+
+
+def test_room_pool_and_cache_are_rebuilt_in_place():
+    handler = _handler(room_pool_size=3, room_state_cache='on')
+
+    assert handler.reconfigure({'room_pool_size', 'room_state_cache'})
+    assert handler.sut.calls == [('set_room_state_cache', 'on'), ('set_room_pool_size', 3), 'reset']
+    assert handler.adapter_core.readies == 1
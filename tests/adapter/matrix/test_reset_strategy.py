@@ -0,0 +1,66 @@
+import pytest
+
+from adapter.matrix.reset_strategy import (PostgresSnapshotReset, PurgeReset, SnapshotReset, SqliteSnapshotReset,
+                                           create_reset_strategy)
+
+
+class RecordingSnapshotReset(SnapshotReset):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def docker(self, *args):
+        self.calls.append(args[0])
+
+    def capture(self, connection):
+        self.calls.append('capture')
+
+    def restore(self, connection):
+        self.calls.append('restore')
+
+
+class FakeConnection:
+    container_name = 'synapse'
+    room_pool = None
+
+    def __init__(self):
+        self.ready_checks = 0
+
+    def wait_until_ready(self):
+        self.ready_checks += 1
+
+
+def test_strategies_are_created_by_name():
+    assert isinstance(create_reset_strategy('purge'), PurgeReset)
+    assert create_reset_strategy('sqlite_snapshot').database == '/data/homeserver.db'
+    postgres = create_reset_strategy('postgres_snapshot', 'synapse-db/matrix')
+    assert isinstance(postgres, PostgresSnapshotReset)
+    assert (postgres.container, postgres.database, postgres.template) == ('synapse-db', 'matrix', 'matrix_snapshot')
+    assert isinstance(create_reset_strategy('sqlite_snapshot', '/data/other.db'), SqliteSnapshotReset)
+
+    with pytest.raises(ValueError):
+        create_reset_strategy('postgres_snapshot')
+    with pytest.raises(ValueError):
+        create_reset_strategy('truncate')
+
+
+def test_snapshot_is_captured_once_and_restored_while_stopped():
+    strategy, connection = RecordingSnapshotReset(), FakeConnection()
+
+    strategy.prepare(connection)
+    strategy.prepare(connection)
+    strategy.reset(connection)
+
+    assert strategy.calls == ['stop', 'capture', 'start', 'stop', 'restore', 'start']
+    assert connection.ready_checks == 2
+
+
+def test_snapshot_strategy_must_implement_capture_and_restore():
+    class CaptureOnly(SnapshotReset):
+        def capture(self, connection):
+            pass
+
+    with pytest.raises(TypeError):
+        SnapshotReset()
+    with pytest.raises(TypeError):
+        CaptureOnly()
@@ -0,0 +1,86 @@
+import itertools
+import threading
+import time
+
+from collections import deque
+
+from adapter.matrix.room_pool import RoomPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.session_dict = {'one': object()}
+        self.created = 0
+        self._ids = itertools.count(1)
+
+    def create_room(self, user_session):
+        time.sleep(0.001)  # leave room for the fills to interleave
+        self.created += 1
+        return 200, '!room{n}:localhost'.format(n=next(self._ids))
+
+
+def test_concurrent_fills_do_not_overfill_the_pool():
+    connection = FakeConnection()
+    pool = RoomPool(connection, size=5)
+    pool.rooms['one'] = deque()
+
+    fills = [threading.Thread(target=pool.fill) for _ in range(4)]
+    for fill in fills:
+        fill.start()
+    for fill in fills:
+        fill.join()
+
+    assert len(pool.rooms['one']) == 5
+    assert connection.created == 5
+
+
+def test_rooms_are_handed_out_once():
+    pool = RoomPool(FakeConnection(), size=2)
+    pool.rooms['one'] = deque()
+    pool.fill()
+
+    rooms = {pool.take('one'), pool.take('one')}
+
+    assert len(rooms) == 2
+    assert pool.take('one') is None
+
+
+class BlockingConnection(FakeConnection):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def create_room(self, user_session):
+        assert self.release.wait(5)
+        return super().create_room(user_session)
+
+
+def test_pool_is_filled_in_the_background_after_start_and_reset():
+    connection = BlockingConnection()
+    pool = RoomPool(connection, size=2, idle_after=60.0)
+    pool.notify_activity()  # busy, yet the pool is filled right away
+
+    try:
+        pool.start(['one'])
+        assert pool.take('one') is None  # the caller creates the room itself meanwhile
+        connection.release.set()
+        _wait_until(lambda: len(pool.rooms['one']) == 2)
+
+        pool.pause()
+        pool.clear()
+        connection.release.clear()
+        pool.resume(fill=True)
+        connection.release.set()
+        _wait_until(lambda: len(pool.rooms['one']) == 2)
+    finally:
+        connection.release.set()
+        pool.stop()
+
+    assert connection.created == 4
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
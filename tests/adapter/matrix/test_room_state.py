@@ -0,0 +1,48 @@
+from adapter.matrix.room_state import RoomState
+
+
+def _room_state_with_room():
+    room_state = RoomState()
+    room_state.update('CREATE_ROOM', {'username': 'one'}, {'room_id': '!room1:localhost'})
+    return room_state
+
+
+def test_stimuli_without_or_with_unknown_room_are_answered_locally():
+    room_state = _room_state_with_room()
+
+    assert room_state.check('LEAVE_ROOM', {'username': '', 'room_id': ''})
+    assert room_state.check('JOIN_ROOM', {'username': 'two', 'room_id': '!unknown:localhost'})
+    assert room_state.check('CREATE_ROOM', {'username': 'one'}) is None
+
+
+def test_membership_follows_successful_stimuli():
+    room_state = _room_state_with_room()
+    room = {'username': 'two', 'room_id': '!room1:localhost'}
+
+    assert room_state.check('SEND_MESSAGE', room)
+    room_state.update('JOIN_ROOM', room, {})
+    assert room_state.check('SEND_MESSAGE', room) is None
+    room_state.update('LEAVE_ROOM', room, {})
+    assert room_state.check('LEAVE_ROOM', room)
+
+
+def test_banned_users_cannot_join_and_only_the_creator_bans():
+    room_state = _room_state_with_room()
+    ban = {'username': 'one', 'user_id': 'two', 'room_id': '!room1:localhost'}
+
+    assert room_state.check('BAN_USER', dict(ban, username='three'))
+    assert room_state.check('BAN_USER', ban) is None
+    room_state.update('BAN_USER', ban, {})
+
+    assert room_state.check('JOIN_ROOM', {'username': 'two', 'room_id': '!room1:localhost'})
+
+
+def test_verify_takes_over_the_server_state():
+    room_state = _room_state_with_room()
+    room_state.update('CREATE_ROOM', {'username': 'two'}, {'room_id': '!room2:localhost'})
+    server = {'!room1:localhost': ({'one', 'three'}, set())}
+
+    room_state.verify(server.get)
+
+    assert room_state.mismatches == 2
+    assert room_state.rooms == {'!room1:localhost': {'creator': 'one', 'members': {'one', 'three'}, 'banned': set()}}
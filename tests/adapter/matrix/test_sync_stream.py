@@ -0,0 +1,69 @@
+import threading
+import time
+
+from types import SimpleNamespace
+
+from adapter.generic.metrics import Metrics
+from adapter.matrix.sync_stream import SyncStream, event_response
+
+USERNAMES = {'@one:localhost': 'one', '@two:localhost': 'two'}
+
+
+def test_events_of_other_users_are_reported():
+    joined = {'type': 'm.room.member', 'sender': '@two:localhost', 'state_key': '@two:localhost',
+              'content': {'membership': 'join'}}
+    message = {'type': 'm.room.message', 'sender': '@two:localhost', 'content': {'body': 'hi'}}
+
+    assert event_response('one', '!room:localhost', joined, USERNAMES) == (
+        'MEMBER_EVENT', {'username': 'one', 'room_id': '!room:localhost', 'user_id': 'two', 'membership': 'join'})
+    assert event_response('one', '!room:localhost', message, USERNAMES) == (
+        'MESSAGE_EVENT', {'username': 'one', 'room_id': '!room:localhost', 'sender': 'two', 'message': 'hi'})
+
+
+def test_own_foreign_and_other_events_are_not_reported():
+    message = {'type': 'm.room.message', 'sender': '@one:localhost', 'content': {'body': 'hi'}}
+    foreign = dict(message, sender='@someone:elsewhere')
+    topic = dict(message, type='m.room.topic', sender='@two:localhost')
+    invite_foreign = {'type': 'm.room.member', 'sender': '@two:localhost', 'state_key': '@someone:elsewhere'}
+
+    for event in (message, foreign, topic, invite_foreign):
+        assert event_response('one', '!room:localhost', event, USERNAMES) is None
+
+
+class ScriptedSyncStream(SyncStream):
+    """ Answers every long poll after `poll_seconds` with one message of user two, instead of calling /sync. """
+
+    def __init__(self, on_event, poll_seconds=0.05):
+        super().__init__(SimpleNamespace(), on_event, Metrics())
+        self.poll_seconds = poll_seconds
+        self.batches = 0
+
+    def _sync(self, http, session, since):
+        if since is None:
+            return {'next_batch': '0'}
+        time.sleep(self.poll_seconds)
+        self.batches += 1
+        event = {'type': 'm.room.message', 'sender': '@two:localhost', 'content': {'body': str(self.batches)}}
+        return {'next_batch': str(self.batches),
+                'rooms': {'join': {'!room:localhost': {'timeline': {'events': [event]}}}}}
+
+
+def _sync_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('matrix_sync')]
+
+
+def test_stop_ends_the_threads_so_a_restart_has_one_loop():
+    events = []
+    stream = ScriptedSyncStream(lambda message, params: events.append(message))
+    sessions = {'one': {'user_id': '@one:localhost'}, 'two': {'user_id': '@two:localhost'}}
+
+    stream.start(sessions)
+    time.sleep(0.2)
+    stream.stop()
+    assert _sync_threads() == []
+    assert events and set(events) == {'MESSAGE_EVENT'}
+
+    stream.start(sessions)
+    assert len(_sync_threads()) == 3  # a poll thread per user and one delivery thread
+    stream.stop()
+    assert _sync_threads() == []
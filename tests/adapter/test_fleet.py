@@ -0,0 +1,160 @@
+import logging
+
+import pytest
+
+from adapter import fleet
+from adapter.fleet import Fleet, shard_instances
+from adapter.supervisor import Supervisor
+
+
+def _config(instances=3, **options):
+    return dict({'url': 'ws://localhost:1', 'handler': 'matrix',
+                 'synapses': [{'endpoint': 'http://localhost:8008', 'docker_container': 'synapse1'},
+                              {'endpoint': 'http://localhost:8009', 'docker_container': 'synapse2'}],
+                 'instances': [{'name': 'Matrix@run{n}'.format(n=n), 'token': str(n)} for n in range(instances)]},
+                **options)
+
+
+class FakeProcess:
+    def __init__(self, alive=True, exitcode=None, pid=1):
+        self.alive = alive
+        self.exitcode = exitcode
+        self.pid = pid
+
+    def is_alive(self):
+        return self.alive
+
+
+@pytest.fixture
+def make_fleet():
+    fleets = []
+
+    def make(config, **options):
+        fleets.append(Fleet(config, **options))
+        return fleets[-1]
+    yield make
+    for created in fleets:
+        created.log_queue.close()
+        created.metrics_queue.close()
+
+
+def test_instances_are_sharded_and_get_a_synapse_round_robin():
+    config = _config(instances_per_worker=2)
+    config['instances'][2]['configuration'] = {'endpoint': 'http://elsewhere:8008'}
+
+    shards = shard_instances(config)
+
+    assert [[instance['name'] for instance in shard['instances']] for shard in shards] == [
+        ['Matrix@run0', 'Matrix@run1'], ['Matrix@run2']]
+    assert all(shard['url'] == 'ws://localhost:1' and shard['handler'] == 'matrix' for shard in shards)
+    assert shards[0]['instances'][1]['configuration'] == {'endpoint': 'http://localhost:8009',
+                                                         'docker_container': 'synapse2'}
+    assert shards[1]['instances'][0]['configuration'] == {'endpoint': 'http://elsewhere:8008',
+                                                         'docker_container': 'synapse1'}
+    assert 'configuration' not in config['instances'][0]
+
+
+def test_defaults_for_all_instances_reach_the_instances_of_every_shard():
+    shards = shard_instances(_config(instances=2, keep_sut_warm=30.0, ping_interval=5.0))
+    supervisors = [Supervisor.from_dict(shard) for shard in shards]
+    adapter_cores = [adapter_core for supervisor in supervisors for adapter_core in supervisor.instances.values()]
+
+    try:
+        assert len(adapter_cores) == 2
+        assert all(adapter_core.keep_sut_warm == 30.0 for adapter_core in adapter_cores)
+        assert all(adapter_core.broker_connection.ping_interval == 5.0 for adapter_core in adapter_cores)
+    finally:
+        for adapter_core in adapter_cores:
+            adapter_core.close()
+
+
+def test_crashed_workers_are_restarted_with_exponential_backoff(make_fleet, monkeypatch):
+    fleet_ = make_fleet(_config(instances=1), backoff=1.0, max_backoff=3.0, stable_after=10.0)
+    worker = fleet_.workers[0]
+    now = [100.0]
+    monkeypatch.setattr(fleet.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(fleet_, '_spawn', lambda w: setattr(w, 'restart_at', None) or
+                        setattr(w, 'started_at', now[0]) or setattr(w, 'process', FakeProcess()))
+
+    delays = []
+    for _ in range(4):
+        worker.process = FakeProcess(alive=False, exitcode=1)
+        fleet_._check_workers()
+        delays.append(worker.restart_at - now[0])
+        now[0] = worker.restart_at
+        fleet_._check_workers()
+
+    assert delays == [1.0, 2.0, 3.0, 3.0]
+    assert worker.restarts == 4
+
+    now[0] += 10.0
+    fleet_._check_workers()
+    assert worker.failures == 0
+
+
+def test_aggregate_sums_counters_and_keeps_the_worst_latencies(make_fleet):
+    fleet_ = make_fleet(_config(instances=2))
+    fleet_.workers[0].process = FakeProcess(pid=11)
+    fleet_.workers[1].process = FakeProcess(alive=False, pid=12)
+
+    def status(received, p99):
+        return {'metrics': {'counters': {'messages_received': received},
+                            'histograms': {'stimulus_latency': {'count': received, 'p99': p99, 'max': p99 * 2}}}}
+    fleet_.health = {'worker-0': {'Matrix@run0': status(10, 0.5)}, 'worker-1': {'Matrix@run1': status(5, 0.25)}}
+
+    view = fleet_.aggregate()
+
+    assert view['counters'] == {'messages_received': 15}
+    assert view['histograms'] == {'stimulus_latency': {'count': 15, 'p99': 0.5, 'max': 1.0}}
+    assert view['workers'] == {'worker-0': {'pid': 11, 'alive': True, 'restarts': 0},
+                               'worker-1': {'pid': 12, 'alive': False, 'restarts': 0}}
+    assert set(view['instances']) == {'Matrix@run0', 'Matrix@run1'}
+
+
+class FakeQueue(list):
+    def put(self, item):
+        self.append(item)
+
+    put_nowait = put
+
+    def close(self):
+        pass
+
+    def join_thread(self):
+        pass
+
+
+class DyingSupervisor:
+    @classmethod
+    def from_dict(cls, shard):
+        return cls()
+
+    def start(self):
+        pass
+
+    def wait(self, timeout):
+        return ['Matrix@run0']
+
+    def health(self):
+        return {'Matrix@run0': {'running': False}}
+
+
+def test_worker_exits_when_an_instance_stops(monkeypatch):
+    monkeypatch.setattr('adapter.supervisor.Supervisor', DyingSupervisor)
+
+    def exit_(code):
+        raise SystemExit(code)
+    monkeypatch.setattr(fleet.os, '_exit', exit_)
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    log_queue, metrics_queue = FakeQueue(), FakeQueue()
+    try:
+        with pytest.raises(SystemExit) as exited:
+            fleet._worker_main({'instances': []}, log_queue, metrics_queue, logging.INFO, 0.0)
+    finally:
+        root.handlers[:] = handlers
+        root.setLevel(level)
+
+    assert exited.value.code == 1
+    assert metrics_queue[0][1] == {'Matrix@run0': {'running': False}}
+    assert 'Matrix@run0' in log_queue[-1].getMessage()
@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+
+@pytest.mark.parametrize('command', [
+    [os.path.join(SRC, 'adapter', 'plugin_adapter.py')],
+    ['-m', 'adapter'],
+])
+def test_adapter_starts_as_script_and_as_module(command):
+    env = {name: value for name, value in os.environ.items() if name != 'PYTHONPATH'}
+    result = subprocess.run([sys.executable, *command, '--help'], cwd=SRC, env=env,
+                            capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert '--handler' in result.stdout
+
+
+def test_single_adapter_options_are_rejected_in_supervisor_mode():
+    result = subprocess.run([sys.executable, '-m', 'adapter', '--supervise', 'fleet.json', '--profile',
+                             '--keep-sut-warm', '30'], cwd=SRC, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 2
+    assert 'not allowed with --profile, --keep-sut-warm' in result.stderr
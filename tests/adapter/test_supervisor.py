@@ -0,0 +1,112 @@
+import json
+import logging
+import threading
+
+import pytest
+
+from adapter.supervisor import SharedResources, Supervisor, configure_logging
+
+
+def _config(**instance):
+    return {'url': 'ws://localhost:1', 'handler': 'smartdoor',
+            'instances': [dict({'name': 'Door@one', 'token': 'one'}, **instance),
+                          {'name': 'Door@two', 'token': 'two', 'ping_interval': 5.0}]}
+
+
+@pytest.fixture
+def supervisors():
+    created = []
+    yield created
+    for supervisor in created:
+        for adapter_core in supervisor.instances.values():
+            adapter_core.close()
+
+
+def test_instances_are_created_from_the_config(supervisors, tmp_path):
+    path = tmp_path / 'fleet.json'
+    path.write_text(json.dumps(_config(configuration={'endpoint': 'ws://localhost:3001'}, keep_sut_warm=2.0)))
+
+    supervisor = Supervisor.from_config(str(path))
+    supervisors.append(supervisor)
+    one, two = supervisor.instances['Door@one'], supervisor.instances['Door@two']
+
+    assert one.handler.get_configuration().value('endpoint') == 'ws://localhost:3001'
+    assert one.keep_sut_warm == 2.0
+    assert (one.broker_connection.url, one.broker_connection.token) == ('ws://localhost:1', 'one')
+    assert two.broker_connection.ping_interval == 5.0
+    assert one.handler.shared_resources is two.handler.shared_resources is supervisor.shared_resources
+
+
+def test_unknown_configuration_items_and_duplicate_names_are_rejected(supervisors):
+    supervisors.append(Supervisor())
+    with pytest.raises(ValueError, match='Unknown configuration items'):
+        supervisors[0].add_instance('Door@one', 'ws://localhost:1', 'one', 'smartdoor', {'colour': 'red'})
+
+    supervisors.append(Supervisor.from_dict(_config()))
+    with pytest.raises(ValueError, match='already exists'):
+        supervisors[1].add_instance('Door@one', 'ws://localhost:1', 'one', 'smartdoor')
+
+
+def test_health_reports_instances_whose_broker_loop_died(supervisors, tmp_path):
+    supervisor = Supervisor.from_dict(_config(), health_file=str(tmp_path / 'health.json'))
+    supervisors.append(supervisor)
+
+    def refuse():
+        raise ConnectionRefusedError('AMP is down')
+    for adapter_core in supervisor.instances.values():
+        adapter_core.broker_connection.connect = refuse
+    supervisor.start()
+    for future in supervisor._futures.values():
+        future.exception(timeout=5)
+    supervisor.report_health()
+
+    health = json.loads((tmp_path / 'health.json').read_text())['instances']
+    assert health['Door@one']['running'] is False
+    assert 'AMP is down' in health['Door@one']['exception']
+    assert health['Door@two']['state'] == 'DISCONNECTED'
+
+
+def test_instances_get_their_own_session_on_shared_connection_pools():
+    resources = SharedResources(pool_maxsize=4)
+
+    one, two = resources.http_session(), resources.http_session()
+
+    assert one is not two
+    assert one.get_adapter('http://localhost') is two.get_adapter('https://localhost')
+    assert one.get_adapter('http://localhost')._pool_maxsize == 4
+
+
+def test_log_records_of_all_threads_reach_one_file(tmp_path):
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    listener = configure_logging(logging.INFO, str(tmp_path / 'output.txt'))
+    try:
+        logging.getLogger('adapter').info('hello from an instance')
+    finally:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        root.handlers[:] = handlers
+        root.setLevel(level)
+
+    assert 'MainThread adapter::test_supervisor' in (tmp_path / 'output.txt').read_text()
+
+
+def test_wait_returns_the_instances_that_stopped(supervisors):
+    supervisor = Supervisor.from_dict(_config())
+    supervisors.append(supervisor)
+
+    connected = threading.Event()
+
+    def refuse():
+        raise ConnectionRefusedError('AMP is down')
+
+    def stay_connected():
+        connected.set()
+        supervisor.instances['Door@two']._stopped.wait()
+    supervisor.instances['Door@one'].broker_connection.connect = refuse
+    supervisor.instances['Door@two'].broker_connection.connect = stay_connected
+    supervisor.start()
+
+    assert connected.wait(5)
+    assert supervisor.wait(5) == ['Door@one']